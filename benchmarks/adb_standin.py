@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模拟adb：用于在没有手机的机器上做性能测试
+
+对工具会用到的命令(input、am、pm、wm size、screencap、uiautomator dump、getevent、批量脚本、
+前台状态、等待和宏脚本等)返回格式正确的输出，每条命令的延迟、输出大小和失败率都可以调整。
+sendevent手势脚本没有输出，即屏幕方向与编译时一致。有两种用法：
+
+    可执行文件  作为adb命令行的替身，配置从环境变量读取，配合 PHONE_MCP_ADB_PATH 使用：
+                    SIM_ADB_LATENCY_MS=20 python benchmarks/adb_standin.py -s sim-01 shell input tap 1 2
+    shell处理函数  shell_handler(config) 交给 phone_mcp_by_trae.fake_adb.FakeADBServer，测试socket后端
+
+环境变量：
+    SIM_ADB_DEVICES          设备数量，序列号为 sim-01、sim-02 ...(默认1)
+    SIM_ADB_LATENCY_MS       每条命令的基础延迟(默认20)
+    SIM_ADB_JITTER_MS        在基础延迟上增加的随机延迟上限(默认0)
+    SIM_ADB_COMMAND_LATENCY  按命令覆盖基础延迟，例如 "screencap=120,uiautomator=400"
+    SIM_ADB_FAILURE_RATE     命令失败的概率，0到1(默认0)
+    SIM_ADB_OUTPUT_BYTES     追加到普通shell命令输出后的字节数，模拟冗长输出(默认0)
+    SIM_ADB_PNG_BYTES        screencap -p 返回的PNG大小(默认300000)
+    SIM_ADB_FRAME_SIZE       screencap 原始帧的尺寸(默认540x1200)
+    SIM_ADB_UI_NODES         uiautomator dump 中的节点数(默认200)
+    SIM_ADB_PACKAGES         pm list packages 中的应用数(默认150)
+"""
+
+import os
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# 屏幕尺寸，wm size和PNG头部使用
+SCREEN_SIZE = (1080, 2400)
+
+# 批量输入脚本中的步骤标记: echo <标记> <序号> $rc
+_BATCH_STEP = re.compile(r'echo (\S+) (\d+) \$rc')
+# 文本输入脚本中的步骤标记: <步骤> && echo <标记> <序号>，切换输入法时先输出 <标记> ime <原输入法>
+_TEXT_STEP = re.compile(r'&& echo (\S+) (\d+)(?= &&|;|$)')
+_TEXT_IME = re.compile(r'echo (\S+) ime \$prev')
+# 切换输入法前的默认输入法
+DEFAULT_IME = 'com.android.inputmethod.latin/.LatinIME'
+# 等待脚本的结果行: echo "<标记> ok $n"，条件总是立即满足
+_WAIT_RESULT = re.compile(r'echo "(\S+) ok \$n"')
+# 宏运行命令: sh <脚本> <标记> <次数> ...，脚本总是已在设备上
+_MACRO_RUN = re.compile(r'then sh \S+ (\S+) (\d+) ')
+
+# getevent -pl 中的触摸屏，坐标范围与屏幕尺寸相同
+_TOUCHSCREEN = (
+    'add device 1: /dev/input/event2\n'
+    '  name:     "sim_touchscreen"\n'
+    '  events:\n'
+    '    KEY (0001): BTN_TOUCH\n'
+    '    ABS (0003): ABS_MT_SLOT           : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0\n'
+    '                ABS_MT_TOUCH_MAJOR    : value 0, min 0, max 255, fuzz 0, flat 0, resolution 0\n'
+    '                ABS_MT_POSITION_X     : value 0, min 0, max {max_x}, fuzz 0, flat 0, resolution 0\n'
+    '                ABS_MT_POSITION_Y     : value 0, min 0, max {max_y}, fuzz 0, flat 0, resolution 0\n'
+    '                ABS_MT_TRACKING_ID    : value 0, min 0, max 65535, fuzz 0, flat 0, resolution 0\n'
+    '  input props:\n'
+    '    INPUT_PROP_DIRECT\n'
+)
+
+# 前台状态脚本各部分的输出
+_STATE = (
+    '@activity\n  mResumedActivity: ActivityRecord{{1 u0 com.example.app1/.MainActivity t12}}\n'
+    '@power\n  mWakefulness=Awake\n'
+    '@keyguard\n    showing=false\n'
+    '@rotation\n    SurfaceOrientation: 0\n'
+    '@ime\n{ime}\n  mInputShown=false\n'
+)
+
+
+class StandInConfig:
+    """模拟adb的可调参数"""
+
+    def __init__(self, devices: int = 1, latency_ms: float = 20.0, jitter_ms: float = 0.0,
+                 command_latency: Optional[Dict[str, float]] = None, failure_rate: float = 0.0,
+                 output_bytes: int = 0, png_bytes: int = 300000, frame_size: Tuple[int, int] = (540, 1200),
+                 ui_nodes: int = 200, packages: int = 150):
+        self.devices = devices
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.command_latency = command_latency or {}
+        self.failure_rate = failure_rate
+        self.output_bytes = output_bytes
+        self.png_bytes = png_bytes
+        self.frame_size = frame_size
+        self.ui_nodes = ui_nodes
+        self.packages = packages
+
+    @property
+    def serials(self) -> List[str]:
+        """模拟设备的序列号"""
+        return [f"sim-{index + 1:02d}" for index in range(self.devices)]
+
+    @classmethod
+    def from_env(cls, environ=None) -> 'StandInConfig':
+        """从环境变量读取配置"""
+        environ = os.environ if environ is None else environ
+        width, _, height = environ.get('SIM_ADB_FRAME_SIZE', '540x1200').partition('x')
+        command_latency = {}
+        for item in environ.get('SIM_ADB_COMMAND_LATENCY', '').split(','):
+            name, _, value = item.partition('=')
+            if name.strip() and value.strip():
+                command_latency[name.strip()] = float(value)
+        return cls(
+            devices=int(environ.get('SIM_ADB_DEVICES', '1')),
+            latency_ms=float(environ.get('SIM_ADB_LATENCY_MS', '20')),
+            jitter_ms=float(environ.get('SIM_ADB_JITTER_MS', '0')),
+            command_latency=command_latency,
+            failure_rate=float(environ.get('SIM_ADB_FAILURE_RATE', '0')),
+            output_bytes=int(environ.get('SIM_ADB_OUTPUT_BYTES', '0')),
+            png_bytes=int(environ.get('SIM_ADB_PNG_BYTES', '300000')),
+            frame_size=(int(width), int(height)),
+            ui_nodes=int(environ.get('SIM_ADB_UI_NODES', '200')),
+            packages=int(environ.get('SIM_ADB_PACKAGES', '150')),
+        )
+
+    def to_env(self) -> Dict[str, str]:
+        """转换为环境变量，供作为可执行文件运行的子进程读取"""
+        return {
+            'SIM_ADB_DEVICES': str(self.devices),
+            'SIM_ADB_LATENCY_MS': str(self.latency_ms),
+            'SIM_ADB_JITTER_MS': str(self.jitter_ms),
+            'SIM_ADB_COMMAND_LATENCY': ','.join(f"{name}={value}" for name, value in self.command_latency.items()),
+            'SIM_ADB_FAILURE_RATE': str(self.failure_rate),
+            'SIM_ADB_OUTPUT_BYTES': str(self.output_bytes),
+            'SIM_ADB_PNG_BYTES': str(self.png_bytes),
+            'SIM_ADB_FRAME_SIZE': f"{self.frame_size[0]}x{self.frame_size[1]}",
+            'SIM_ADB_UI_NODES': str(self.ui_nodes),
+            'SIM_ADB_PACKAGES': str(self.packages),
+        }
+
+    def delay(self, command: str) -> float:
+        """命令的模拟延迟(秒)"""
+        latency = self.latency_ms
+        for name, value in self.command_latency.items():
+            if name in command:
+                latency = value
+                break
+        if self.jitter_ms:
+            latency += random.uniform(0, self.jitter_ms)
+        return latency / 1000
+
+
+def _png(config: StandInConfig) -> bytes:
+    """PNG签名和IHDR块加上填充，工具只读取头部"""
+    ihdr = struct.pack('>II5B', SCREEN_SIZE[0], SCREEN_SIZE[1], 8, 2, 0, 0, 0)
+    chunk = struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr
+    chunk += struct.pack('>I', zlib.crc32(b'IHDR' + ihdr) & 0xffffffff)
+    return PNG_SIGNATURE + chunk + b'\0' * max(0, config.png_bytes - len(chunk) - 8)
+
+
+def _raw_frame(config: StandInConfig) -> bytes:
+    """screencap原始输出：16字节头部(宽、高、RGBA_8888、色彩空间)加像素数据"""
+    width, height = config.frame_size
+    shade = random.randrange(256)
+    return struct.pack('<IIII', width, height, 1, 0) + bytes([shade, 128, 64, 255]) * (width * height)
+
+
+def _ui_dump(config: StandInConfig) -> bytes:
+    nodes = ''.join(
+        f'<node index="{index}" text="item{index}" resource-id="com.example:id/item{index}" '
+        f'class="android.widget.TextView" package="com.example.app1" content-desc="" '
+        f'clickable="true" enabled="true" bounds="[0,{index * 40}][1080,{index * 40 + 40}]" />'
+        for index in range(config.ui_nodes)
+    )
+    xml = (f"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"
+           f'<node index="0" class="android.widget.FrameLayout" package="com.example.app1" '
+           f'bounds="[0,0][1080,2400]">{nodes}</node></hierarchy>')
+    return xml.encode('utf-8') + b'UI hierchary dumped to: /dev/tty\n'
+
+
+def _packages(config: StandInConfig) -> List[str]:
+    return ['com.android.settings'] + [f"com.example.app{index}" for index in range(config.packages)]
+
+
+def _shell_output(config: StandInConfig, command: str) -> str:
+    """普通shell命令的输出"""
+    if command.startswith('getevent -pl'):
+        return (_TOUCHSCREEN.format(max_x=SCREEN_SIZE[0] - 1, max_y=SCREEN_SIZE[1] - 1)
+                + f"__PHONE_MCP_WM_SIZE__\nPhysical size: {SCREEN_SIZE[0]}x{SCREEN_SIZE[1]}\n")
+    if '@activity' in command:
+        return _STATE.format(ime=DEFAULT_IME)
+    wait = _WAIT_RESULT.search(command)
+    if wait:
+        return f"{wait.group(1)} ok 1\ncom.example.app1\n"
+    macro = _MACRO_RUN.search(command)
+    if macro:
+        return f"{macro.group(1)} done {macro.group(2)} 0\n"
+    if command.startswith('pm list packages'):
+        return ''.join(f"package:{package}\n" for package in _packages(config))
+    if command.startswith('cmd package query-activities'):
+        return ''.join(f"  {package}/.MainActivity\n" for package in _packages(config))
+    if command.startswith('cmd package resolve-activity'):
+        return ''.join(
+            f"priority=0 preferredOrder=0\n{part.split()[-1]}/.MainActivity\n"
+            for part in command.split(';') if part.strip()
+        )
+    if command.startswith('wm size'):
+        return f"Physical size: {SCREEN_SIZE[0]}x{SCREEN_SIZE[1]}\n"
+    if 'getprop ro.product.model' in command:
+        return f"model=SimPhone\nsdk=33\nPhysical size: {SCREEN_SIZE[0]}x{SCREEN_SIZE[1]}\n"
+    if command.startswith('am start'):
+        return "Starting: Intent { act=android.intent.action.MAIN }\n"
+    steps = _BATCH_STEP.findall(command)
+    if steps:
+        return ''.join(f"{marker} {index} 0\n" for marker, index in steps)
+    ime = _TEXT_IME.search(command)
+    output = f"{ime.group(1)} ime {DEFAULT_IME}\n" if ime else ''
+    return output + ''.join(f"{marker} {index}\n" for marker, index in _TEXT_STEP.findall(command))
+
+
+def respond(config: StandInConfig, command: str, binary: bool = False) -> Tuple[int, bytes, bytes]:
+    """生成一条设备命令的结果，会先按配置等待
+
+    Args:
+        config: 配置
+        command: shell或exec-out后面的命令字符串
+        binary: 是否为exec-out(输出不追加填充)
+
+    Returns:
+        (退出码, stdout, stderr)
+    """
+    time.sleep(config.delay(command))
+    if config.failure_rate and random.random() < config.failure_rate:
+        return 1, b'', b"error: simulated failure\n"
+    if command.startswith('screencap -p'):
+        return 0, _png(config), b''
+    if command.startswith('screencap'):
+        return 0, _raw_frame(config), b''
+    if command.startswith('uiautomator dump'):
+        return 0, _ui_dump(config), b''
+    output = _shell_output(config, command).encode('utf-8')
+    if not binary and config.output_bytes:
+        output += b'.' * config.output_bytes + b'\n'
+    return 0, output, b''
+
+
+def shell_handler(config: StandInConfig) -> Callable[[str, str], Tuple[int, bytes, bytes]]:
+    """返回FakeADBServer使用的shell处理函数"""
+    def handle(serial: str, command: str) -> Tuple[int, bytes, bytes]:
+        return respond(config, command)
+    return handle
+
+
+def write_wrapper(directory: str) -> str:
+    """在目录中生成调用本脚本的adb可执行文件，返回其路径(用于PHONE_MCP_ADB_PATH)"""
+    path = os.path.join(directory, 'adb')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def main(argv: List[str]) -> int:
+    """作为adb命令行运行"""
+    config = StandInConfig.from_env()
+    serial = None
+    if argv[:1] == ['-s'] and len(argv) > 1:
+        serial, argv = argv[1], argv[2:]
+    if argv[:1] == ['devices']:
+        sys.stdout.write("List of devices attached\n" + ''.join(f"{item}\tdevice\n" for item in config.serials))
+        return 0
+    if argv[:1] in (['start-server'], ['version']):
+        return 0
+    if serial is None and config.devices != 1:
+        sys.stderr.write("error: more than one device/emulator\n")
+        return 1
+    if serial is not None and serial not in config.serials:
+        sys.stderr.write(f"error: device '{serial}' not found\n")
+        return 1
+    if argv[:1] not in (['shell'], ['exec-out']):
+        sys.stderr.write(f"adb stand-in: unsupported command {argv[:1]}\n")
+        return 1
+
+    exit_code, stdout, stderr = respond(config, ' '.join(argv[1:]), binary=argv[0] == 'exec-out')
+    sys.stdout.buffer.write(stdout)
+    sys.stderr.buffer.write(stderr)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+导入耗时基准
+
+MCP宿主会频繁启动服务器进程，命令行工具每次调用也是一个新进程，
+因此导入耗时直接影响每次调用的延迟。本脚本在全新的解释器中多次导入以下入口，
+统计耗时，并检查不应在该入口加载的模块：
+    package   import phone_mcp_by_trae            不应加载任何子模块
+    cli       from phone_mcp_by_trae import cli_main   不应加载MCP服务器、asyncio、NumPy
+    server    from phone_mcp_by_trae import main       不应加载命令行解析、NumPy
+
+用法:
+    python benchmarks/bench_import.py --runs 10
+    python benchmarks/bench_import.py --max-ms cli=80 --max-ms server=300   # 超过阈值时退出码为1
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# 入口名 -> (导入语句, 不应被加载的模块)
+ENTRY_POINTS = {
+    'package': ('import phone_mcp_by_trae',
+                ['phone_mcp_by_trae.phone_mcp', 'phone_mcp_by_trae.phone_cli']),
+    'cli': ('from phone_mcp_by_trae import cli_main',
+            ['phone_mcp_by_trae.phone_mcp', 'asyncio', 'numpy']),
+    'server': ('from phone_mcp_by_trae import main',
+               ['phone_mcp_by_trae.phone_cli', 'argparse', 'numpy']),
+}
+
+# 在子进程中执行：计时导入，输出耗时和已加载的模块
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = (time.perf_counter() - start) * 1000
+sys.stderr.flush()
+print(json.dumps({{"ms": elapsed, "modules": sorted(sys.modules)}}))
+'''
+
+
+def probe(statement: str) -> Dict:
+    """在新的解释器中执行一次导入"""
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE.format(statement=statement)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="导入耗时基准")
+    parser.add_argument("--runs", type=int, default=10, help="每个入口的导入次数")
+    parser.add_argument("--max-ms", action="append", default=[],
+                        help="耗时阈值，格式为 入口=毫秒，按中位数比较，可重复指定")
+    args = parser.parse_args()
+
+    limits = {}  # type: Dict[str, float]
+    for item in args.max_ms:
+        name, _, value = item.partition('=')
+        limits[name] = float(value)
+
+    failed = False
+    for name, (statement, forbidden) in ENTRY_POINTS.items():
+        timings = []  # type: List[float]
+        modules = []  # type: List[str]
+        for _ in range(args.runs):
+            sample = probe(statement)
+            timings.append(sample['ms'])
+            modules = sample['modules']
+        median = statistics.median(timings)
+        loaded = [module for module in forbidden if module in modules]
+        print(f"{name:<8} p50 {median:7.1f}ms  最小 {min(timings):7.1f}ms  模块数 {len(modules):4d}"
+              + (f"  不应加载: {', '.join(loaded)}" if loaded else ""))
+        if loaded or (name in limits and median > limits[name]):
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+回放录制的会话，测量服务器自身的开销
+
+先在真实设备上以 PHONE_MCP_RECORD_FILE 录制一次会话，之后不需要设备即可重复回放：
+日志中的工具调用被依次重新发起，ADB命令由replay后端返回录制的结果。fast模式下ADB耗时为零，
+测得的就是工具本身(解析、图像处理、调度)和结果JSON编码的开销。
+
+用法:
+    PHONE_MCP_RECORD_FILE=session.jsonl.gz python -m phone_mcp_by_trae   # 录制
+    python benchmarks/bench_replay.py session.jsonl.gz --repeat 5          # 回放
+    python benchmarks/bench_replay.py session.jsonl.gz --timing original   # 按录制时的耗时回放
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回放录制的会话")
+    parser.add_argument("log", help="PHONE_MCP_RECORD_FILE录制的日志")
+    parser.add_argument("--repeat", type=int, default=3, help="回放次数")
+    parser.add_argument("--timing", choices=['fast', 'original'], default='fast', help="ADB命令的返回时机")
+    parser.add_argument("--speed", type=float, default=1.0, help="original模式下的速度倍数")
+    args = parser.parse_args()
+
+    # 执行器在导入时读取这些环境变量，因此在导入phone_mcp之前设置
+    os.environ.pop('PHONE_MCP_RECORD_FILE', None)
+    os.environ.update({
+        'PHONE_MCP_BACKEND': 'replay',
+        'PHONE_MCP_REPLAY_FILE': args.log,
+        'PHONE_MCP_REPLAY_TIMING': args.timing,
+        'PHONE_MCP_REPLAY_SPEED': str(args.speed),
+    })
+    from phone_mcp_by_trae import phone_mcp
+    from phone_mcp_by_trae.adb_replay import read_log
+
+    calls = [entry for entry in read_log(args.log) if 'tool' in entry and entry['tool'] in phone_mcp.TOOLS]
+    if not calls:
+        print("日志中没有可回放的工具调用")
+        return
+
+    tool_ms = {}  # type: Dict[str, List[float]]
+    encode_ms = {}  # type: Dict[str, List[float]]
+
+    async def replay() -> None:
+        for entry in calls:
+            func = phone_mcp.TOOLS[entry['tool']]
+            started = time.perf_counter()
+            with phone_mcp.adb_executor.using_device(entry.get('d')):
+                result = await func(**entry.get('args', {}))
+            finished = time.perf_counter()
+            json.dumps(result, ensure_ascii=False)
+            tool_ms.setdefault(entry['tool'], []).append((finished - started) * 1000)
+            encode_ms.setdefault(entry['tool'], []).append((time.perf_counter() - finished) * 1000)
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        asyncio.run(replay())
+    elapsed = time.perf_counter() - started
+
+    print(f"回放 {len(calls)} 个调用 x {args.repeat} 次，共 {elapsed * 1000:.1f}ms，"
+          f"{len(calls) * args.repeat / elapsed:.1f} 调用/s")
+    print(f"  {'工具':<22} {'次数':>4} {'平均ms':>8} {'p50ms':>9} {'最大ms':>8} {'JSON编码ms':>10}")
+    for name, timings in sorted(tool_ms.items(), key=lambda item: -sum(item[1])):
+        print(f"  {name:<24} {len(timings):>6} {statistics.mean(timings):>10.2f} "
+              f"{statistics.median(timings):>9.2f} {max(timings):>10.2f} {statistics.mean(encode_ms[name]):>14.3f}")
+    print(f"ADB命令匹配: {phone_mcp.adb_executor.replayer.stats}")
+    phone_mcp.adb_executor.close()
+
+
+if __name__ == "__main__":
+    main()
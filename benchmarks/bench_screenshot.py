@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+截图路径性能对比
+
+在已连接的设备上对比以下截图方式的耗时和数据量：
+    png       设备端PNG编码 (exec-out screencap -p)
+    raw       原始帧缓冲，主机端解码为RGB数组
+    raw-png   原始帧缓冲，主机端缩放后编码为PNG
+
+用法(需先 pip install -e .[raw]):
+    python benchmarks/bench_screenshot.py --device <设备ID> --runs 10 --max-width 540
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+from phone_mcp_by_trae.adb_executor import ADBExecutor
+from phone_mcp_by_trae.framebuffer import capture_frame, encode_png, process_frame
+from phone_mcp_by_trae.screenshot import capture_png
+
+
+def measure(name: str, runs: int, func: Callable[[], int]) -> None:
+    """执行指定次数并打印耗时统计"""
+    func()  # 预热
+    timings = []  # type: List[float]
+    size = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        size = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<10} 平均 {statistics.mean(timings):8.1f}ms  "
+          f"p50 {statistics.median(timings):8.1f}ms  p95 {p95:8.1f}ms  大小 {size / 1024:8.1f}KB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="截图路径性能对比")
+    parser.add_argument("--device", help="设备ID")
+    parser.add_argument("--runs", type=int, default=10, help="每种方式的执行次数")
+    parser.add_argument("--max-width", type=int, default=540, help="raw-png模式的输出最大宽度")
+    args = parser.parse_args()
+
+    executor = ADBExecutor()
+    executor.device_id = args.device
+
+    measure("png", args.runs, lambda: len(capture_png(executor)))
+    measure("raw", args.runs, lambda: capture_frame(executor).nbytes)
+    measure("raw-png", args.runs, lambda: len(encode_png(
+        process_frame(capture_frame(executor), max_width=args.max_width))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MCP工具性能测试
+
+用模拟adb(benchmarks/adb_standin.py)代替真实设备，测量 phone_mcp 中各个工具的吞吐量和尾延迟，
+可以在没有手机的CI机器上比较执行器和服务器事件循环的改动。
+
+场景：
+    single      在一个设备上依次调用每个工具
+    multi       通过run_on_devices在所有模拟设备上并行调用
+    concurrent  按给定并发数同时发起混合的工具调用，分布到所有模拟设备
+
+传输方式：
+    subprocess  模拟adb作为可执行文件(每条命令启动一个Python进程，约有20-40ms固定开销)
+    socket      模拟adb server(FakeADBServer)，执行器使用socket后端
+
+用法(raw截图和screenshot_diff需要NumPy):
+    python benchmarks/bench_tools.py --transport socket --devices 4 --latency-ms 20 \\
+        --failure-rate 0.01 --concurrency 1,8,32 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from adb_standin import StandInConfig, shell_handler, write_wrapper
+
+SCENARIOS = ('single', 'multi', 'concurrent')
+
+# 不参与测试的工具及原因
+SKIPPED_TOOLS = {
+    'set_device': "由测试程序设置设备",
+    'run_on_devices': "在multi场景中测试",
+    'start_screen_stream': "需要设备端H.264编码器",
+    'stop_screen_stream': "需要设备端H.264编码器",
+    'start_macro': "只切换主机上的录制状态，不调用adb",
+    'stop_macro': "只切换主机上的录制状态，不调用adb",
+    'delete_macro': "只删除主机上的文件，重复调用时宏已不存在",
+    'push_files': "模拟adb不保存文件，无法模拟设备端目录",
+    'pull_files': "模拟adb不保存文件，无法模拟设备端目录",
+}
+
+# run_macro使用的宏，测试开始前保存到临时的宏目录
+BENCH_MACRO = 'benchmark'
+BENCH_MACRO_STEPS = [
+    {'action': 'tap', 'x': 100, 'y': 200, 'delay': 50},
+    {'action': 'key', 'keycode': 'back'},
+]
+
+# 需要NumPy的调用
+NUMPY_CALLS = ('take_screenshot[raw]', 'screenshot_diff')
+
+# concurrent场景中轮流发起的调用
+CONCURRENT_MIX = ('tap', 'press_key', 'swipe', 'take_screenshot', 'find_elements', 'batch_input')
+
+# multi场景中测试的调用
+MULTI_CALLS = ('tap', 'take_screenshot', 'dump_ui')
+
+
+def tool_calls(workdir: str) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """每个测试调用的名称 -> (工具名, 参数)"""
+    return {
+        'check_connection': ('check_connection', {}),
+        'call': ('call', {'phone_number': '10086'}),
+        'hangup': ('hangup', {}),
+        'send_sms': ('send_sms', {'phone_number': '10086', 'message': 'benchmark'}),
+        'open_app': ('open_app', {'app_name': 'settings'}),
+        'list_apps': ('list_apps', {'query': 'app1'}),
+        'close_app': ('close_app', {'package_name': 'com.example.app1'}),
+        'tap': ('tap', {'x': 100, 'y': 200}),
+        'swipe': ('swipe', {'x1': 100, 'y1': 1500, 'x2': 100, 'y2': 500, 'duration': 100}),
+        'long_press': ('long_press', {'x': 100, 'y': 200, 'duration': 100}),
+        'pinch': ('pinch', {'x': 540, 'y': 1200, 'start_distance': 200, 'end_distance': 600, 'duration': 200}),
+        'multi_touch': ('multi_touch', {'fingers': [
+            [{'x': 400, 'y': 800, 't': 0}, {'x': 400, 'y': 1400, 't': 200}],
+            [{'x': 700, 'y': 800, 't': 0}, {'x': 700, 'y': 1400, 't': 200}],
+        ]}),
+        'input_text': ('input_text', {'text': 'hello world'}),
+        'press_key': ('press_key', {'keycode': 'home'}),
+        'batch_input': ('batch_input', {'actions': [
+            {'action': 'tap', 'x': 100, 'y': 200},
+            {'action': 'key', 'keycode': 'back'},
+            {'action': 'text', 'text': 'abc'},
+        ]}),
+        'take_screenshot': ('take_screenshot', {'local_path': os.path.join(workdir, 'shot_{device}.png')}),
+        'take_screenshot[raw]': ('take_screenshot', {'local_path': '', 'max_width': 270, 'return_base64': True}),
+        'screenshot_diff': ('screenshot_diff', {'max_width': 270}),
+        'dump_ui': ('dump_ui', {'refresh': True}),
+        'find_elements': ('find_elements', {'query': 'item1'}),
+        'tap_element': ('tap_element', {'query': 'item1'}),
+        'open_url': ('open_url', {'url': 'https://example.com'}),
+        'get_metrics': ('get_metrics', {}),
+        'wait_for': ('wait_for', {'condition': 'package', 'value': 'com.example.app1', 'timeout': 2}),
+        'get_current_state': ('get_current_state', {'refresh': True}),
+        'run_macro': ('run_macro', {'name': BENCH_MACRO, 'repeat': 3}),
+        'list_macros': ('list_macros', {}),
+    }
+
+
+def uncovered_tools(calls) -> List[str]:
+    """既没有测试调用也不在SKIPPED_TOOLS中的工具，新增工具时需要补上"""
+    from phone_mcp_by_trae.phone_mcp import TOOLS
+
+    covered = {tool_name for tool_name, _ in calls.values()} | set(SKIPPED_TOOLS)
+    return sorted(name for name in TOOLS if name not in covered)
+
+
+def summarize(latencies_ms: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """计算吞吐量和延迟百分位(最近秩法)"""
+    ordered = sorted(latencies_ms)
+
+    def percentile(quantile: float) -> float:
+        if not ordered:
+            return 0.0
+        return round(ordered[min(len(ordered) - 1, int(quantile * len(ordered)))], 1)
+
+    return {
+        'calls': len(ordered),
+        'errors': errors,
+        'throughput': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(ordered[-1], 1) if ordered else 0.0,
+    }
+
+
+def is_error(result: Any) -> bool:
+    return not isinstance(result, dict) or result.get('success') is False
+
+
+async def timed_call(func, arguments: Dict[str, Any], device: str) -> Tuple[float, bool]:
+    """调用一次工具，返回 (耗时毫秒, 是否失败)"""
+    from phone_mcp_by_trae.fleet import DEVICE_PLACEHOLDER
+    from phone_mcp_by_trae.phone_mcp import adb_executor
+
+    arguments = {
+        name: value.replace(DEVICE_PLACEHOLDER, device) if isinstance(value, str) else value
+        for name, value in arguments.items()
+    }
+    started = time.perf_counter()
+    try:
+        with adb_executor.using_device(device):
+            failed = is_error(await func(**arguments))
+    except Exception:
+        failed = True
+    return (time.perf_counter() - started) * 1000, failed
+
+
+async def run_single(calls, serials: List[str], requests: int) -> Dict[str, Any]:
+    """在第一个设备上依次调用每个工具"""
+    from phone_mcp_by_trae.phone_mcp import TOOLS
+
+    results = {}
+    for name, (tool_name, arguments) in calls.items():
+        func = TOOLS[tool_name]
+        await timed_call(func, arguments, serials[0])  # 预热(建立应用索引、连接等)
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            elapsed, failed = await timed_call(func, arguments, serials[0])
+            latencies.append(elapsed)
+            errors += failed
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+    return results
+
+
+async def run_multi(calls, serials: List[str], requests: int) -> Dict[str, Any]:
+    """通过run_on_devices在所有设备上并行调用，吞吐量按设备调用次数计算"""
+    from phone_mcp_by_trae.phone_mcp import run_on_devices
+
+    results = {}
+    for name in MULTI_CALLS:
+        if name not in calls:
+            continue
+        tool_name, arguments = calls[name]
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            result = await run_on_devices(tool_name, serials, arguments, len(serials))
+            for entry in result.get('results', []):
+                latencies.append(entry['elapsed_ms'])
+                errors += not entry['success']
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+    return results
+
+
+async def run_concurrent(calls, serials: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    """按并发数同时发起混合调用，请求轮流分配到各个设备"""
+    from phone_mcp_by_trae.phone_mcp import TOOLS
+
+    mix = [calls[name] for name in CONCURRENT_MIX if name in calls]
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> Tuple[float, bool]:
+        tool_name, arguments = mix[index % len(mix)]
+        async with limit:
+            return await timed_call(TOOLS[tool_name], arguments, serials[index % len(serials)])
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(one(index) for index in range(requests)))
+    return summarize([elapsed for elapsed, _ in outcomes], sum(failed for _, failed in outcomes),
+                     time.perf_counter() - started)
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{title}")
+    print(f"  {'调用':<20} {'次数':>5} {'失败':>5} {'吞吐/s':>8} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9} {'maxms':>9}")
+    for name, row in rows.items():
+        print(f"  {name:<22} {row['calls']:>7} {row['errors']:>7} {row['throughput']:>10} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+
+
+def unused_port() -> int:
+    """返回一个当前未被监听的本地端口，使设备注册表不会连接到真实的adb server"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="MCP工具性能测试(模拟adb)")
+    parser.add_argument("--transport", choices=['subprocess', 'socket'], default='subprocess',
+                        help="模拟adb可执行文件或模拟adb server")
+    parser.add_argument("--scenarios", default=','.join(SCENARIOS), help="逗号分隔的场景")
+    parser.add_argument("--tools", help="逗号分隔的调用名称，默认全部")
+    parser.add_argument("--devices", type=int, default=4, help="模拟设备数量")
+    parser.add_argument("--requests", type=int, default=20,
+                        help="single/multi场景每个调用的次数，concurrent场景为该值乘以并发数")
+    parser.add_argument("--concurrency", default="1,8,32", help="concurrent场景的并发数列表")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="每条命令的基础延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="随机附加延迟的上限")
+    parser.add_argument("--command-latency", default="",
+                        help="按命令覆盖延迟，例如 screencap=120,uiautomator=400")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="命令失败概率")
+    parser.add_argument("--output-bytes", type=int, default=0, help="普通shell输出追加的字节数")
+    parser.add_argument("--png-bytes", type=int, default=300000, help="PNG截图大小")
+    parser.add_argument("--frame-size", default="540x1200", help="原始帧尺寸")
+    parser.add_argument("--ui-nodes", type=int, default=200, help="界面层级节点数")
+    parser.add_argument("--json", help="把结果写入JSON文件")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace, config: StandInConfig, workdir: str) -> Dict[str, Any]:
+    from phone_mcp_by_trae.framebuffer import HAS_NUMPY
+    from phone_mcp_by_trae.phone_mcp import adb_executor, device_registry, macro_store
+
+    calls = tool_calls(workdir)
+    missing = uncovered_tools(calls)
+    if missing:
+        raise SystemExit(f"以下工具没有测试调用，也没有在SKIPPED_TOOLS中说明原因: {', '.join(missing)}")
+    if args.tools:
+        selected = [name.strip() for name in args.tools.split(',') if name.strip()]
+        calls = {name: calls[name] for name in selected if name in calls}
+    if not HAS_NUMPY:
+        for name in NUMPY_CALLS:
+            calls.pop(name, None)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+
+    adb_executor.device_id = config.serials[0]
+    macro_store.save(BENCH_MACRO, BENCH_MACRO_STEPS)
+    if args.transport == 'socket':
+        device_registry.ensure_started(timeout=2.0)
+
+    report = {'skipped': dict(SKIPPED_TOOLS)}  # type: Dict[str, Any]
+    if not HAS_NUMPY:
+        report['skipped'].update({name: "需要NumPy" for name in NUMPY_CALLS})
+    if 'single' in scenarios:
+        report['single'] = await run_single(calls, config.serials, args.requests)
+        print_table("single: 单设备顺序调用", report['single'])
+    if 'multi' in scenarios:
+        report['multi'] = await run_multi(calls, config.serials, args.requests)
+        print_table(f"multi: {len(config.serials)}个设备并行(run_on_devices)", report['multi'])
+    if 'concurrent' in scenarios:
+        report['concurrent'] = {}
+        for level in [int(item) for item in args.concurrency.split(',') if item.strip()]:
+            report['concurrent'][f"c={level}"] = await run_concurrent(
+                calls, config.serials, args.requests * level, level)
+        print_table(f"concurrent: 混合调用 {'/'.join(CONCURRENT_MIX)}", report['concurrent'])
+    return report
+
+
+def main() -> None:
+    args = parse_args()
+    width, _, height = args.frame_size.partition('x')
+    config = StandInConfig(
+        devices=max(1, args.devices), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        command_latency=StandInConfig.from_env({'SIM_ADB_COMMAND_LATENCY': args.command_latency}).command_latency,
+        failure_rate=args.failure_rate, output_bytes=args.output_bytes, png_bytes=args.png_bytes,
+        frame_size=(int(width), int(height)), ui_nodes=args.ui_nodes
+    )
+
+    server = None
+    with tempfile.TemporaryDirectory() as workdir:
+        # 执行器在导入时读取这些环境变量，因此在导入phone_mcp之前设置
+        os.environ.update(config.to_env())
+        os.environ['PHONE_MCP_ADB_PATH'] = write_wrapper(workdir)
+        os.environ['PHONE_MCP_MACRO_DIR'] = os.path.join(workdir, 'macros')
+        if args.transport == 'socket':
+            from phone_mcp_by_trae.fake_adb import FakeADBServer
+            server = FakeADBServer(config.serials, shell_handler=shell_handler(config)).start()
+            os.environ['ANDROID_ADB_SERVER_PORT'] = str(server.port)
+            os.environ['PHONE_MCP_BACKEND'] = 'socket'
+        else:
+            os.environ['ANDROID_ADB_SERVER_PORT'] = str(unused_port())
+            os.environ['PHONE_MCP_BACKEND'] = 'subprocess'
+
+        from phone_mcp_by_trae import phone_mcp
+        try:
+            report = asyncio.run(run(args, config, workdir))
+        finally:
+            phone_mcp.device_registry.stop()
+            phone_mcp.adb_executor.close()
+            if server is not None:
+                server.stop()
+
+    if report['skipped']:
+        print("\n未测试: " + ', '.join(f"{name}({reason})" for name, reason in report['skipped'].items()))
+    if args.json:
+        report['config'] = dict(config.to_env(), transport=args.transport)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,46 @@
 
 """
 Trae Phone MCP - 一个通过ADB命令控制Android手机的MCP插件
+
+导入包本身不会加载任何子模块，下面列出的名称在第一次访问时才从对应模块导入，
+因此命令行工具不必加载MCP服务器，MCP服务器也不必加载命令行解析。
 """
 
-from .phone_mcp import ADBExecutor, app, check_connection, set_device, call, hangup, send_sms, open_app, close_app, tap, swipe, input_text, press_key, take_screenshot, open_url, main
-from .phone_cli import main as cli_main
+import importlib
+
+# 名称 -> (模块, 模块中的属性名)
+_LAZY_ATTRIBUTES = {
+    'cli_main': ('phone_cli', 'main'),
+}
+for _name in (
+    'ADBExecutor', 'app', 'main',
+    'check_connection', 'set_device', 'call', 'hangup', 'send_sms',
+    'open_app', 'list_apps', 'close_app', 'tap', 'swipe', 'long_press', 'pinch', 'multi_touch', 'input_text', 'press_key', 'batch_input',
+    'start_macro', 'stop_macro', 'run_macro', 'list_macros', 'delete_macro', 'wait_for', 'get_current_state', 'push_files', 'pull_files',
+    'take_screenshot', 'screenshot_diff', 'dump_ui', 'find_elements', 'tap_element', 'start_screen_stream', 'stop_screen_stream',
+    'run_on_devices', 'get_metrics', 'open_url'
+):
+    _LAZY_ATTRIBUTES[_name] = ('phone_mcp', _name)
+del _name
 
 __all__ = [
     'ADBExecutor', 'app', 'main', 'cli_main',
     'check_connection', 'set_device', 'call', 'hangup', 'send_sms',
-    'open_app', 'close_app', 'tap', 'swipe', 'input_text', 'press_key',
-    'take_screenshot', 'open_url'
-]
\ No newline at end of file
+    'open_app', 'list_apps', 'close_app', 'tap', 'swipe', 'long_press', 'pinch', 'multi_touch', 'input_text', 'press_key', 'batch_input',
+    'start_macro', 'stop_macro', 'run_macro', 'list_macros', 'delete_macro', 'wait_for', 'get_current_state', 'push_files', 'pull_files',
+    'take_screenshot', 'screenshot_diff', 'dump_ui', 'find_elements', 'tap_element', 'start_screen_stream', 'stop_screen_stream',
+    'run_on_devices', 'get_metrics', 'open_url'
+]
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'{__name__}.{module_name}'), attribute)
+    # 缓存到包的命名空间，之后的访问不再经过__getattr__
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - ADB命令执行器
+
+只依赖标准库中启动较快的模块，命令行工具和MCP服务器共用。
+session和socket后端使用的模块在第一次用到时才导入。
+"""
+
+import contextlib
+import contextvars
+import functools
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from phone_mcp_by_trae.metrics import KIND_ADB, command_label
+
+# socket后端能够直接处理的adb子命令，其余命令仍然通过adb进程执行
+SOCKET_COMMANDS = ('devices', 'shell', 'exec-out', 'pull', 'push')
+
+# 会改变设备界面状态的shell命令，执行后通知输入监听器
+INPUT_COMMAND_PATTERN = re.compile(r'(?:^|[;&|({]\s*|\bthen\s+)(?:input|am|monkey|sendevent)\s')
+
+# 当前上下文(线程或异步任务)中临时使用的设备，优先于ADBExecutor.device_id
+_device_override = contextvars.ContextVar('phone_mcp_device_override', default=None)
+
+# ADBExecutor.execute_command返回的错误信息前缀
+ERROR_PREFIXES = ("ADB命令执行失败", "执行ADB命令时出错")
+
+def command_failed(result: str) -> bool:
+    """判断execute_command的返回值是否表示失败(执行器错误或设备端输出的Error)"""
+    return result.startswith(ERROR_PREFIXES) or 'Error' in result
+
+def is_input_command(command: List[str]) -> bool:
+    """判断adb命令是否为输入或启动应用等会改变界面的操作"""
+    return (len(command) > 1 and command[0] == 'shell'
+            and INPUT_COMMAND_PATTERN.search(' '.join(command[1:])) is not None)
+
+# ADB执行器可用的后端
+BACKEND_SUBPROCESS = 'subprocess'  # 每条命令启动一个adb进程
+BACKEND_SESSION = 'session'        # 每个设备一个常驻adb shell会话
+BACKEND_SOCKET = 'socket'          # 直接通过线协议连接adb server
+BACKEND_REPLAY = 'replay'          # 回放录制的命令结果，不连接设备
+BACKENDS = (BACKEND_SUBPROCESS, BACKEND_SESSION, BACKEND_SOCKET, BACKEND_REPLAY)
+
+# 不针对具体设备的adb命令，执行前不检查设备状态
+HOST_COMMANDS = ('devices', 'start-server', 'kill-server', 'connect', 'disconnect', 'pair', 'version')
+
+@functools.lru_cache(maxsize=None)
+def adb_path() -> str:
+    """返回adb可执行文件的路径，只在第一次调用时解析
+    
+    优先使用环境变量 PHONE_MCP_ADB_PATH，其次在PATH中查找；都找不到时返回"adb"，
+    由执行命令时的错误信息提示用户安装adb。
+    """
+    return os.environ.get('PHONE_MCP_ADB_PATH') or shutil.which('adb') or 'adb'
+
+class ADBCommandError(Exception):
+    """ADB命令执行失败"""
+
+class ProcessStream:
+    """长时间运行的adb进程的stdout流"""
+    
+    def __init__(self, command: List[str]):
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        
+    def read(self, size: int = 65536) -> bytes:
+        """读取最多size字节，进程结束时返回空bytes"""
+        return self.process.stdout.read1(size)
+        
+    def close(self) -> None:
+        """结束进程"""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdout.close()
+        self.process.wait()
+
+# ADB执行器类
+class ADBExecutor:
+    """ADB命令执行器"""
+    
+    def __init__(self, backend: Optional[str] = None):
+        """初始化ADB执行器
+        
+        Args:
+            backend: 执行后端，可选 subprocess、session、socket、replay。
+                为None时读取环境变量 PHONE_MCP_BACKEND；
+                兼容旧的 PHONE_MCP_SHELL_SESSION=1 (等同于session)。
+                replay后端回放 PHONE_MCP_REPLAY_FILE 指向的录制日志，
+                PHONE_MCP_REPLAY_TIMING=original 时按录制时的耗时返回
+        
+        设置环境变量 PHONE_MCP_RECORD_FILE 时，所有命令及其结果都会录制到该文件。
+        """
+        self._device_id = None  # type: Optional[str]
+        if backend is None:
+            backend = os.environ.get('PHONE_MCP_BACKEND', '').lower()
+            if not backend and os.environ.get('PHONE_MCP_SHELL_SESSION', '').lower() in ('1', 'true', 'yes'):
+                backend = BACKEND_SESSION
+        backend = backend or BACKEND_SUBPROCESS
+        if backend not in BACKENDS:
+            raise ValueError(f"未知的ADB执行后端: {backend}")
+        self.backend = backend
+        self._sessions = {}  # 设备ID -> ShellSession
+        self._sessions_lock = threading.Lock()
+        self._client = None  # 线协议客户端ADBClient，首次使用时创建
+        self._input_listeners = []  # type: List[Callable[[Optional[str]], None]]
+        # 执行设备命令前以设备ID调用，设备不可用时抛出ADBCommandError，例如DeviceRegistry.check
+        self.device_guard = None  # type: Optional[Callable[[Optional[str]], None]]
+        # 设置为MetricsRegistry后记录每条命令的耗时、退出码和输出大小
+        self.metrics = None
+        # 设置为CommandRecorder后录制每条命令的结果
+        self.recorder = None
+        record_file = os.environ.get('PHONE_MCP_RECORD_FILE')
+        if record_file:
+            from phone_mcp_by_trae.adb_replay import CommandRecorder
+            self.recorder = CommandRecorder(record_file)
+        # replay后端使用的CommandReplayer
+        self.replayer = None
+        if backend == BACKEND_REPLAY:
+            from phone_mcp_by_trae.adb_replay import CommandReplayer
+            replay_file = os.environ.get('PHONE_MCP_REPLAY_FILE')
+            if not replay_file:
+                raise ValueError("replay后端需要设置环境变量 PHONE_MCP_REPLAY_FILE")
+            self.replayer = CommandReplayer(
+                replay_file,
+                timing=os.environ.get('PHONE_MCP_REPLAY_TIMING', 'fast').lower(),
+                speed=float(os.environ.get('PHONE_MCP_REPLAY_SPEED', '1'))
+            )
+        
+    @property
+    def device_id(self) -> Optional[str]:
+        """当前使用的设备ID，using_device设置的上下文设备优先"""
+        override = _device_override.get()
+        return override if override is not None else self._device_id
+        
+    @device_id.setter
+    def device_id(self, device_id: Optional[str]) -> None:
+        self._device_id = device_id
+        
+    @contextlib.contextmanager
+    def using_device(self, device_id: str):
+        """在当前上下文中临时切换设备，不影响其他线程和全局设置
+        
+        用法::
+        
+            with adb_executor.using_device('emulator-5554'):
+                tap(100, 200)
+        """
+        token = _device_override.set(device_id)
+        try:
+            yield self
+        finally:
+            _device_override.reset(token)
+        
+    def _adb_prefix(self, device_id: Optional[str] = None) -> List[str]:
+        """返回带设备参数的adb命令前缀"""
+        device_id = device_id or self.device_id
+        if device_id:
+            # 如果设置了设备ID，添加-s参数
+            return [adb_path(), '-s', device_id]
+        return [adb_path()]
+        
+    def _get_session(self):
+        """获取当前设备的常驻shell会话，不存在时创建"""
+        from phone_mcp_by_trae.adb_shell import ShellSession
+        
+        with self._sessions_lock:
+            session = self._sessions.get(self.device_id)
+            if session is None:
+                session = ShellSession(self._adb_prefix())
+                self._sessions[self.device_id] = session
+            return session
+            
+    @property
+    def client(self):
+        """线协议客户端，首次使用时创建"""
+        if self._client is None:
+            from phone_mcp_by_trae.adb_protocol import ADBClient
+            self._client = ADBClient()
+        return self._client
+        
+    def execute_command(self, command: List[str]) -> str:
+        """执行ADB命令并返回输出"""
+        try:
+            return_code, stdout, stderr = self._run(command)
+        except Exception as e:
+            error_message = f"执行ADB命令时出错: {str(e)}"
+            print(error_message, file=sys.stderr)
+            return error_message
+        if return_code != 0:
+            error_message = f"ADB命令执行失败: {stderr.strip()}"
+            print(error_message, file=sys.stderr)
+            return error_message
+        return stdout.strip()
+        
+    def execute_binary(self, command: List[str]) -> bytes:
+        """执行ADB命令并返回原始二进制输出，适用于 `exec-out` 等命令
+        
+        Raises:
+            ADBCommandError: 命令执行失败
+        """
+        try:
+            return_code, stdout, stderr = self._run(command, binary=True)
+        except Exception as e:
+            raise ADBCommandError(f"执行ADB命令时出错: {str(e)}")
+        if return_code != 0:
+            raise ADBCommandError(f"ADB命令执行失败: {stderr.strip()}")
+        return stdout
+        
+    def open_stream(self, command: List[str], device_id: Optional[str] = None):
+        """启动长时间运行的命令，返回其stdout的二进制流
+        
+        返回的对象提供 read(size) 和 close()，关闭时会结束命令。
+        
+        Args:
+            command: adb子命令及参数，例如 ['exec-out', 'screenrecord', ...]
+            device_id: 目标设备，默认使用当前设备
+        """
+        device_id = device_id or self.device_id
+        if self.backend == BACKEND_REPLAY:
+            raise ADBCommandError("回放模式不支持长时间运行的命令")
+        if self.backend == BACKEND_SOCKET and command[0] in ('exec-out', 'shell'):
+            service = 'exec:' if command[0] == 'exec-out' else 'shell:'
+            return self.client.open_service(device_id, service + ' '.join(command[1:]))
+        return ProcessStream(self._adb_prefix(device_id) + command)
+        
+    def add_input_listener(self, listener: Callable[[Optional[str]], None]) -> None:
+        """注册输入监听器，设备上执行输入类命令后以设备ID调用"""
+        self._input_listeners.append(listener)
+        
+    def _run(self, command: List[str], binary: bool = False) -> Tuple[int, Any, str]:
+        """执行命令，输入类命令执行后通知监听器"""
+        self.check_device(command)
+        started = time.perf_counter()
+        result = None
+        try:
+            result = self._dispatch(command, binary)
+            return result
+        finally:
+            self.record_command(command, started, result)
+            self.notify_input(command)
+            
+    def check_device(self, command: List[str]) -> None:
+        """设备命令执行前调用device_guard，设备不可用时由其抛出异常"""
+        if self.device_guard is not None and command and command[0] not in HOST_COMMANDS:
+            self.device_guard(self.device_id)
+            
+    def record_command(self, command: List[str], started: float,
+                       result: Optional[Tuple[int, Any, Any]]) -> None:
+        """把命令的耗时和结果记录到metrics和录制日志，result为None表示执行时抛出了异常"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if self.metrics is not None:
+            return_code, stdout = (result[0], result[1]) if result is not None else (-1, b'')
+            self.metrics.record(KIND_ADB, command_label(command), self.device_id,
+                                elapsed_ms, return_code != 0, len(stdout))
+        if self.recorder is not None and result is not None:
+            self.recorder.record_command(self.device_id, command, result, elapsed_ms)
+            
+    def notify_input(self, command: List[str]) -> None:
+        """命令为输入类命令时通知所有输入监听器"""
+        if is_input_command(command):
+            self.mark_input()
+            
+    def mark_input(self) -> None:
+        """通知所有输入监听器当前设备上执行了输入，用于无法从命令行判断的情况(例如设备上的宏脚本)"""
+        for listener in self._input_listeners:
+            listener(self.device_id)
+        
+    def _dispatch(self, command: List[str], binary: bool = False) -> Tuple[int, Any, str]:
+        """按当前后端执行命令
+        
+        Args:
+            command: adb子命令及参数
+            binary: 为True时stdout以bytes返回，否则解码为文本
+        
+        Returns:
+            (退出码, stdout, stderr)
+        """
+        if self.backend == BACKEND_REPLAY:
+            return self.replayer.respond(self.device_id, command, binary)
+        if not binary and self.backend == BACKEND_SESSION and len(command) > 1 and command[0] == 'shell':
+            # 与 `adb shell a b c` 相同，参数以空格拼接后交给设备端shell解析
+            return self._get_session().run(' '.join(command[1:]))
+        if self.backend == BACKEND_SOCKET and command and command[0] in SOCKET_COMMANDS:
+            return_code, stdout, stderr = self._run_over_socket(command)
+        else:
+            result = subprocess.run(
+                self._adb_prefix() + command,
+                capture_output=True
+            )
+            return_code, stdout, stderr = result.returncode, result.stdout, result.stderr
+        if not binary:
+            stdout = stdout.decode('utf-8', 'replace')
+        return return_code, stdout, stderr.decode('utf-8', 'replace')
+        
+    def _run_over_socket(self, command: List[str]) -> Tuple[int, bytes, bytes]:
+        """通过线协议执行命令，输出格式与adb命令行保持一致"""
+        from phone_mcp_by_trae.adb_protocol import ADBProtocolError
+        
+        name = command[0]
+        try:
+            if name == 'devices':
+                lines = ''.join(f"{serial}\t{state}\n" for serial, state in self.client.devices())
+                return 0, ("List of devices attached\n" + lines).encode('utf-8'), b''
+            if name == 'shell':
+                return self.client.shell(self.device_id, ' '.join(command[1:]))
+            if name == 'exec-out':
+                return 0, self.client.exec_out(self.device_id, ' '.join(command[1:])), b''
+            if name == 'pull':
+                remote_path, local_path = command[1], command[2]
+                with open(local_path, 'wb') as stream:
+                    size = self.client.pull(self.device_id, remote_path, stream)
+                return 0, f"{remote_path}: 1 file pulled, {size} bytes".encode('utf-8'), b''
+            if name == 'push':
+                local_path, remote_path = command[1], command[2]
+                with open(local_path, 'rb') as stream:
+                    size = self.client.push(self.device_id, stream, remote_path,
+                                            os.stat(local_path).st_mode & 0o777,
+                                            int(os.path.getmtime(local_path)))
+                return 0, f"{local_path}: 1 file pushed, {size} bytes".encode('utf-8'), b''
+        except ADBProtocolError as e:
+            return 1, b'', str(e).encode('utf-8')
+        raise ValueError(f"socket后端不支持的命令: {name}")
+            
+    def close(self) -> None:
+        """关闭所有常驻shell会话和socket连接"""
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self.recorder is not None:
+            self.recorder.close()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - ADB线协议客户端
+
+直接通过TCP连接本地adb server(默认5037端口)，使用host协议
+(`host:transport:<serial>`、`shell:`、`exec:`、`sync:`)与设备通信，
+不再启动任何 `adb` 子进程。
+
+adb server在打开服务后会把该连接变为服务数据流，因此一个socket只能执行一条命令。
+连接池为每个设备预先建立并完成 `host:transport` 切换的socket，
+取用后在后台补充，这样每条命令只需要一次服务请求。
+"""
+
+import os
+import select
+import socket
+import stat
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5037
+
+# shell协议v2的数据包类型
+SHELL_ID_STDIN = 0
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+
+# 没有收到退出码(连接在命令结束前断开)时返回的退出码，与adb命令行一致
+LOST_EXIT_CODE = 255
+_LOST_EXIT_MESSAGE = "连接在命令结束前断开，没有收到退出码\n".encode('utf-8')
+
+# sync协议单个DATA包的最大长度
+SYNC_DATA_MAX = 64 * 1024
+
+
+class ADBProtocolError(Exception):
+    """adb server返回FAIL或连接异常"""
+
+
+class ADBConnection:
+    """到adb server的单个socket连接"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    def send_request(self, payload: str) -> None:
+        """发送一条带4位十六进制长度前缀的请求并检查OKAY/FAIL状态"""
+        data = payload.encode('utf-8')
+        self.sock.sendall(b'%04x' % len(data) + data)
+        self.read_status()
+
+    def read_status(self) -> None:
+        """读取OKAY/FAIL状态，FAIL时抛出带错误信息的异常"""
+        status = self.read_exactly(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise ADBProtocolError(self.read_string().decode('utf-8', 'replace'))
+        raise ADBProtocolError(f"未知的adb server响应: {status!r}")
+
+    def read_string(self) -> bytes:
+        """读取带4位十六进制长度前缀的字符串"""
+        length = int(self.read_exactly(4), 16)
+        return self.read_exactly(length)
+
+    def read_exactly(self, size: int) -> bytes:
+        """读取指定长度的数据，连接提前关闭时抛出异常"""
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = self.sock.recv(remaining)
+            if not chunk:
+                raise ADBProtocolError("adb server连接已关闭")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def read(self, size: int = 65536) -> bytes:
+        """读取最多size字节，连接关闭时返回空bytes"""
+        return self.sock.recv(size)
+
+    def read_all(self) -> bytes:
+        """读取数据直到连接关闭"""
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def is_stale(self) -> bool:
+        """空闲连接如果已经可读，说明对端已关闭或状态异常"""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def close(self) -> None:
+        """关闭连接"""
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ADBClient:
+    """adb server线协议客户端，为每个设备维护一个小型连接池"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 pool_size: int = 2, timeout: Optional[float] = None):
+        """初始化客户端
+
+        Args:
+            host: adb server地址，默认读取 ANDROID_ADB_SERVER_ADDRESS 或使用127.0.0.1
+            port: adb server端口，默认读取 ANDROID_ADB_SERVER_PORT 或使用5037
+            pool_size: 每个设备预先建立的连接数
+            timeout: socket超时时间(秒)，None表示不限制
+        """
+        self.host = host or os.environ.get('ANDROID_ADB_SERVER_ADDRESS', DEFAULT_HOST)
+        self.port = port or int(os.environ.get('ANDROID_ADB_SERVER_PORT', DEFAULT_PORT))
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pools = {}  # type: Dict[Optional[str], List[ADBConnection]]
+        self._lock = threading.Lock()
+        self._refiller = ThreadPoolExecutor(max_workers=1)
+
+    # ---- 连接管理 ----
+
+    def connect(self) -> ADBConnection:
+        """建立到adb server的新连接"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return ADBConnection(sock)
+
+    def _open_transport(self, serial: Optional[str]) -> ADBConnection:
+        """建立新连接并切换到指定设备的transport"""
+        connection = self.connect()
+        try:
+            if serial:
+                connection.send_request(f'host:transport:{serial}')
+            else:
+                connection.send_request('host:transport-any')
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _acquire(self, serial: Optional[str]) -> Tuple[ADBConnection, bool]:
+        """从连接池取出一个已切换transport的连接
+
+        Returns:
+            (连接, 是否来自连接池)
+        """
+        connection = None
+        with self._lock:
+            pool = self._pools.setdefault(serial, [])
+            while pool:
+                candidate = pool.pop()
+                if candidate.is_stale():
+                    candidate.close()
+                    continue
+                connection = candidate
+                break
+        self._refiller.submit(self._refill, serial)
+        if connection is not None:
+            return connection, True
+        return self._open_transport(serial), False
+
+    def _refill(self, serial: Optional[str]) -> None:
+        """在后台把连接池补充到pool_size"""
+        while True:
+            with self._lock:
+                if len(self._pools.setdefault(serial, [])) >= self.pool_size:
+                    return
+            try:
+                connection = self._open_transport(serial)
+            except (OSError, ADBProtocolError):
+                return
+            with self._lock:
+                self._pools[serial].append(connection)
+
+    def open_service(self, serial: Optional[str], service: str) -> ADBConnection:
+        """在指定设备上打开服务，返回承载该服务数据流的连接
+
+        连接池中的连接可能因设备断开而失效，此时改用新连接重试一次。
+        """
+        connection, pooled = self._acquire(serial)
+        try:
+            connection.send_request(service)
+            return connection
+        except (OSError, ADBProtocolError):
+            connection.close()
+            if not pooled:
+                raise
+        connection = self._open_transport(serial)
+        try:
+            connection.send_request(service)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def close(self) -> None:
+        """关闭连接池中的所有连接"""
+        self._refiller.shutdown(wait=False)
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            for connection in pool:
+                connection.close()
+
+    # ---- host服务 ----
+
+    def host_command(self, service: str) -> str:
+        """执行返回单个字符串的host服务，例如 host:version"""
+        connection = self.connect()
+        try:
+            connection.send_request(service)
+            return connection.read_string().decode('utf-8', 'replace')
+        finally:
+            connection.close()
+
+    def version(self) -> int:
+        """返回adb server的协议版本"""
+        return int(self.host_command('host:version'), 16)
+
+    def devices(self) -> List[Tuple[str, str]]:
+        """返回 (序列号, 状态) 列表"""
+        return parse_device_list(self.host_command('host:devices'))
+
+    def track_devices(self) -> 'DeviceTracker':
+        """订阅设备列表变化，返回的连接上每次变化都会收到完整的设备列表"""
+        connection = self.connect()
+        try:
+            connection.send_request('host:track-devices')
+        except Exception:
+            connection.close()
+            raise
+        return DeviceTracker(connection)
+
+    # ---- 设备服务 ----
+
+    def shell(self, serial: Optional[str], command: str) -> Tuple[int, bytes, bytes]:
+        """执行shell命令
+
+        优先使用shell协议v2以分别获取stdout、stderr和退出码，
+        设备不支持时退回到 `shell:`，此时stderr并入stdout。
+
+        Returns:
+            (退出码, stdout, stderr)
+        """
+        try:
+            connection = self.open_service(serial, f'shell,v2,raw:{command}')
+        except ADBProtocolError:
+            return self._shell_v1(serial, command)
+        try:
+            return self._read_shell_v2(connection)
+        finally:
+            connection.close()
+
+    def _shell_v1(self, serial: Optional[str], command: str) -> Tuple[int, bytes, bytes]:
+        """旧版shell服务，通过追加的标记取得退出码"""
+        marker = b'__PHONE_MCP_EXIT__'
+        connection = self.open_service(serial, f'shell:{command}; echo {marker.decode()}$?')
+        try:
+            output = connection.read_all()
+        finally:
+            connection.close()
+        index = output.rfind(marker)
+        if index < 0:
+            return LOST_EXIT_CODE, output, _LOST_EXIT_MESSAGE
+        try:
+            exit_code = int(output[index + len(marker):].strip() or b'0')
+        except ValueError:
+            exit_code = 1
+        return exit_code, output[:index], b''
+
+    @staticmethod
+    def _read_shell_v2(connection: ADBConnection) -> Tuple[int, bytes, bytes]:
+        """读取shell协议v2的数据包直到收到退出码，连接先断开时返回LOST_EXIT_CODE"""
+        stdout = []
+        stderr = []
+        while True:
+            try:
+                packet_id, length = struct.unpack('<BI', connection.read_exactly(5))
+                data = connection.read_exactly(length)
+            except ADBProtocolError:
+                stderr.append(_LOST_EXIT_MESSAGE)
+                return LOST_EXIT_CODE, b''.join(stdout), b''.join(stderr)
+            if packet_id == SHELL_ID_STDOUT:
+                stdout.append(data)
+            elif packet_id == SHELL_ID_STDERR:
+                stderr.append(data)
+            elif packet_id == SHELL_ID_EXIT:
+                return data[0] if data else 0, b''.join(stdout), b''.join(stderr)
+
+    def exec_out(self, serial: Optional[str], command: str) -> bytes:
+        """执行命令并返回原始二进制输出，对应 `adb exec-out`"""
+        connection = self.open_service(serial, f'exec:{command}')
+        try:
+            return connection.read_all()
+        finally:
+            connection.close()
+
+    # ---- sync服务 ----
+
+    def stat(self, serial: Optional[str], path: str) -> Tuple[int, int, int]:
+        """获取设备文件状态
+
+        Returns:
+            (mode, size, mtime)，文件不存在时mode为0
+        """
+        connection = self.open_service(serial, 'sync:')
+        try:
+            _send_sync_request(connection, b'STAT', path.encode('utf-8'))
+            response = connection.read_exactly(16)
+            if response[:4] != b'STAT':
+                raise ADBProtocolError(f"无效的STAT响应: {response[:4]!r}")
+            return struct.unpack('<III', response[4:])
+        finally:
+            _quit_sync(connection)
+
+    def pull(self, serial: Optional[str], remote_path: str, stream: BinaryIO) -> int:
+        """把设备文件流式写入stream，返回字节数"""
+        connection = self.open_service(serial, 'sync:')
+        try:
+            _send_sync_request(connection, b'RECV', remote_path.encode('utf-8'))
+            total = 0
+            while True:
+                packet_id, length = struct.unpack('<4sI', connection.read_exactly(8))
+                if packet_id == b'DATA':
+                    stream.write(connection.read_exactly(length))
+                    total += length
+                elif packet_id == b'DONE':
+                    return total
+                elif packet_id == b'FAIL':
+                    raise ADBProtocolError(connection.read_exactly(length).decode('utf-8', 'replace'))
+                else:
+                    raise ADBProtocolError(f"无效的sync响应: {packet_id!r}")
+        finally:
+            _quit_sync(connection)
+
+    def push(self, serial: Optional[str], stream: BinaryIO, remote_path: str,
+             mode: int = 0o644, mtime: int = 0) -> int:
+        """把stream中的数据流式写入设备文件，返回字节数"""
+        connection = self.open_service(serial, 'sync:')
+        try:
+            spec = f'{remote_path},{stat.S_IFREG | mode}'.encode('utf-8')
+            _send_sync_request(connection, b'SEND', spec)
+            total = 0
+            while True:
+                chunk = stream.read(SYNC_DATA_MAX)
+                if not chunk:
+                    break
+                connection.sock.sendall(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+                total += len(chunk)
+            connection.sock.sendall(b'DONE' + struct.pack('<I', mtime))
+            packet_id, length = struct.unpack('<4sI', connection.read_exactly(8))
+            if packet_id == b'FAIL':
+                raise ADBProtocolError(connection.read_exactly(length).decode('utf-8', 'replace'))
+            if packet_id != b'OKAY':
+                raise ADBProtocolError(f"无效的sync响应: {packet_id!r}")
+            return total
+        finally:
+            _quit_sync(connection)
+
+
+class DeviceTracker:
+    """host:track-devices 连接，adb server在设备连接、断开或状态变化时推送完整列表"""
+
+    def __init__(self, connection: ADBConnection):
+        self.connection = connection
+
+    def read_devices(self) -> List[Tuple[str, str]]:
+        """阻塞直到收到下一份设备列表
+
+        Raises:
+            ADBProtocolError: 连接已关闭(例如adb server退出)
+        """
+        return parse_device_list(self.connection.read_string().decode('utf-8', 'replace'))
+
+    def close(self) -> None:
+        """关闭连接，正在阻塞的read_devices会抛出异常返回"""
+        try:
+            self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+
+def parse_device_list(output: str) -> List[Tuple[str, str]]:
+    """解析host:devices格式的 "序列号\t状态" 列表"""
+    devices = []
+    for line in output.splitlines():
+        parts = line.split('\t')
+        if len(parts) >= 2:
+            devices.append((parts[0], parts[1]))
+    return devices
+
+
+def _send_sync_request(connection: ADBConnection, request_id: bytes, data: bytes) -> None:
+    """发送一个sync协议请求"""
+    connection.sock.sendall(request_id + struct.pack('<I', len(data)) + data)
+
+
+def _quit_sync(connection: ADBConnection) -> None:
+    """结束sync会话并关闭连接"""
+    try:
+        connection.sock.sendall(b'QUIT' + struct.pack('<I', 0))
+    except OSError:
+        pass
+    connection.close()
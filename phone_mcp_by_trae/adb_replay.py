@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - ADB命令录制与回放
+
+录制：ADBExecutor把每条命令连同设备、stdout、stderr、退出码和耗时追加到一个JSON Lines日志，
+MCP工具调用(名称和参数)也写入同一个日志，文件名以 .gz 结尾时使用gzip压缩。
+
+回放：replay后端按 (设备, 命令) 依次返回录制的结果，不需要连接设备；可以按录制时的耗时等待，
+也可以立即返回，用于在没有设备的情况下分析服务器自身(JSON编码、解析、调度)的开销和做回归测试。
+
+日志格式(每行一个JSON对象，空字段省略)::
+
+    {"v": 1, "started": 1700000000.0}                              文件头
+    {"t": 0.12, "tool": "tap", "args": {"x": 1, "y": 2}, "d": ...}  工具调用
+    {"t": 0.13, "c": ["shell", "input", "tap", "1", "2"], "d": "emulator-5554",
+     "rc": 0, "o": "文本输出", "b": "二进制输出的base64", "e": "stderr", "ms": 35.2}
+"""
+
+import base64
+import collections
+import gzip
+import json
+import re
+import threading
+import time
+from typing import Any, Deque, Dict, IO, Iterator, List, Optional, Tuple
+
+from phone_mcp_by_trae.adb_shell import STEP_MARKER_PREFIX
+from phone_mcp_by_trae.metrics import command_label
+
+LOG_VERSION = 1
+
+TIMING_FAST = 'fast'          # 立即返回
+TIMING_ORIGINAL = 'original'  # 按录制时的耗时等待
+TIMINGS = (TIMING_FAST, TIMING_ORIGINAL)
+
+# 每次执行都不同的命令片段(批量输入的步骤标记)，匹配时替换为固定占位符
+_VOLATILE_PATTERN = re.compile(re.escape(STEP_MARKER_PREFIX) + r'[0-9a-f]{32}__')
+_VOLATILE_PLACEHOLDER = STEP_MARKER_PREFIX + '*__'
+
+
+def _open_log(path: str, mode: str) -> IO[str]:
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_log(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取日志中的记录(不含文件头)"""
+    with _open_log(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                if 'v' not in entry:
+                    yield entry
+
+
+class CommandRecorder:
+    """把命令和工具调用追加到日志文件，线程安全"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = _open_log(path, 'a')
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._write({'v': LOG_VERSION, 'started': time.time()})
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + '\n')
+                self._file.flush()
+
+    def _offset(self) -> float:
+        return round(time.perf_counter() - self._started, 4)
+
+    def record_command(self, device_id: Optional[str], command: List[str],
+                       result: Tuple[int, Any, str], elapsed_ms: float) -> None:
+        """记录一条执行完成的命令，stdout为bytes时以base64保存"""
+        return_code, stdout, stderr = result
+        entry = {'t': self._offset(), 'c': command, 'd': device_id, 'rc': return_code,
+                 'ms': round(elapsed_ms, 2)}  # type: Dict[str, Any]
+        if isinstance(stdout, bytes):
+            if stdout:
+                entry['b'] = base64.b64encode(stdout).decode('ascii')
+        elif stdout:
+            entry['o'] = stdout
+        if stderr:
+            entry['e'] = stderr
+        self._write(entry)
+
+    def record_tool(self, device_id: Optional[str], name: str, arguments: Dict[str, Any]) -> None:
+        """记录一次工具调用"""
+        self._write({'t': self._offset(), 'tool': name, 'args': arguments, 'd': device_id})
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _Response:
+    """一条录制的命令结果"""
+
+    __slots__ = ('return_code', 'stdout', 'binary', 'stderr', 'elapsed_ms', 'marker')
+
+    def __init__(self, entry: Dict[str, Any]):
+        self.return_code = entry.get('rc', 0)
+        self.binary = 'b' in entry
+        self.stdout = base64.b64decode(entry['b']) if self.binary else entry.get('o', '')
+        self.stderr = entry.get('e', '')
+        self.elapsed_ms = entry.get('ms', 0.0)
+        match = _VOLATILE_PATTERN.search(' '.join(entry['c']))
+        self.marker = match.group(0) if match else None
+
+
+def _normalize(command: List[str]) -> str:
+    return _VOLATILE_PATTERN.sub(_VOLATILE_PLACEHOLDER, '\0'.join(command))
+
+
+class CommandReplayer:
+    """按录制日志回放命令结果
+
+    查找顺序：同一设备的同一命令、任意设备的同一命令、同类命令(command_label相同，例如 shell input)。
+    每个键的结果按录制顺序依次返回，用完后重复最后一条，因此同一日志的回放结果是确定的。
+    """
+
+    def __init__(self, path: str, timing: str = TIMING_FAST, speed: float = 1.0):
+        """加载日志
+
+        Args:
+            path: 录制日志路径
+            timing: fast 立即返回，original 按录制时的耗时等待
+            speed: original模式下的速度倍数，2表示耗时减半
+        """
+        if timing not in TIMINGS:
+            raise ValueError(f"未知的回放方式: {timing}")
+        self.timing = timing
+        self.speed = speed if speed > 0 else 1.0
+        self._queues = {}  # type: Dict[Tuple[str, Any], Deque[_Response]]
+        self._last = {}  # type: Dict[Tuple[str, Any], _Response]
+        self._lock = threading.Lock()
+        self.stats = {'exact': 0, 'any_device': 0, 'similar': 0, 'missing': 0}
+        for entry in read_log(path):
+            if 'c' not in entry:
+                continue
+            response = _Response(entry)
+            command = _normalize(entry['c'])
+            for key in (('exact', (entry.get('d'), command)),
+                        ('any_device', command),
+                        ('similar', command_label(entry['c']))):
+                self._queues.setdefault(key, collections.deque()).append(response)
+
+    def _take(self, key: Tuple[str, Any]) -> Optional[_Response]:
+        queue = self._queues.get(key)
+        if queue:
+            self._last[key] = queue.popleft()
+        return self._last.get(key)
+
+    def respond(self, device_id: Optional[str], command: List[str], binary: bool = False) -> Tuple[int, Any, str]:
+        """返回命令的录制结果，格式与ADBExecutor._dispatch相同；没有录制时返回失败"""
+        normalized = _normalize(command)
+        response = None
+        with self._lock:
+            for kind, key in (('exact', (device_id, normalized)),
+                              ('any_device', normalized),
+                              ('similar', command_label(command))):
+                response = self._take((kind, key))
+                if response is not None:
+                    self.stats[kind] += 1
+                    break
+            else:
+                self.stats['missing'] += 1
+        if response is None:
+            return 1, b'' if binary else '', f"error: no recorded response for: {' '.join(command)}"
+
+        if self.timing == TIMING_ORIGINAL:
+            time.sleep(response.elapsed_ms / 1000 / self.speed)
+
+        stdout = response.stdout
+        if response.marker:
+            # 录制时的步骤标记换成本次命令中的标记，批量输入才能找到各步结果
+            match = _VOLATILE_PATTERN.search(' '.join(command))
+            if match:
+                stdout = (stdout.replace(response.marker.encode('ascii'), match.group(0).encode('ascii'))
+                          if response.binary else stdout.replace(response.marker, match.group(0)))
+        if binary and not response.binary:
+            stdout = stdout.encode('utf-8')
+        elif not binary and response.binary:
+            stdout = stdout.decode('utf-8', 'replace')
+        return response.return_code, stdout, response.stderr
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 常驻adb shell会话
+
+每个设备保持一个长期运行的交互式 `adb shell` 进程，命令通过stdin写入，
+并用每条命令独有的标记分隔stdout、stderr和退出码，避免每次操作都重新启动adb进程。
+"""
+
+import queue
+import subprocess
+import threading
+import uuid
+from typing import List, Optional, Tuple
+
+# 批量输入、文本输入等脚本中步骤标记的前缀
+STEP_MARKER_PREFIX = '__PHONE_MCP_STEP_'
+
+
+class ShellSessionError(Exception):
+    """shell会话异常退出或无法启动"""
+
+
+def quote_shell_arg(arg: str) -> str:
+    """用单引号对设备端shell参数进行转义"""
+    return "'" + arg.replace("'", "'\\''") + "'"
+
+
+def new_marker() -> str:
+    """生成步骤标记，每次调用不同，避免与命令自身的输出混淆；录制回放时按前缀识别"""
+    return f"{STEP_MARKER_PREFIX}{uuid.uuid4().hex}__"
+
+
+class ShellSession:
+    """单个设备上的常驻adb shell会话"""
+
+    def __init__(self, adb_command: List[str], timeout: Optional[float] = None):
+        """初始化shell会话
+
+        Args:
+            adb_command: 启动adb的命令前缀，例如 ['adb', '-s', 'emulator-5554']
+            timeout: 等待单条命令完成的超时时间(秒)，None表示不限制
+        """
+        self.adb_command = adb_command
+        self.timeout = timeout
+        self._process = None  # type: Optional[subprocess.Popen]
+        self._stdout = None  # type: Optional[queue.Queue]
+        self._stderr = None  # type: Optional[queue.Queue]
+        self._lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        """检查shell进程是否仍在运行"""
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self) -> None:
+        """启动adb shell进程以及读取stdout/stderr的后台线程"""
+        self._kill()
+        self._process = subprocess.Popen(
+            self.adb_command + ['shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        self._stdout = queue.Queue()
+        self._stderr = queue.Queue()
+        for stream, lines in ((self._process.stdout, self._stdout),
+                              (self._process.stderr, self._stderr)):
+            reader = threading.Thread(target=self._pump, args=(stream, lines), daemon=True)
+            reader.start()
+
+    @staticmethod
+    def _pump(stream, lines: queue.Queue) -> None:
+        """把输出流逐行放入队列，流结束时放入None"""
+        try:
+            for line in iter(stream.readline, ''):
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def _kill(self) -> None:
+        """结束当前shell进程"""
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        if self._process.poll() is None:
+            self._process.kill()
+        try:
+            self._process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        self._process = None
+
+    def _read_until(self, lines: queue.Queue, marker: str) -> Tuple[str, str]:
+        """读取输出直到遇到标记行
+
+        Returns:
+            (标记之前的输出, 标记所在行中标记之后的内容)
+        """
+        chunks = []
+        while True:
+            try:
+                line = lines.get(timeout=self.timeout)
+            except queue.Empty:
+                raise ShellSessionError("等待shell命令输出超时")
+            if line is None:
+                raise ShellSessionError("adb shell会话意外退出")
+            index = line.find(marker)
+            if index >= 0:
+                chunks.append(line[:index])
+                return ''.join(chunks), line[index + len(marker):].strip()
+            chunks.append(line)
+
+    def run(self, command: str) -> Tuple[int, str, str]:
+        """在会话中执行一条shell命令
+
+        命令在独立的 `sh -c` 中运行，因此命令本身的语法错误或读取stdin
+        都不会破坏会话。如果会话在写入命令前已经退出，会自动重启后重试一次。
+
+        Args:
+            command: 要执行的shell命令行
+
+        Returns:
+            (退出码, stdout, stderr)
+        """
+        marker = '__PHONE_MCP_{}__'.format(uuid.uuid4().hex)
+        script = (
+            "sh -c {} </dev/null; "
+            "echo {marker} $?; echo {marker} >&2\n"
+        ).format(quote_shell_arg(command), marker=marker)
+
+        with self._lock:
+            for attempt in range(2):
+                if not self.is_alive():
+                    self._start()
+                try:
+                    self._process.stdin.write(script)
+                    self._process.stdin.flush()
+                    break
+                except (BrokenPipeError, OSError, ValueError):
+                    # 会话已经失效，重启后再试一次
+                    self._kill()
+                    if attempt:
+                        raise ShellSessionError("无法向adb shell会话写入命令")
+
+            try:
+                stdout, exit_code = self._read_until(self._stdout, marker)
+                stderr, _ = self._read_until(self._stderr, marker)
+            except ShellSessionError:
+                # 命令执行过程中会话中断，不重试以免重复执行输入操作
+                self._kill()
+                raise
+
+        try:
+            return_code = int(exit_code)
+        except ValueError:
+            return_code = 1
+        return return_code, stdout, stderr
+
+    def close(self) -> None:
+        """关闭shell会话"""
+        with self._lock:
+            self._kill()
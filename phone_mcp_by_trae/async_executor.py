@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 异步ADB命令执行器
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from phone_mcp_by_trae.adb_executor import BACKEND_SUBPROCESS, ADBCommandError, ADBExecutor
+
+def run_in_thread(func: Callable[..., Any], *args: Any) -> Awaitable[Any]:
+    """在默认线程池中执行同步函数，并带上当前上下文(包括using_device设置的设备)"""
+    return run_in_pool(None, func, *args)
+
+def run_in_pool(pool: Optional[concurrent.futures.Executor], func: Callable[..., Any], *args: Any) -> Awaitable[Any]:
+    """在指定线程池中执行同步函数，pool为None时使用默认线程池"""
+    context = contextvars.copy_context()
+    return asyncio.get_event_loop().run_in_executor(pool, functools.partial(context.run, func, *args))
+
+class AsyncADBExecutor:
+    """ADBExecutor的异步版本
+    
+    subprocess后端通过 asyncio.create_subprocess_exec 执行命令，多个命令可以同时进行，
+    等待中的任务被取消时会结束对应的adb进程。session和socket后端基于阻塞的连接，
+    命令在线程池中执行。设备选择、输入监听器等状态与同步执行器共享。
+    """
+    
+    def __init__(self, executor: ADBExecutor):
+        self.executor = executor
+        
+    async def execute_command(self, command: List[str]) -> str:
+        """执行ADB命令并返回输出，返回值与ADBExecutor.execute_command相同"""
+        try:
+            return_code, stdout, stderr = await self._run(command)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error_message = f"执行ADB命令时出错: {str(e)}"
+            print(error_message, file=sys.stderr)
+            return error_message
+        if return_code != 0:
+            error_message = f"ADB命令执行失败: {stderr.strip()}"
+            print(error_message, file=sys.stderr)
+            return error_message
+        return stdout.strip()
+        
+    async def execute_binary(self, command: List[str]) -> bytes:
+        """执行ADB命令并返回原始二进制输出
+        
+        Raises:
+            ADBCommandError: 命令执行失败
+        """
+        try:
+            return_code, stdout, stderr = await self._run(command, binary=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise ADBCommandError(f"执行ADB命令时出错: {str(e)}")
+        if return_code != 0:
+            raise ADBCommandError(f"ADB命令执行失败: {stderr.strip()}")
+        return stdout
+        
+    async def _run(self, command: List[str], binary: bool = False) -> Tuple[int, Any, str]:
+        """执行命令，输入类命令执行后通知监听器"""
+        if self.executor.backend != BACKEND_SUBPROCESS:
+            return await run_in_thread(self.executor._run, command, binary)
+        self.executor.check_device(command)
+        started = time.perf_counter()
+        result = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *(self.executor._adb_prefix() + command),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                # 调用方已不再等待结果，结束adb进程而不是让它在后台继续运行
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+                raise
+            if not binary:
+                stdout = stdout.decode('utf-8', 'replace')
+            result = (process.returncode, stdout, stderr.decode('utf-8', 'replace'))
+            return result
+        finally:
+            self.executor.record_command(command, started, result)
+            self.executor.notify_input(command)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 设备注册表
+
+后台线程订阅adb server的 `host:track-devices`，在内存中维护 序列号 -> 状态和属性(型号、SDK版本、屏幕尺寸)，
+设备连接、断开或状态变化时由adb server主动推送，不需要轮询 `adb devices`。
+
+注册表处于实时状态时，check_connection直接读取内存中的列表；注册为ADBExecutor.device_guard后，
+发往离线设备的命令在执行前即失败。adb server不可用时注册表不是实时的，调用方应回退到 `adb devices`，
+后台线程会按退避间隔自动重连。
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from phone_mcp_by_trae.adb_executor import ADBCommandError, command_failed
+from phone_mcp_by_trae.adb_protocol import ADBClient, ADBProtocolError
+from phone_mcp_by_trae.screen_stream import parse_screen_size
+
+# 可以执行命令的设备状态
+ONLINE = 'device'
+
+# 一次shell调用读取全部属性，每个属性单独一行，属性为空时也不会错位
+PROPERTIES_COMMAND = ('echo "model=$(getprop ro.product.model)"; '
+                      'echo "sdk=$(getprop ro.build.version.sdk)"; wm size')
+
+# 与adb server的连接断开后重连的间隔(秒)
+MIN_RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 5.0
+
+# 设备状态变化监听器: (序列号, 原状态, 新状态)，新出现的设备原状态为None，移除的设备新状态为None
+DeviceListener = Callable[[str, Optional[str], Optional[str]], None]
+
+
+class DeviceUnavailableError(ADBCommandError):
+    """目标设备离线或不存在"""
+
+
+class DeviceInfo:
+    """单个设备的状态和属性"""
+
+    __slots__ = ('serial', 'state', 'model', 'sdk', 'screen_size')
+
+    def __init__(self, serial: str, state: str):
+        self.serial = serial
+        self.state = state
+        self.model = None  # type: Optional[str]
+        self.sdk = None  # type: Optional[int]
+        self.screen_size = None  # type: Optional[Tuple[int, int]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典，省略尚未获取的属性"""
+        data = {'id': self.serial, 'status': self.state}  # type: Dict[str, Any]
+        if self.model:
+            data['model'] = self.model
+        if self.sdk is not None:
+            data['sdk'] = self.sdk
+        if self.screen_size is not None:
+            data['screen_size'] = list(self.screen_size)
+        return data
+
+
+def parse_properties(output: str) -> Dict[str, Any]:
+    """解析PROPERTIES_COMMAND的输出"""
+    properties = {}  # type: Dict[str, Any]
+    for line in output.splitlines():
+        key, _, value = line.partition('=')
+        value = value.strip()
+        if key == 'model' and value:
+            properties['model'] = value
+        elif key == 'sdk' and value.isdigit():
+            properties['sdk'] = int(value)
+    size = parse_screen_size(output)
+    if size is not None:
+        properties['screen_size'] = size
+    return properties
+
+
+class DeviceRegistry:
+    """由 host:track-devices 驱动的设备注册表"""
+
+    def __init__(self, executor, client_factory: Optional[Callable[[], ADBClient]] = None,
+                 enabled: bool = True):
+        """初始化注册表，调用start后开始跟踪
+
+        Args:
+            executor: ADBExecutor实例，用于读取新设备的属性
+            client_factory: 创建线协议客户端的函数，默认使用ADBClient()
+            enabled: 为False时start不启动跟踪，注册表始终不是实时的(例如回放录制的命令时)
+        """
+        self.executor = executor
+        self.enabled = enabled
+        self.client_factory = client_factory or ADBClient
+        self._devices = {}  # type: Dict[str, DeviceInfo]
+        self._lock = threading.Lock()
+        self._live = False
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._listeners = []  # type: List[DeviceListener]
+        self._tracker = None
+        self._thread = None  # type: Optional[threading.Thread]
+        self._prober = None  # type: Optional[ThreadPoolExecutor]
+
+    @property
+    def is_live(self) -> bool:
+        """是否正与adb server保持订阅，此时注册表内容是最新的"""
+        return self._live
+
+    def start(self) -> bool:
+        """启动后台跟踪线程，已在运行时不做任何事
+
+        Returns:
+            本次调用是否启动了线程
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._prober = ThreadPoolExecutor(max_workers=4)
+            self._thread = threading.Thread(target=self._track_loop, daemon=True)
+            self._thread.start()
+            return True
+
+    def ensure_started(self, timeout: float = 0.5) -> bool:
+        """确保跟踪线程在运行，刚启动时最多等待timeout秒收到第一份设备列表
+
+        Returns:
+            注册表是否处于实时状态
+        """
+        if self.start():
+            self._ready.wait(timeout)
+        return self._live
+
+    def add_listener(self, listener: DeviceListener) -> None:
+        """注册设备状态变化监听器，在跟踪线程中调用"""
+        self._listeners.append(listener)
+
+    def _track_loop(self) -> None:
+        """保持track-devices订阅，连接断开(例如adb server重启)后按退避间隔重连"""
+        client = self.client_factory()
+        delay = MIN_RECONNECT_DELAY
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._tracker = client.track_devices()
+                except (OSError, ADBProtocolError):
+                    # adb server不可用，不必让ensure_started继续等待
+                    self._ready.set()
+                    self._stop.wait(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                    continue
+                delay = MIN_RECONNECT_DELAY
+                try:
+                    while not self._stop.is_set():
+                        self._update(self._tracker.read_devices())
+                except (OSError, ADBProtocolError, ValueError):
+                    pass
+                finally:
+                    self._tracker.close()
+                    self._tracker = None
+                    self._live = False
+        finally:
+            client.close()
+
+    def _update(self, entries: List[Tuple[str, str]]) -> None:
+        """用adb server推送的完整列表更新注册表，并通知变化"""
+        changes = []  # type: List[Tuple[str, Optional[str], Optional[str]]]
+        with self._lock:
+            current = dict(entries)
+            for serial, state in current.items():
+                info = self._devices.get(serial)
+                if info is None:
+                    self._devices[serial] = DeviceInfo(serial, state)
+                    changes.append((serial, None, state))
+                elif info.state != state:
+                    changes.append((serial, info.state, state))
+                    info.state = state
+            for serial in [serial for serial in self._devices if serial not in current]:
+                changes.append((serial, self._devices.pop(serial).state, None))
+            self._live = True
+        self._ready.set()
+
+        for serial, old_state, new_state in changes:
+            if new_state == ONLINE and self._prober is not None:
+                # 读取属性需要执行adb命令，不阻塞跟踪线程
+                self._prober.submit(self._probe, serial)
+            for listener in self._listeners:
+                listener(serial, old_state, new_state)
+
+    def _probe(self, serial: str) -> None:
+        """读取设备的型号、SDK版本和屏幕尺寸"""
+        with self.executor.using_device(serial):
+            output = self.executor.execute_command(['shell', PROPERTIES_COMMAND])
+        if command_failed(output):
+            return
+        properties = parse_properties(output)
+        with self._lock:
+            info = self._devices.get(serial)
+            if info is not None:
+                for name, value in properties.items():
+                    setattr(info, name, value)
+
+    def devices(self) -> List[Dict[str, Any]]:
+        """返回所有设备的状态和属性"""
+        with self._lock:
+            return [info.to_dict() for info in self._devices.values()]
+
+    def get(self, serial: str) -> Optional[Dict[str, Any]]:
+        """返回单个设备的状态和属性，不存在时返回None"""
+        with self._lock:
+            info = self._devices.get(serial)
+            return info.to_dict() if info is not None else None
+
+    def online_serials(self) -> List[str]:
+        """返回所有在线设备的序列号"""
+        with self._lock:
+            return [serial for serial, info in self._devices.items() if info.state == ONLINE]
+
+    def check(self, device_id: Optional[str]) -> None:
+        """执行命令前检查目标设备，可注册为ADBExecutor.device_guard
+
+        只有注册表处于实时状态时才检查；注册表中没有的序列号交给adb自己处理。
+
+        Raises:
+            DeviceUnavailableError: 设备离线、未授权等不可用状态，或没有任何在线设备
+        """
+        if not self._live:
+            return
+        with self._lock:
+            if device_id is None:
+                if not any(info.state == ONLINE for info in self._devices.values()):
+                    raise DeviceUnavailableError("没有在线的设备")
+                return
+            info = self._devices.get(device_id)
+            state = info.state if info is not None else None
+        if state is not None and state != ONLINE:
+            raise DeviceUnavailableError(f"设备 {device_id} 不可用，当前状态: {state}")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止跟踪线程"""
+        self._stop.set()
+        tracker = self._tracker
+        if tracker is not None:
+            tracker.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._prober is not None:
+            self._prober.shutdown(wait=False)
+            self._prober = None
+        self._live = False
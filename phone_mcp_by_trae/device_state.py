@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 前台状态
+
+完整的 `dumpsys` 输出有数MB，这里只查询最小的几个部分，并在设备上用 `grep -m` 边读边过滤：
+找到需要的行后grep立即退出，dumpsys随之结束，传回主机的只有几行。各部分在设备上并行查询，
+输出以 "@部分名" 行分隔，主机逐行解析。
+
+    activity    dumpsys activity activities   前台应用和Activity
+    power       dumpsys power                 屏幕是否点亮(mWakefulness)
+    keyguard    dumpsys window policy         是否处于锁屏
+    rotation    dumpsys input                 屏幕方向
+    ime         settings / dumpsys input_method  当前输入法以及软键盘是否显示
+
+结果按设备缓存，设备上执行输入操作后失效，缓存时间最长为STATE_CACHE_TTL秒(屏幕超时等变化不经过输入)。
+"""
+
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from phone_mcp_by_trae.wait_conditions import RESUMED_ACTIVITY_PROBE
+
+# 缓存的最长有效时间(秒)
+STATE_CACHE_TTL = 10.0
+
+# 屏幕方向，输出 "SurfaceOrientation: N" 或 "orientation=N"，N为0-3
+ROTATION_PROBE = "dumpsys input | grep -m1 -E 'SurfaceOrientation|orientation=[0-9]'"
+
+# 部分名 -> 查询命令
+STATE_PROBES = (
+    ('activity', RESUMED_ACTIVITY_PROBE),
+    ('power', "dumpsys power | grep -m1 -E 'mWakefulness='"),
+    ('keyguard', "dumpsys window policy | grep -m3 -E 'showing=|mShowingLockscreen=|isStatusBarKeyguard='"),
+    ('rotation', ROTATION_PROBE),
+    ('ime', "settings get secure default_input_method; dumpsys input_method | grep -m1 -E 'mInputShown='"),
+)
+
+ORIENTATIONS = {0: 'portrait', 1: 'landscape', 2: 'reverse_portrait', 3: 'reverse_landscape'}
+
+_COMPONENT_PATTERN = re.compile(r'\s([\w.]+)/([\w.$]+)')
+_KEYGUARD_PATTERN = re.compile(r'(?:^|\s)(?:showing|mShowingLockscreen|isStatusBarKeyguard)=(true|false)')
+_ORIENTATION_PATTERN = re.compile(r'(?:SurfaceOrientation:\s*|orientation=)(\d)')
+
+
+def state_script(probes: Iterable[Tuple[str, str]] = STATE_PROBES) -> str:
+    """在设备上并行执行各部分查询的脚本，按顺序输出 "@部分名" 和该部分的结果"""
+    directory = '/data/local/tmp/phone_mcp_state.$$'
+    names = [name for name, _ in probes]
+    parts = [f"d={directory}; mkdir -p $d"]
+    parts += [f"({command}) >$d/{name} 2>/dev/null &" for name, command in probes]
+    parts.append('wait')
+    parts += [f"echo @{name}; cat $d/{name}" for name in names]
+    parts.append('rm -rf $d')
+    # 后台命令以 & 结尾，其后不能再接分号
+    return ' '.join(part if part.endswith('&') else part + ';' for part in parts) + ' true'
+
+
+def _parse_activity(line: str, state: Dict[str, Any]) -> None:
+    match = _COMPONENT_PATTERN.search(line)
+    if match and state.get('package') is None:
+        package, activity = match.groups()
+        state['package'] = package
+        state['activity'] = package + activity if activity.startswith('.') else activity
+
+
+def _parse_power(line: str, state: Dict[str, Any]) -> None:
+    if 'mWakefulness=' in line:
+        wakefulness = line.split('mWakefulness=', 1)[1].split()[0]
+        state['wakefulness'] = wakefulness
+        state['screen_on'] = wakefulness == 'Awake'
+
+
+def _parse_keyguard(line: str, state: Dict[str, Any]) -> None:
+    match = _KEYGUARD_PATTERN.search(line)
+    if match:
+        state['locked'] = bool(state.get('locked')) or match.group(1) == 'true'
+
+
+def parse_rotation(output: str) -> Optional[int]:
+    """从ROTATION_PROBE的输出中取出屏幕方向(0-3)，没有找到时返回None"""
+    match = _ORIENTATION_PATTERN.search(output)
+    return int(match.group(1)) if match else None
+
+
+def _parse_rotation(line: str, state: Dict[str, Any]) -> None:
+    rotation = parse_rotation(line)
+    if rotation is not None and state.get('rotation') is None:
+        state['rotation'] = rotation
+        state['orientation'] = ORIENTATIONS.get(rotation, 'unknown')
+
+
+def _parse_ime(line: str, state: Dict[str, Any]) -> None:
+    stripped = line.strip()
+    if 'mInputShown=' in stripped:
+        state['ime_shown'] = stripped.split('mInputShown=', 1)[1].split()[0] == 'true'
+    elif '/' in stripped and state.get('ime') is None:
+        state['ime'] = stripped
+
+
+_PARSERS = {
+    'activity': _parse_activity,
+    'power': _parse_power,
+    'keyguard': _parse_keyguard,
+    'rotation': _parse_rotation,
+    'ime': _parse_ime,
+}
+
+
+def parse_state(lines: Iterable[str]) -> Dict[str, Any]:
+    """逐行解析state_script的输出，未能取得的字段为None"""
+    state = {
+        'package': None, 'activity': None, 'screen_on': None, 'wakefulness': None,
+        'locked': None, 'rotation': None, 'orientation': None, 'ime': None, 'ime_shown': None
+    }  # type: Dict[str, Any]
+    parser = None
+    for line in lines:
+        if line.startswith('@') and line[1:].strip() in _PARSERS:
+            parser = _PARSERS[line[1:].strip()]
+            continue
+        if parser is not None and line.strip():
+            parser(line, state)
+    return state
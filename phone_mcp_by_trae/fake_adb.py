@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 本地模拟adb server
+
+实现adb host协议的一个子集(host:version、host:devices、host:track-devices、
+host:transport、shell、exec、sync)，用于在没有真实设备的情况下测试线协议客户端。
+"""
+
+import socketserver
+import stat
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from phone_mcp_by_trae.adb_protocol import (
+    SHELL_ID_EXIT, SHELL_ID_STDERR, SHELL_ID_STDOUT, SYNC_DATA_MAX
+)
+
+# shell处理函数: (序列号, 命令) -> (退出码, stdout, stderr)
+ShellHandler = Callable[[str, str], Tuple[int, bytes, bytes]]
+
+
+def default_shell_handler(serial: str, command: str) -> Tuple[int, bytes, bytes]:
+    """默认的shell处理函数：支持echo，其余命令成功且无输出"""
+    if command.startswith('echo '):
+        return 0, command[5:].encode('utf-8') + b'\n', b''
+    if command == 'echo':
+        return 0, b'\n', b''
+    return 0, b'', b''
+
+
+class FakeDevice:
+    """模拟设备，保存状态和一个内存文件系统"""
+
+    def __init__(self, serial: str, state: str = 'device'):
+        self.serial = serial
+        self.state = state
+        # 路径 -> (内容, mode, mtime)
+        self.files = {}  # type: Dict[str, Tuple[bytes, int, int]]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """处理单个客户端连接"""
+
+    def handle(self) -> None:
+        server = self.server  # type: FakeADBServer
+        device = None
+        try:
+            while True:
+                request = self._read_request()
+                if request is None:
+                    return
+                if request == 'host:version':
+                    self._okay_string(b'0029')
+                    return
+                if request in ('host:devices', 'host:devices-l'):
+                    self._okay_string(server.format_devices().encode('utf-8'))
+                    return
+                if request == 'host:track-devices':
+                    self._track_devices()
+                    return
+                if request.startswith('host:transport:') or request == 'host:transport-any':
+                    device = server.find_device(request[len('host:transport:'):]
+                                                if request.startswith('host:transport:') else None)
+                    if device is None or device.state != 'device':
+                        self._fail('device not found')
+                        return
+                    self._okay()
+                    continue
+                if device is None:
+                    self._fail(f'unknown host service: {request}')
+                    return
+                self._handle_device_service(device, request)
+                return
+        except (OSError, ConnectionError, struct.error):
+            return
+
+    def _track_devices(self) -> None:
+        """先发送当前列表，之后每次设备变化时发送新列表，直到客户端断开"""
+        server = self.server  # type: FakeADBServer
+        self._okay()
+        version = -1
+        while not server.stopped:
+            with server.changed:
+                server.changed.wait_for(lambda: server.version != version or server.stopped, 0.5)
+                if server.version == version:
+                    continue
+                version = server.version
+                data = server.format_devices().encode('utf-8')
+            self.request.sendall(b'%04x' % len(data) + data)
+
+    def _handle_device_service(self, device: FakeDevice, request: str) -> None:
+        server = self.server  # type: FakeADBServer
+        if request.startswith('shell,v2,raw:') or request.startswith('shell,v2:'):
+            command = request.split(':', 1)[1]
+            exit_code, stdout, stderr = server.run_shell(device.serial, command)
+            self._okay()
+            if stdout:
+                self._shell_packet(SHELL_ID_STDOUT, stdout)
+            if stderr:
+                self._shell_packet(SHELL_ID_STDERR, stderr)
+            self._shell_packet(SHELL_ID_EXIT, bytes([exit_code & 0xff]))
+        elif request.startswith('shell:') or request.startswith('exec:'):
+            command = request.split(':', 1)[1]
+            exit_code, stdout, stderr = server.run_shell(device.serial, command)
+            self._okay()
+            self.request.sendall(stdout + (stderr if request.startswith('shell:') else b''))
+        elif request == 'sync:':
+            self._okay()
+            self._handle_sync(device)
+        else:
+            self._fail(f'unknown service: {request}')
+
+    def _handle_sync(self, device: FakeDevice) -> None:
+        """处理sync协议的STAT/RECV/SEND/QUIT请求"""
+        while True:
+            header = self._recv_exactly(8)
+            if header is None:
+                return
+            request_id, length = struct.unpack('<4sI', header)
+            data = self._recv_exactly(length) if length else b''
+            if request_id == b'QUIT':
+                return
+            path = data.decode('utf-8')
+            if request_id == b'STAT':
+                entry = device.files.get(path)
+                if entry is None:
+                    self.request.sendall(b'STAT' + struct.pack('<III', 0, 0, 0))
+                else:
+                    content, mode, mtime = entry
+                    self.request.sendall(b'STAT' + struct.pack('<III', mode, len(content), mtime))
+            elif request_id == b'RECV':
+                entry = device.files.get(path)
+                if entry is None:
+                    message = b'No such file or directory'
+                    self.request.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                    continue
+                content = entry[0]
+                for offset in range(0, len(content), SYNC_DATA_MAX):
+                    chunk = content[offset:offset + SYNC_DATA_MAX]
+                    self.request.sendall(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+                self.request.sendall(b'DONE' + struct.pack('<I', 0))
+            elif request_id == b'SEND':
+                remote_path, _, mode = path.rpartition(',')
+                chunks = []
+                while True:
+                    packet_id, size = struct.unpack('<4sI', self._recv_exactly(8))
+                    if packet_id == b'DATA':
+                        chunks.append(self._recv_exactly(size))
+                    elif packet_id == b'DONE':
+                        mtime = size or int(time.time())
+                        break
+                    else:
+                        return
+                device.files[remote_path] = (b''.join(chunks), int(mode or stat.S_IFREG | 0o644), mtime)
+                self.request.sendall(b'OKAY' + struct.pack('<I', 0))
+            else:
+                return
+
+    def _read_request(self) -> Optional[str]:
+        length = self._recv_exactly(4)
+        if length is None:
+            return None
+        data = self._recv_exactly(int(length, 16))
+        return data.decode('utf-8') if data is not None else None
+
+    def _recv_exactly(self, size: int) -> Optional[bytes]:
+        chunks = []
+        while size > 0:
+            chunk = self.request.recv(size)
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _okay(self) -> None:
+        self.request.sendall(b'OKAY')
+
+    def _okay_string(self, data: bytes) -> None:
+        self.request.sendall(b'OKAY' + b'%04x' % len(data) + data)
+
+    def _fail(self, message: str) -> None:
+        data = message.encode('utf-8')
+        self.request.sendall(b'FAIL' + b'%04x' % len(data) + data)
+
+    def _shell_packet(self, packet_id: int, data: bytes) -> None:
+        self.request.sendall(struct.pack('<BI', packet_id, len(data)) + data)
+
+
+class FakeADBServer(socketserver.ThreadingTCPServer):
+    """在本地端口上运行的模拟adb server
+
+    用法::
+
+        with FakeADBServer(['emulator-5554']) as server:
+            client = ADBClient(port=server.port)
+            client.shell('emulator-5554', 'echo hi')
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, serials=('emulator-5554',), shell_handler: Optional[ShellHandler] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        """初始化模拟server
+
+        Args:
+            serials: 模拟设备的序列号
+            shell_handler: 处理shell/exec命令的函数，默认使用 default_shell_handler
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+        """
+        super().__init__((host, port), _Handler)
+        self.devices = {serial: FakeDevice(serial) for serial in serials}  # type: Dict[str, FakeDevice]
+        self.shell_handler = shell_handler or default_shell_handler
+        self.commands = []  # type: list
+        # 设备列表每次变化时递增，通知track-devices连接
+        self.version = 0
+        self.changed = threading.Condition()
+        self.stopped = False
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def port(self) -> int:
+        """实际监听的端口"""
+        return self.server_address[1]
+
+    def find_device(self, serial: Optional[str]) -> Optional[FakeDevice]:
+        """按序列号查找设备，serial为None时返回唯一的在线设备"""
+        if serial is not None:
+            return self.devices.get(serial)
+        online = [device for device in self.devices.values() if device.state == 'device']
+        return online[0] if len(online) == 1 else None
+
+    def set_device_state(self, serial: str, state: Optional[str]) -> None:
+        """添加设备、修改设备状态，state为None时移除设备"""
+        with self.changed:
+            if state is None:
+                self.devices.pop(serial, None)
+            elif serial in self.devices:
+                self.devices[serial].state = state
+            else:
+                self.devices[serial] = FakeDevice(serial, state)
+            self.version += 1
+            self.changed.notify_all()
+
+    def format_devices(self) -> str:
+        """生成host:devices的响应内容"""
+        return ''.join(f'{device.serial}\t{device.state}\n' for device in list(self.devices.values()))
+
+    def run_shell(self, serial: str, command: str) -> Tuple[int, bytes, bytes]:
+        """记录并执行一条shell命令"""
+        self.commands.append((serial, command))
+        return self.shell_handler(serial, command)
+
+    def start(self) -> 'FakeADBServer':
+        """在后台线程中启动server"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止server"""
+        with self.changed:
+            self.stopped = True
+            self.changed.notify_all()
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> 'FakeADBServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 目录同步
+
+push_files/pull_files 在主机和设备之间传输整个目录树：
+
+1. 一次shell调用列出设备端每个文件的大小和修改时间(checksum模式下还有md5)，主机端遍历本地目录；
+2. 两端大小和修改时间(或md5)都相同的文件跳过，其余文件由多个线程并行传输，每个文件使用独立的sync连接，
+   大文件优先开始；
+3. 数据由sync服务或adb命令行边收边写入磁盘，不在内存中缓存整个文件。
+
+拉取时先写入 "<文件>.phone_mcp_part"，完成后改名，并把修改时间设为设备端的时间；推送时adb把本地的
+修改时间写到设备文件上。传输中断后再次执行同一命令即可继续：已完成的文件两端一致而被跳过，
+未完成的文件(大小或修改时间不同)重新传输。
+"""
+
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+import posixpath
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from phone_mcp_by_trae.adb_executor import ERROR_PREFIXES, ADBExecutor
+from phone_mcp_by_trae.adb_shell import quote_shell_arg
+
+# phone_cli的--compare和--workers为了不在启动时导入本模块直接写了这些值，修改时需要一起修改
+COMPARE_MTIME = 'mtime'
+COMPARE_CHECKSUM = 'checksum'
+COMPARE_MODES = (COMPARE_MTIME, COMPARE_CHECKSUM)
+
+DIRECTION_PUSH = 'push'
+DIRECTION_PULL = 'pull'
+
+DEFAULT_WORKERS = 4
+MAX_WORKERS = 16
+# 拉取中的文件的后缀，完成后改名
+PART_SUFFIX = '.phone_mcp_part'
+# 修改时间允许的误差(秒)，部分文件系统只保存偶数秒
+MTIME_TOLERANCE = 1
+# 设备端列表输出中md5部分的开始标记
+CHECKSUM_MARKER = '__PHONE_MCP_MD5__'
+# 计算本地md5时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileEntry(NamedTuple):
+    """目录树中的一个文件，path为相对于根目录、以 / 分隔的路径"""
+    path: str
+    size: int
+    mtime: int
+    md5: Optional[str] = None
+
+
+def listing_script(remote_path: str, checksum: bool = False) -> str:
+    """列出设备端文件的脚本
+
+    remote_path为目录时列出其下所有文件，为文件时只列出该文件。第一行输出根目录(不存在时为空)，
+    之后每行为 "大小 修改时间 ./相对路径"；checksum为True时在CHECKSUM_MARKER行之后输出md5sum的结果。
+    脚本在子shell中执行，不改变session后端常驻shell的工作目录。
+    """
+    find = 'find "$t" -type f'
+    parts = [
+        f"p={quote_shell_arg(remote_path)}; d=; t=.",
+        'if [ -d "$p" ]; then d="$p"; elif [ -f "$p" ]; then d=$(dirname "$p"); t="./$(basename "$p")"; fi',
+        'echo "$d"',
+        f"""[ -n "$d" ] && cd "$d" && {{ {find} -exec stat -c '%s %Y %n' {{}} + 2>/dev/null"""
+        + (f"; echo {CHECKSUM_MARKER}; {find} -exec md5sum {{}} + 2>/dev/null" if checksum else '') + '; }'
+    ]
+    return '(' + '; '.join(parts) + '; true)'
+
+
+def _relative(name: str) -> str:
+    return name[2:] if name.startswith('./') else name
+
+
+def parse_listing(output: str) -> Tuple[Optional[str], Dict[str, FileEntry]]:
+    """解析listing_script的输出
+
+    Returns:
+        (设备端根目录，不存在时为None, 相对路径 -> FileEntry)
+    """
+    lines = output.splitlines()
+    if not lines or not lines[0].strip():
+        return None, {}
+    root = lines[0].strip()
+    entries = {}  # type: Dict[str, FileEntry]
+    checksums = {}  # type: Dict[str, str]
+    in_checksums = False
+    for line in lines[1:]:
+        if line.strip() == CHECKSUM_MARKER:
+            in_checksums = True
+            continue
+        if in_checksums:
+            fields = line.split(None, 1)
+            if len(fields) == 2 and len(fields[0]) == 32:
+                checksums[_relative(fields[1])] = fields[0].lower()
+            continue
+        fields = line.split(' ', 2)
+        if len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit():
+            path = _relative(fields[2])
+            entries[path] = FileEntry(path, int(fields[0]), int(fields[1]))
+    for path, md5 in checksums.items():
+        if path in entries:
+            entries[path] = entries[path]._replace(md5=md5)
+    return root, entries
+
+
+def local_tree(local_path: str) -> Tuple[Optional[str], Dict[str, FileEntry]]:
+    """遍历本地目录，local_path为文件时只包含该文件
+
+    Returns:
+        (本地根目录，不存在时为None, 相对路径 -> FileEntry)
+    """
+    if os.path.isfile(local_path):
+        stat = os.stat(local_path)
+        name = os.path.basename(local_path)
+        return os.path.dirname(local_path) or '.', {name: FileEntry(name, stat.st_size, int(stat.st_mtime))}
+    if not os.path.isdir(local_path):
+        return None, {}
+    entries = {}  # type: Dict[str, FileEntry]
+    for directory, _, files in os.walk(local_path):
+        for name in files:
+            if name.endswith(PART_SUFFIX):
+                continue
+            full_path = os.path.join(directory, name)
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+            path = os.path.relpath(full_path, local_path).replace(os.sep, '/')
+            entries[path] = FileEntry(path, stat.st_size, int(stat.st_mtime))
+    return local_path, entries
+
+
+def file_md5(path: str) -> str:
+    """分块计算本地文件的md5"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_unchanged(source: FileEntry, target: Optional[FileEntry], compare: str,
+                 target_md5: Optional[str] = None, source_md5: Optional[str] = None) -> bool:
+    """判断目标文件是否与源文件一致，checksum模式下md5由调用方提供"""
+    if target is None or source.size != target.size:
+        return False
+    if compare == COMPARE_CHECKSUM:
+        return source_md5 is not None and source_md5 == target_md5
+    return abs(source.mtime - target.mtime) <= MTIME_TOLERANCE
+
+
+def _transfer_failed(result: str) -> bool:
+    # 只看执行器的错误前缀，adb的输出中包含文件名，文件名可能含有 "Error"
+    return result.startswith(ERROR_PREFIXES)
+
+
+class TreeSync:
+    """一次目录同步：列出两端文件，比较后并行传输
+
+    Args:
+        executor: ADB执行器，创建时记录当前设备，工作线程都使用该设备
+        direction: DIRECTION_PUSH 或 DIRECTION_PULL
+        compare: COMPARE_MTIME 或 COMPARE_CHECKSUM
+        workers: 同时传输的文件数
+
+    Raises:
+        ValueError: 参数无效
+    """
+
+    def __init__(self, executor: ADBExecutor, direction: str, compare: str = COMPARE_MTIME,
+                 workers: int = DEFAULT_WORKERS):
+        if direction not in (DIRECTION_PUSH, DIRECTION_PULL):
+            raise ValueError(f"未知的传输方向: {direction}")
+        if compare not in COMPARE_MODES:
+            raise ValueError(f"未知的比较方式: {compare}，可用方式: {', '.join(COMPARE_MODES)}")
+        self.executor = executor
+        self.device_id = executor.device_id
+        self.direction = direction
+        self.compare = compare
+        self.workers = max(1, min(MAX_WORKERS, workers))
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    def _device(self):
+        if self.device_id is None:
+            return contextlib.nullcontext()
+        return self.executor.using_device(self.device_id)
+
+    def _list_remote(self, remote_path: str) -> Tuple[Optional[str], Dict[str, FileEntry]]:
+        """Raises: RuntimeError: 列出设备端文件失败"""
+        with self._device():
+            output = self.executor.execute_command(
+                ['shell', listing_script(remote_path, self.compare == COMPARE_CHECKSUM)])
+        if _transfer_failed(output):
+            raise RuntimeError(output)
+        return parse_listing(output)
+
+    def run(self, local_path: str, remote_path: str, dry_run: bool = False) -> Dict[str, Any]:
+        """执行同步
+
+        push时local_path为本地文件或目录，remote_path为设备端目标目录；pull时remote_path为设备端文件或目录，
+        local_path为本地目标目录。目录按相对路径对应，文件放在目标目录下。
+
+        Returns:
+            {'files': 源文件数, 'transferred': 传输的文件, 'skipped': 跳过的文件数, 'failed': 失败的文件及原因,
+             'bytes': 传输的字节数, 'elapsed_ms': 耗时}
+
+        Raises:
+            FileNotFoundError: 源路径不存在
+            RuntimeError: 列出设备端文件失败
+        """
+        started = time.perf_counter()
+        if self.direction == DIRECTION_PUSH:
+            source_root, sources = local_tree(local_path)
+            if source_root is None:
+                raise FileNotFoundError(f"本地路径不存在: {local_path}")
+            target_root = remote_path.rstrip('/') or '/'
+            if os.path.isfile(local_path):
+                # 单个文件只需要列出设备端的同名文件
+                _, targets = self._list_remote(posixpath.join(target_root, os.path.basename(local_path)))
+            else:
+                _, targets = self._list_remote(target_root)
+        else:
+            source_root, sources = self._list_remote(remote_path)
+            if source_root is None:
+                raise FileNotFoundError(f"设备端路径不存在: {remote_path}")
+            target_root = local_path
+            _, targets = local_tree(local_path) if os.path.isdir(local_path) else (None, {})
+
+        # 大文件先开始，减少最后只剩一个大文件在传输的时间
+        pending = sorted(sources.values(), key=lambda entry: entry.size, reverse=True)
+        if self.compare == COMPARE_MTIME:
+            pending = [entry for entry in pending if not is_unchanged(entry, targets.get(entry.path), self.compare)]
+
+        transferred = []  # type: List[str]
+        failed = []  # type: List[Dict[str, str]]
+        skipped = len(sources) - len(pending)
+        if dry_run and self.compare == COMPARE_MTIME:
+            transferred = [entry.path for entry in pending]
+        elif pending:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {
+                    pool.submit(self._sync_file, source_root, target_root, entry, targets.get(entry.path), dry_run): entry
+                    for entry in pending
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    entry = futures[future]
+                    try:
+                        copied = future.result()
+                    except Exception as e:
+                        failed.append({'path': entry.path, 'error': str(e)})
+                        continue
+                    if copied:
+                        transferred.append(entry.path)
+                    else:
+                        skipped += 1
+        if self.direction == DIRECTION_PULL and not dry_run:
+            # 删除上次中断时残留、而本次已经一致的文件的临时文件
+            done = set(transferred) | {item['path'] for item in failed}
+            for entry in sources.values():
+                if entry.path not in done:
+                    with contextlib.suppress(OSError):
+                        os.remove(os.path.join(target_root, *entry.path.split('/')) + PART_SUFFIX)
+
+        return {
+            'files': len(sources),
+            'transferred': sorted(transferred),
+            'skipped': skipped,
+            'failed': sorted(failed, key=lambda item: item['path']),
+            'bytes': self._bytes,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def _sync_file(self, source_root: str, target_root: str, source: FileEntry,
+                   target: Optional[FileEntry], dry_run: bool) -> bool:
+        """在工作线程中比较并传输一个文件，返回是否需要/已经传输
+
+        Raises:
+            RuntimeError: 传输失败
+        """
+        if self.direction == DIRECTION_PUSH:
+            local_file = os.path.join(source_root, *source.path.split('/'))
+            remote_file = posixpath.join(target_root, source.path)
+        else:
+            local_file = os.path.join(target_root, *source.path.split('/'))
+            remote_file = posixpath.join(source_root, source.path)
+
+        if self.compare == COMPARE_CHECKSUM and target is not None and source.size == target.size:
+            local_md5 = file_md5(local_file)
+            remote_md5 = source.md5 if self.direction == DIRECTION_PULL else target.md5
+            if local_md5 == remote_md5:
+                return False
+        if dry_run:
+            return True
+
+        if self.direction == DIRECTION_PUSH:
+            with self._device():
+                result = self.executor.execute_command(['push', local_file, remote_file])
+            if _transfer_failed(result):
+                raise RuntimeError(result)
+        else:
+            os.makedirs(os.path.dirname(local_file) or '.', exist_ok=True)
+            part_file = local_file + PART_SUFFIX
+            with self._device():
+                result = self.executor.execute_command(['pull', remote_file, part_file])
+            if _transfer_failed(result):
+                with contextlib.suppress(OSError):
+                    os.remove(part_file)
+                raise RuntimeError(result)
+            os.utime(part_file, (source.mtime, source.mtime))
+            os.replace(part_file, local_file)
+        with self._lock:
+            self._bytes += source.size
+        return True
+
+
+def push_tree(executor: ADBExecutor, local_path: str, remote_path: str, compare: str = COMPARE_MTIME,
+              workers: int = DEFAULT_WORKERS, dry_run: bool = False) -> Dict[str, Any]:
+    """把本地文件或目录推送到设备端目录，见TreeSync.run"""
+    return TreeSync(executor, DIRECTION_PUSH, compare, workers).run(local_path, remote_path, dry_run)
+
+
+def pull_tree(executor: ADBExecutor, remote_path: str, local_path: str, compare: str = COMPARE_MTIME,
+              workers: int = DEFAULT_WORKERS, dry_run: bool = False) -> Dict[str, Any]:
+    """把设备端文件或目录拉取到本地目录，见TreeSync.run"""
+    return TreeSync(executor, DIRECTION_PULL, compare, workers).run(local_path, remote_path, dry_run)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 多设备并行执行
+
+在事件循环中对一组设备并发调用同一个异步工具，总并发数有上限。每个任务通过
+ADBExecutor.using_device 在自己的上下文中切换设备，不影响全局的当前设备；
+每个设备的并发数由信号量限制，单个设备失败不影响其他设备。
+"""
+
+import asyncio
+import inspect
+import os
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_MAX_WORKERS = int(os.environ.get('PHONE_MCP_FLEET_WORKERS', '8'))
+DEFAULT_PER_DEVICE_LIMIT = int(os.environ.get('PHONE_MCP_PER_DEVICE_CONCURRENCY', '1'))
+
+# 参数中的该占位符会被替换为设备ID，例如 "screenshot_{device}.png"
+DEVICE_PLACEHOLDER = '{device}'
+
+
+class DeviceLimiter:
+    """限制每个设备上同时执行的调用数"""
+
+    def __init__(self, limit: int = DEFAULT_PER_DEVICE_LIMIT):
+        self.limit = max(1, limit)
+        # asyncio的信号量只能在一个事件循环中使用，因此按事件循环分别保存
+        self._semaphores = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+    def semaphore(self, device_id: str) -> asyncio.Semaphore:
+        """返回当前事件循环中设备对应的信号量，不存在时创建"""
+        semaphores = self._semaphores.setdefault(asyncio.get_event_loop(), {})
+        semaphore = semaphores.get(device_id)
+        if semaphore is None:
+            semaphore = asyncio.BoundedSemaphore(self.limit)
+            semaphores[device_id] = semaphore
+        return semaphore
+
+
+# 所有多设备调用共享同一组设备信号量，使并发的批量调用也遵守单设备限制
+device_limiter = DeviceLimiter()
+
+
+def parse_online_devices(output: str) -> List[str]:
+    """从 `adb devices` 的输出中提取状态为device的设备ID"""
+    devices = []
+    for line in output.split('\n')[1:]:
+        parts = line.strip().split('\t')
+        if len(parts) >= 2 and parts[1] == 'device':
+            devices.append(parts[0])
+    return devices
+
+
+def _substitute_device(arguments: Dict[str, Any], device_id: str) -> Dict[str, Any]:
+    """把字符串参数中的设备占位符替换为设备ID"""
+    return {
+        name: value.replace(DEVICE_PLACEHOLDER, device_id) if isinstance(value, str) else value
+        for name, value in arguments.items()
+    }
+
+
+def _is_success(result: Any) -> bool:
+    """工具返回字典时以其success字段判断是否成功"""
+    if isinstance(result, dict):
+        return bool(result.get('success', True))
+    return True
+
+
+async def run_on_devices(executor, func: Callable[..., Any], devices: List[str],
+                         arguments: Optional[Dict[str, Any]] = None,
+                         max_workers: int = DEFAULT_MAX_WORKERS,
+                         limiter: Optional[DeviceLimiter] = None) -> Dict[str, Any]:
+    """在多个设备上并发调用同一个工具函数
+
+    Args:
+        executor: ADBExecutor实例，工具函数通过它访问设备
+        func: 要调用的工具函数，返回协程时等待其完成
+        devices: 设备ID列表
+        arguments: 调用参数，字符串中的 {device} 会被替换为设备ID
+        max_workers: 最多同时执行的设备数
+        limiter: 单设备并发限制，默认使用全局的device_limiter
+
+    Returns:
+        包含每个设备结果、耗时以及成功/失败数量的字典
+    """
+    arguments = arguments or {}
+    limiter = limiter or device_limiter
+    workers = asyncio.Semaphore(max(1, max_workers))
+
+    async def run_one(device_id: str) -> Dict[str, Any]:
+        # 每个任务运行在gather复制的独立上下文中，using_device只影响本任务
+        queued = time.perf_counter()
+        async with workers, limiter.semaphore(device_id):
+            started = time.perf_counter()
+            entry = {'device': device_id}  # type: Dict[str, Any]
+            try:
+                with executor.using_device(device_id):
+                    result = func(**_substitute_device(arguments, device_id))
+                    if inspect.isawaitable(result):
+                        result = await result
+                entry['success'] = _is_success(result)
+                entry['result'] = result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                entry['success'] = False
+                entry['error'] = f"{type(e).__name__}: {e}"
+            finished = time.perf_counter()
+        entry['wait_ms'] = round((started - queued) * 1000, 1)
+        entry['elapsed_ms'] = round((finished - started) * 1000, 1)
+        return entry
+
+    started = time.perf_counter()
+    results = list(await asyncio.gather(*(run_one(device_id) for device_id in devices)))
+    failed = [entry['device'] for entry in results if not entry['success']]
+
+    return {
+        'success': bool(results) and not failed,
+        'message': f"{len(results) - len(failed)}/{len(results)} 个设备执行成功",
+        'succeeded': len(results) - len(failed),
+        'failed': failed,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'results': results
+    }
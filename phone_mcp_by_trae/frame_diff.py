@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 截图差异引擎
+
+为每个设备缓存最近一帧及其分块哈希，新截图按块计算哈希后与缓存比较，
+只返回发生变化的区域，避免每次都传输整幅图像。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from phone_mcp_by_trae.framebuffer import require_numpy
+
+DEFAULT_BLOCK_SIZE = 32
+DEFAULT_CACHE_BYTES = int(os.environ.get('PHONE_MCP_FRAME_CACHE_MB', '64')) * 1024 * 1024
+
+# 分块哈希使用的固定乘数，按块内字节位置取不同的奇数
+_HASH_SEED = 0x9E3779B97F4A7C15
+
+
+class CachedFrame:
+    """缓存的帧及其分块哈希"""
+
+    __slots__ = ('frame', 'hashes', 'block_size')
+
+    def __init__(self, frame, hashes, block_size: int):
+        self.frame = frame
+        self.hashes = hashes
+        self.block_size = block_size
+
+    @property
+    def nbytes(self) -> int:
+        return self.frame.nbytes + self.hashes.nbytes
+
+
+class FrameCache:
+    """按设备缓存最近一帧，总内存超过上限时淘汰最久未使用的设备"""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """初始化缓存
+
+        Args:
+            max_bytes: 所有缓存帧占用内存的上限(字节)
+        """
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()  # type: OrderedDict
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[CachedFrame]:
+        """取出设备的缓存帧"""
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None:
+                self._frames.move_to_end(key)
+            return entry
+
+    def put(self, key: Any, entry: CachedFrame) -> None:
+        """保存设备的最新帧，必要时淘汰其他设备的缓存"""
+        with self._lock:
+            self._remove(key)
+            if entry.nbytes > self.max_bytes:
+                # 单帧已超过上限，不缓存
+                return
+            self._frames[key] = entry
+            self._total += entry.nbytes
+            while self._total > self.max_bytes:
+                oldest = next(iter(self._frames))
+                self._remove(oldest)
+
+    def invalidate(self, key: Any = None) -> None:
+        """清除指定设备的缓存，key为None时清除全部"""
+        with self._lock:
+            if key is None:
+                self._frames.clear()
+                self._total = 0
+            else:
+                self._remove(key)
+
+    def _remove(self, key: Any) -> None:
+        entry = self._frames.pop(key, None)
+        if entry is not None:
+            self._total -= entry.nbytes
+
+    @property
+    def total_bytes(self) -> int:
+        """当前缓存占用的内存"""
+        return self._total
+
+
+def block_hashes(frame, block_size: int = DEFAULT_BLOCK_SIZE):
+    """计算每个 block_size×block_size 块的64位哈希
+
+    图像先用边缘像素补齐到块大小的整数倍，然后把每个块展平为一行，
+    与一组固定的奇数权重做点积(按2^64取模)，所有块一次向量化算完。
+
+    Returns:
+        (块行数, 块列数) 的uint64数组
+    """
+    np = require_numpy()
+    if frame.ndim == 2:
+        frame = frame[:, :, None]
+    height, width, channels = frame.shape
+    rows = -(-height // block_size)
+    columns = -(-width // block_size)
+    pad_y, pad_x = rows * block_size - height, columns * block_size - width
+    if pad_y or pad_x:
+        frame = np.pad(frame, ((0, pad_y), (0, pad_x), (0, 0)), mode='edge')
+    blocks = frame.reshape(rows, block_size, columns, block_size, channels)
+    blocks = blocks.transpose(0, 2, 1, 3, 4).reshape(rows, columns, -1)
+    weights = _hash_weights(blocks.shape[2])
+    with np.errstate(over='ignore'):
+        return (blocks.astype(np.uint64) * weights).sum(axis=2, dtype=np.uint64)
+
+
+_weights_cache = {}  # type: Dict[int, Any]
+
+
+def _hash_weights(size: int):
+    """生成并缓存指定长度的哈希权重"""
+    np = require_numpy()
+    weights = _weights_cache.get(size)
+    if weights is None:
+        with np.errstate(over='ignore'):
+            index = np.arange(1, size + 1, dtype=np.uint64)
+            weights = (index * np.uint64(_HASH_SEED)) | np.uint64(1)
+        _weights_cache[size] = weights
+    return weights
+
+
+def dirty_regions(previous, current, block_size: int, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+    """比较两组分块哈希，把相邻的变化块合并为矩形区域
+
+    Returns:
+        [(left, top, right, bottom), ...] 像素坐标，已限制在图像范围内
+    """
+    np = require_numpy()
+    changed = previous != current
+    rows, columns = changed.shape
+    seen = np.zeros_like(changed)
+    regions = []
+    for start_row, start_column in zip(*np.nonzero(changed)):
+        if seen[start_row, start_column]:
+            continue
+        # 4邻域洪水填充，记录连通块的外接矩形
+        stack = [(start_row, start_column)]
+        seen[start_row, start_column] = True
+        top, left, bottom, right = start_row, start_column, start_row, start_column
+        while stack:
+            row, column = stack.pop()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, column), max(right, column)
+            for next_row, next_column in ((row - 1, column), (row + 1, column),
+                                          (row, column - 1), (row, column + 1)):
+                if (0 <= next_row < rows and 0 <= next_column < columns
+                        and changed[next_row, next_column] and not seen[next_row, next_column]):
+                    seen[next_row, next_column] = True
+                    stack.append((next_row, next_column))
+        regions.append((
+            int(left) * block_size,
+            int(top) * block_size,
+            min(width, (int(right) + 1) * block_size),
+            min(height, (int(bottom) + 1) * block_size),
+        ))
+    return regions
+
+
+def diff_frame(cache: FrameCache, key: Any, frame, block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, Any]:
+    """把新帧与缓存比较，并用新帧更新缓存
+
+    Returns:
+        {'status': 'full'|'unchanged'|'changed', 'regions': [...], 'changed_ratio': float}
+        status为full表示没有可比较的缓存帧(首次截图或尺寸变化)
+    """
+    np = require_numpy()
+    frame = np.ascontiguousarray(frame)
+    hashes = block_hashes(frame, block_size)
+    previous = cache.get(key)
+    cache.put(key, CachedFrame(frame, hashes, block_size))
+
+    if (previous is None or previous.block_size != block_size
+            or previous.frame.shape != frame.shape):
+        return {'status': 'full', 'regions': [], 'changed_ratio': 1.0}
+
+    changed_ratio = float((previous.hashes != hashes).mean())
+    if changed_ratio == 0:
+        return {'status': 'unchanged', 'regions': [], 'changed_ratio': 0.0}
+
+    height, width = frame.shape[:2]
+    return {
+        'status': 'changed',
+        'regions': dirty_regions(previous.hashes, hashes, block_size, width, height),
+        'changed_ratio': changed_ratio
+    }
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 原始帧缓冲截图
+
+通过 `adb exec-out screencap` (不带 -p) 读取未编码的RGBA像素，跳过设备端的PNG编码。
+裁剪、缩放、灰度化都在主机上用NumPy向量化完成，最后按需编码为PNG。
+"""
+
+import importlib.util
+import struct
+import zlib
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+# 原始帧缓冲模式依赖NumPy。导入NumPy较慢，这里只检查是否安装，第一次处理帧时才导入
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+# screencap原始输出使用的Android像素格式 -> 每像素字节数
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_RGB_888 = 3
+PIXEL_FORMAT_RGB_565 = 4
+PIXEL_FORMAT_BGRA_8888 = 5
+BYTES_PER_PIXEL = {
+    PIXEL_FORMAT_RGBA_8888: 4,
+    PIXEL_FORMAT_RGBX_8888: 4,
+    PIXEL_FORMAT_RGB_888: 3,
+    PIXEL_FORMAT_RGB_565: 2,
+    PIXEL_FORMAT_BGRA_8888: 4,
+}
+
+# 输出格式，jpeg和webp由image_encoding模块编码
+OUTPUT_FORMATS = ('png', 'jpeg', 'webp', 'raw')
+
+# 读取未编码帧缓冲的截图命令
+RAW_CAPTURE_COMMAND = ['exec-out', 'screencap']
+
+
+class FrameHeader(NamedTuple):
+    """screencap原始输出的头部信息"""
+    width: int
+    height: int
+    pixel_format: int
+    header_size: int
+
+
+def require_numpy():
+    """检查NumPy是否可用并返回numpy模块
+
+    Raises:
+        RuntimeError: 没有安装NumPy
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("原始帧缓冲模式需要NumPy，请运行: pip install phone-mcp-by-trae[raw]")
+    import numpy
+    return numpy
+
+
+def parse_header(data: bytes) -> FrameHeader:
+    """解析screencap原始输出的头部
+
+    头部依次为宽、高、像素格式三个uint32，Android 10起额外包含一个色彩空间字段，
+    因此根据数据总长度判断头部是12还是16字节。
+    """
+    if len(data) < 12:
+        raise ValueError("帧缓冲数据过短")
+    width, height, pixel_format = struct.unpack('<III', data[:12])
+    bpp = BYTES_PER_PIXEL.get(pixel_format)
+    if bpp is None:
+        raise ValueError(f"不支持的像素格式: {pixel_format}")
+    header_size = len(data) - width * height * bpp
+    if header_size not in (12, 16):
+        raise ValueError(f"帧缓冲数据长度与头部不符: {width}x{height}, 格式{pixel_format}, {len(data)}字节")
+    return FrameHeader(width, height, pixel_format, header_size)
+
+
+def decode_frame(data: bytes, header: Optional[FrameHeader] = None):
+    """把screencap原始输出转换为 (高, 宽, 3) 的RGB数组
+
+    RGBA/RGBX格式直接在原始缓冲区上建立视图，不复制像素数据。
+    """
+    np = require_numpy()
+    if header is None:
+        header = parse_header(data)
+    pixels = np.frombuffer(data, dtype=np.uint8, offset=header.header_size)
+    if header.pixel_format in (PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888):
+        return pixels.reshape(header.height, header.width, 4)[:, :, :3]
+    if header.pixel_format == PIXEL_FORMAT_BGRA_8888:
+        return pixels.reshape(header.height, header.width, 4)[:, :, 2::-1]
+    if header.pixel_format == PIXEL_FORMAT_RGB_888:
+        return pixels.reshape(header.height, header.width, 3)
+    # RGB_565
+    packed = pixels.view('<u2').reshape(header.height, header.width)
+    rgb = np.empty((header.height, header.width, 3), dtype=np.uint8)
+    rgb[:, :, 0] = ((packed >> 11) & 0x1f) * 255 // 31
+    rgb[:, :, 1] = ((packed >> 5) & 0x3f) * 255 // 63
+    rgb[:, :, 2] = (packed & 0x1f) * 255 // 31
+    return rgb
+
+
+def capture_frame(executor):
+    """截取原始帧缓冲并返回RGB数组
+
+    Args:
+        executor: ADBExecutor实例
+
+    Returns:
+        (高, 宽, 3) 的uint8数组
+    """
+    require_numpy()
+    return decode_frame(executor.execute_binary(RAW_CAPTURE_COMMAND))
+
+
+def crop(frame, region: Sequence[int]):
+    """按 [left, top, right, bottom] 裁剪，坐标会被限制在图像范围内"""
+    height, width = frame.shape[:2]
+    left, top, right, bottom = (int(value) for value in region)
+    left, right = max(0, min(left, width)), max(0, min(right, width))
+    top, bottom = max(0, min(top, height)), max(0, min(bottom, height))
+    if right <= left or bottom <= top:
+        raise ValueError(f"裁剪区域无效: {list(region)}")
+    return frame[top:bottom, left:right]
+
+
+def fit_size(width: int, height: int, max_width: int = 0, max_height: int = 0) -> Tuple[int, int]:
+    """在保持宽高比的前提下计算不超过最大宽高的尺寸，0表示不限制"""
+    scale = 1.0
+    if max_width and width > max_width:
+        scale = min(scale, max_width / width)
+    if max_height and height > max_height:
+        scale = min(scale, max_height / height)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def resize(frame, width: int, height: int):
+    """缩放到指定尺寸
+
+    缩小倍数为整数时使用块平均(面积采样)，否则使用最近邻采样。
+    """
+    np = require_numpy()
+    source_height, source_width = frame.shape[:2]
+    if (width, height) == (source_width, source_height):
+        return frame
+    factor_x, factor_y = source_width // width, source_height // height
+    if (factor_x > 1 and factor_x == factor_y
+            and source_width == width * factor_x and source_height == height * factor_y):
+        blocks = frame.reshape((height, factor_y, width, factor_x) + frame.shape[2:])
+        return blocks.mean(axis=(1, 3)).astype(np.uint8)
+    rows = (np.arange(height) * source_height // height).astype(np.intp)
+    columns = (np.arange(width) * source_width // width).astype(np.intp)
+    return frame[rows[:, None], columns[None, :]]
+
+
+def to_grayscale(frame):
+    """按ITU-R BT.601权重转换为灰度图"""
+    np = require_numpy()
+    if frame.ndim == 2:
+        return frame
+    weights = np.array([299, 587, 114], dtype=np.uint32)
+    return ((frame[:, :, :3].astype(np.uint32) * weights).sum(axis=2) // 1000).astype(np.uint8)
+
+
+def process_frame(frame, region: Optional[Sequence[int]] = None, max_width: int = 0,
+                  max_height: int = 0, grayscale: bool = False):
+    """依次执行裁剪、缩放和灰度化"""
+    if region:
+        frame = crop(frame, region)
+    height, width = frame.shape[:2]
+    target = fit_size(width, height, max_width, max_height)
+    frame = resize(frame, *target)
+    if grayscale:
+        frame = to_grayscale(frame)
+    return frame
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(frame, compress_level: int = 6) -> bytes:
+    """把RGB或灰度数组编码为PNG
+
+    每行使用Up滤波(与上一行逐字节相减)，滤波在整幅图像上向量化完成。
+    """
+    np = require_numpy()
+    frame = np.ascontiguousarray(frame)
+    height, width = frame.shape[:2]
+    channels = 1 if frame.ndim == 2 else frame.shape[2]
+    color_type = {1: 0, 3: 2, 4: 6}[channels]
+    rows = frame.reshape(height, width * channels)
+    filtered = np.empty((height, width * channels + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    filtered[1:, 1:] = rows[1:] - rows[:-1]
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'IDAT', zlib.compress(filtered.tobytes(), compress_level)),
+        _png_chunk(b'IEND', b''),
+    ))
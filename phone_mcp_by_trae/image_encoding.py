@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 截图编码
+
+把处理后的帧编码为PNG、JPEG或WebP。PNG由framebuffer.encode_png编码，只需要NumPy；JPEG和WebP需要Pillow，
+Pillow编码时释放GIL，多个截图可以在线程池中并行编码。
+
+fit_budget在限定的base64大小内选择编码参数：先按请求的参数编码，超出预算时依次降低质量(PNG改用JPEG)，
+质量降到下限后按 sqrt(预算/当前大小) 估算缩小比例，逐步缩小尺寸直到满足预算或达到最小宽度。
+"""
+
+import importlib.util
+import io
+import math
+import os
+from typing import NamedTuple, Optional
+
+from phone_mcp_by_trae.framebuffer import encode_png, fit_size, require_numpy, resize
+
+# JPEG和WebP依赖Pillow，这里只检查是否安装，第一次编码时才导入
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+LOSSY_FORMATS = ('jpeg', 'webp')
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+MIME_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'raw': 'application/octet-stream',
+}
+# 保存截图时各格式接受的扩展名，第一个为默认
+FILE_EXTENSIONS = {
+    'png': ('.png',),
+    'jpeg': ('.jpg', '.jpeg'),
+    'webp': ('.webp',),
+    'raw': ('.raw',),
+}
+
+DEFAULT_QUALITY = 80
+# 超出预算时依次尝试的质量，最后一个为下限
+QUALITY_STEPS = (80, 65, 50, 40)
+# 按预算缩小时的最小宽度
+MIN_BUDGET_WIDTH = 160
+# 按预算缩小尺寸的最多次数
+MAX_SCALE_ATTEMPTS = 6
+
+
+class EncodedImage(NamedTuple):
+    """编码结果，quality只对有损格式有意义"""
+    data: bytes
+    image_format: str
+    quality: Optional[int]
+    width: int
+    height: int
+
+
+def normalize_format(image_format: str) -> str:
+    """统一格式名称的大小写和别名(jpg -> jpeg)"""
+    image_format = image_format.lower()
+    return FORMAT_ALIASES.get(image_format, image_format)
+
+
+def output_path(path: str, image_format: str) -> str:
+    """使保存路径的扩展名与格式一致
+
+    没有扩展名时加上格式的扩展名；扩展名是其他图片格式时替换，例如JPEG截图不会保存为 screenshot.png。
+    """
+    root, extension = os.path.splitext(path)
+    accepted = FILE_EXTENSIONS[image_format]
+    if extension.lower() in accepted:
+        return path
+    if not extension or any(extension.lower() in extensions for extensions in FILE_EXTENSIONS.values()):
+        return root + accepted[0]
+    return path
+
+
+def require_pillow():
+    """检查Pillow是否可用并返回PIL.Image模块
+
+    Raises:
+        RuntimeError: 没有安装Pillow
+    """
+    if not HAS_PILLOW:
+        raise RuntimeError("JPEG和WebP格式需要Pillow，请运行: pip install phone-mcp-by-trae[images]")
+    from PIL import Image
+    return Image
+
+
+def base64_size(size: int) -> int:
+    """size字节的数据base64编码后的长度"""
+    return (size + 2) // 3 * 4
+
+
+def encode_image(frame, image_format: str, quality: int = DEFAULT_QUALITY) -> EncodedImage:
+    """把RGB或灰度数组编码为指定格式
+
+    Raises:
+        RuntimeError: 缺少编码所需的库
+        ValueError: 格式未知
+    """
+    height, width = frame.shape[:2]
+    if image_format == 'png':
+        return EncodedImage(encode_png(frame), image_format, None, width, height)
+    if image_format == 'raw':
+        return EncodedImage(frame.tobytes(), image_format, None, width, height)
+    if image_format not in LOSSY_FORMATS:
+        raise ValueError(f"不支持的编码格式: {image_format}")
+    Image = require_pillow()
+    np = require_numpy()
+    image = Image.fromarray(np.ascontiguousarray(frame))
+    buffer = io.BytesIO()
+    image.save(buffer, image_format.upper(), quality=max(1, min(100, quality)))
+    return EncodedImage(buffer.getvalue(), image_format, quality, width, height)
+
+
+def fits(encoded: EncodedImage, max_base64_size: int) -> bool:
+    """编码结果的base64长度是否在预算内，预算为0表示不限制"""
+    return not max_base64_size or base64_size(len(encoded.data)) <= max_base64_size
+
+
+def fit_budget(frame, image_format: str, quality: int, max_base64_size: int,
+               first: Optional[EncodedImage] = None) -> EncodedImage:
+    """选择base64长度不超过max_base64_size的编码参数
+
+    原始像素(raw)格式只缩小尺寸。无法满足预算时返回尝试过的最小结果，调用方用fits判断。
+
+    Args:
+        frame: 处理后的RGB或灰度数组
+        image_format: 请求的格式
+        quality: 请求的质量(有损格式)
+        max_base64_size: base64长度上限
+        first: 已经按请求参数编码的结果，避免重复编码
+    """
+    encoded = first or encode_image(frame, image_format, quality)
+    if fits(encoded, max_base64_size):
+        return encoded
+    smallest = encoded
+
+    def attempt(candidate, candidate_format: str, candidate_quality: int) -> bool:
+        nonlocal encoded, smallest
+        encoded = encode_image(candidate, candidate_format, candidate_quality)
+        if len(encoded.data) < len(smallest.data):
+            smallest = encoded
+        return fits(encoded, max_base64_size)
+
+    if image_format == 'png' and HAS_PILLOW:
+        # 截图用有损格式通常小一个数量级
+        image_format = 'jpeg'
+        quality = min(quality, DEFAULT_QUALITY)
+        if attempt(frame, image_format, quality):
+            return encoded
+    if image_format in LOSSY_FORMATS:
+        steps = [step for step in QUALITY_STEPS if step < quality]
+        if steps and base64_size(len(encoded.data)) > 2 * max_base64_size:
+            # 超出较多时降低质量不够，直接用最低质量，再缩小尺寸
+            steps = steps[-1:]
+        for step in steps:
+            quality = step
+            if attempt(frame, image_format, quality):
+                return encoded
+
+    height, width = frame.shape[:2]
+    for _ in range(MAX_SCALE_ATTEMPTS):
+        if encoded.width <= MIN_BUDGET_WIDTH:
+            break
+        # 编码大小大致与像素数成正比，留出5%余量
+        ratio = math.sqrt(max_base64_size / base64_size(len(encoded.data))) * 0.95
+        target_width = max(MIN_BUDGET_WIDTH, int(encoded.width * max(0.25, min(0.9, ratio))))
+        if attempt(resize(frame, *fit_size(width, height, target_width)), image_format, quality):
+            return encoded
+    return smallest
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 批量输入
+
+把一组点击、滑动、按键、文本输入操作编译成shell脚本，通过 `adb shell` 调用在设备上依次执行，
+并按操作拆分返回结果。通常整个批量只有一个脚本；超过 MAX_SCRIPT_BYTES 时拆成多个脚本，共用一个步骤标记，
+依次执行后合并输出即可按操作解析。
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from phone_mcp_by_trae.adb_shell import new_marker, quote_shell_arg
+from phone_mcp_by_trae.package_index import LAUNCHER_FLAGS
+from phone_mcp_by_trae.text_input import MAX_SCRIPT_BYTES, text_command
+
+# 常见按键代码映射
+KEYCODE_MAP = {
+    'home': '3',
+    'back': '4',
+    'menu': '82',
+    'power': '26',
+    'volume_up': '24',
+    'volume_down': '25',
+    'enter': '66',
+    'delete': '67',
+    'recent': '187'
+}
+
+# 支持的操作类型及其别名
+ACTION_ALIASES = {
+    'tap': 'tap',
+    'swipe': 'swipe',
+    'long_press': 'long_press',
+    'key': 'key',
+    'press_key': 'key',
+    'text': 'text',
+    'input_text': 'text',
+    'sleep': 'sleep',
+    'wait': 'sleep',
+    'launch': 'launch',
+    'open_app': 'launch',
+    'url': 'url',
+    'open_url': 'url',
+}
+
+def resolve_keycode(keycode: str) -> str:
+    """如果是映射中的按键名，转换为代码"""
+    return KEYCODE_MAP.get(str(keycode).lower(), str(keycode))
+
+
+def build_action_command(action: Dict[str, Any]) -> str:
+    """把单个操作转换为设备端shell命令
+
+    Args:
+        action: 操作描述，例如 {"action": "tap", "x": 100, "y": 200}
+
+    Returns:
+        shell命令行
+    """
+    kind = ACTION_ALIASES.get(str(action.get('action', '')).lower())
+    if kind == 'tap':
+        return f"input tap {int(action['x'])} {int(action['y'])}"
+    if kind == 'swipe':
+        return "input swipe {} {} {} {} {}".format(
+            int(action['x1']), int(action['y1']), int(action['x2']), int(action['y2']),
+            int(action.get('duration', 300))
+        )
+    if kind == 'long_press':
+        x, y = int(action['x']), int(action['y'])
+        return f"input swipe {x} {y} {x} {y} {int(action.get('duration', 800))}"
+    if kind == 'key':
+        return f"input keyevent {quote_shell_arg(resolve_keycode(action['keycode']))}"
+    if kind == 'text':
+        return text_command(str(action['text']))
+    if kind == 'sleep':
+        return f"sleep {_seconds(action.get('duration', 0))}"
+    if kind == 'launch':
+        if action.get('component'):
+            return (f"am start -n {quote_shell_arg(action['component'])} -a android.intent.action.MAIN "
+                    f"-c android.intent.category.LAUNCHER -f {LAUNCHER_FLAGS}")
+        return f"monkey -p {quote_shell_arg(action['package'])} -c android.intent.category.LAUNCHER 1"
+    if kind == 'url':
+        return f"am start -a android.intent.action.VIEW -d {quote_shell_arg(action['url'])}"
+    raise ValueError(f"未知的操作类型: {action.get('action')}")
+
+
+def _seconds(milliseconds: Any) -> str:
+    """把毫秒转换为sleep可接受的秒数字符串"""
+    return '{:.3f}'.format(max(0, int(milliseconds)) / 1000.0)
+
+
+def compile_actions(actions: List[Dict[str, Any]], stop_on_error: bool = False,
+                    max_script_bytes: int = MAX_SCRIPT_BYTES) -> Tuple[List[str], str]:
+    """把操作列表编译为shell脚本
+
+    每个操作执行后输出带序号和退出码的标记行，操作的 `delay` 字段(毫秒)
+    会在该操作之后插入等待。脚本本身总是以0退出，以便完整取回各步结果。
+    操作依次打包进不超过max_script_bytes的脚本，单个操作超过限制时单独成为一个脚本。
+    调用方依次执行各脚本，每个脚本执行后用continue_batch判断是否继续。
+
+    Args:
+        actions: 操作列表
+        stop_on_error: 某个操作失败后是否跳过剩余操作
+        max_script_bytes: 单个脚本的最大字节数
+
+    Returns:
+        (脚本列表, 标记前缀)
+    """
+    marker = new_marker()
+    scripts = []  # type: List[str]
+    parts = []  # type: List[str]
+    # 'ok=1; ' 与 '; true'
+    size = 12
+    for index, action in enumerate(actions):
+        command = build_action_command(action)
+        step = f"{command} 2>&1; rc=$?; echo {marker} {index} $rc"
+        if stop_on_error:
+            step = f"if [ $ok = 1 ]; then {step}; [ $rc = 0 ] || ok=0; fi"
+        delay = action.get('delay')
+        if delay:
+            step += f"; sleep {_seconds(delay)}"
+        step_size = len(step.encode('utf-8')) + 2
+        if parts and size + step_size > max_script_bytes:
+            scripts.append('; '.join(['ok=1'] + parts + ['true']))
+            parts, size = [], 12
+        parts.append(step)
+        size += step_size
+    scripts.append('; '.join(['ok=1'] + parts + ['true']))
+    return scripts, marker
+
+
+def continue_batch(output: str, marker: str, stop_on_error: bool = False) -> bool:
+    """一个脚本执行后是否继续执行下一个脚本
+
+    脚本没有输出任何标记行(没有执行)，或者stop_on_error时其中有操作失败，返回False。
+    """
+    exit_codes = [line[line.find(marker) + len(marker):].split()[1:2]
+                  for line in output.splitlines() if marker in line]
+    if not exit_codes:
+        return False
+    return not stop_on_error or all(code == ['0'] for code in exit_codes)
+
+
+def parse_batch_output(output: str, marker: str, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按标记行把脚本输出拆分为每个操作的结果
+
+    Returns:
+        每个操作的结果列表，未执行的操作标记为skipped
+    """
+    results = {}  # type: Dict[int, Dict[str, Any]]
+    pending = []  # type: List[str]
+    for line in output.splitlines():
+        index = line.find(marker)
+        if index < 0:
+            pending.append(line)
+            continue
+        if index > 0:
+            pending.append(line[:index])
+        fields = line[index + len(marker):].split()
+        try:
+            step, exit_code = int(fields[0]), int(fields[1])
+        except (IndexError, ValueError):
+            continue
+        results[step] = {
+            'index': step,
+            'action': actions[step].get('action') if step < len(actions) else None,
+            'success': exit_code == 0,
+            'exit_code': exit_code,
+            'details': '\n'.join(pending).strip()
+        }
+        pending = []
+
+    return [
+        results.get(index, {
+            'index': index,
+            'action': action.get('action'),
+            'success': False,
+            'skipped': True,
+            'details': ''
+        })
+        for index, action in enumerate(actions)
+    ]
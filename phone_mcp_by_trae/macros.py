@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 宏
+
+录制：开始录制后，点击、滑动、长按、按键、文本输入、打开应用/URL和批量输入等工具的成功调用
+依次转换为批量输入格式的操作(见input_batch)，相邻两次调用之间的间隔保存为前一步的delay(毫秒)。
+
+保存：宏以JSON保存在主机的宏目录(环境变量 PHONE_MCP_MACRO_DIR，默认 ~/.phone_mcp/macros)，
+同时把编译出的shell脚本按内容哈希保存为 <哈希>.sh。脚本不含任何随机内容，步骤不变时哈希也不变。
+
+运行：脚本按哈希命名存放在设备的 /data/local/tmp/phone_mcp_macros 下，运行命令先检查脚本是否存在，
+不存在时才推送，因此同一个宏只在第一次运行或修改后推送一次。脚本在设备上循环执行指定次数，
+只在步骤失败时输出一行，整个运行只需一次adb调用，不受主机与设备之间往返延迟的影响。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from phone_mcp_by_trae.input_batch import build_action_command
+
+# 设备上存放宏脚本的目录
+DEVICE_MACRO_DIR = '/data/local/tmp/phone_mcp_macros'
+
+_NAME_PATTERN = re.compile(r'^[\w.-]+$')
+
+
+def default_macro_dir() -> str:
+    """主机上的宏目录"""
+    return os.environ.get('PHONE_MCP_MACRO_DIR') or os.path.join(os.path.expanduser('~'), '.phone_mcp', 'macros')
+
+
+def check_name(name: str) -> str:
+    """检查宏名称，只允许字母、数字、下划线、点和短横线
+
+    Raises:
+        ValueError: 名称无效
+    """
+    if not _NAME_PATTERN.match(name or ''):
+        raise ValueError(f"宏名称只能包含字母、数字、下划线、点和短横线: {name!r}")
+    return name
+
+
+def actions_from_call(tool_name: str, arguments: Dict[str, Any], result: Any) -> List[Dict[str, Any]]:
+    """把一次成功的工具调用转换为操作，不能录制的工具返回空列表
+
+    多指手势(pinch、multi_touch)依赖具体设备的触摸屏参数，不录制。
+    """
+    if tool_name == 'tap':
+        return [{'action': 'tap', 'x': arguments['x'], 'y': arguments['y']}]
+    if tool_name == 'swipe':
+        return [{'action': 'swipe', 'x1': arguments['x1'], 'y1': arguments['y1'],
+                 'x2': arguments['x2'], 'y2': arguments['y2'], 'duration': arguments.get('duration', 300)}]
+    if tool_name == 'long_press':
+        return [{'action': 'long_press', 'x': arguments['x'], 'y': arguments['y'],
+                 'duration': arguments.get('duration', 800)}]
+    if tool_name == 'press_key':
+        return [{'action': 'key', 'keycode': arguments['keycode']}]
+    if tool_name == 'input_text':
+        return [{'action': 'text', 'text': arguments['text']}]
+    if tool_name == 'open_app' and isinstance(result, dict) and result.get('package'):
+        return [{'action': 'launch', 'package': result['package'], 'component': result.get('component')}]
+    if tool_name == 'open_url':
+        return [{'action': 'url', 'url': arguments['url']}]
+    if tool_name == 'batch_input':
+        return [dict(action) for action in arguments.get('actions') or []]
+    return []
+
+
+class MacroRecorder:
+    """录制一个设备上的工具调用，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.name = None  # type: Optional[str]
+        self.device_id = None  # type: Optional[str]
+        self.steps = []  # type: List[Dict[str, Any]]
+        self._last_finished = None  # type: Optional[float]
+
+    @property
+    def active(self) -> bool:
+        return self.name is not None
+
+    def start(self, name: str, device_id: Optional[str]) -> None:
+        """开始录制，之前未结束的录制被丢弃"""
+        with self._lock:
+            self.name = check_name(name)
+            self.device_id = device_id
+            self.steps = []
+            self._last_finished = None
+
+    def add(self, device_id: Optional[str], tool_name: str, arguments: Dict[str, Any], result: Any,
+            started: float, finished: float) -> bool:
+        """记录一次工具调用，started/finished为time.perf_counter()的值
+
+        Returns:
+            是否录制了该调用(未在录制、设备不同、调用失败或工具不能录制时为False)
+        """
+        if not isinstance(result, dict) or not result.get('success'):
+            return False
+        actions = actions_from_call(tool_name, arguments, result)
+        with self._lock:
+            if not self.active or device_id != self.device_id or not actions:
+                return False
+            if self.steps and self._last_finished is not None:
+                # 与上一次调用之间的间隔作为上一步之后的等待，批量输入中已有的delay保留
+                gap = max(0, int(round((started - self._last_finished) * 1000)))
+                if gap:
+                    self.steps[-1]['delay'] = int(self.steps[-1].get('delay') or 0) + gap
+            self.steps.extend(actions)
+            self._last_finished = finished
+            return True
+
+    def stop(self) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """结束录制，返回 (名称, 操作列表)"""
+        with self._lock:
+            name, steps = self.name, self.steps
+            self.name, self.device_id, self.steps, self._last_finished = None, None, [], None
+            return name, steps
+
+
+def compile_macro(steps: List[Dict[str, Any]]) -> str:
+    """把操作列表编译为宏脚本
+
+    脚本参数: $1 标记  $2 重复次数(默认1)  $3 为1时某一步失败后停止  $4 为0时忽略步骤之间的等待。
+    步骤失败时输出 "<标记> <第几次> <序号> <退出码>" 及该步骤的输出，结束时输出 "<标记> done <完成次数> <失败数>"。
+
+    Raises:
+        KeyError, TypeError, ValueError: 操作无效
+    """
+    lines = [
+        'm=$1; n=${2:-1}; s=${3:-0}; t=${4:-1}; f=0; i=0',
+        'w() { [ "$t" = 0 ] || sleep $1; }',
+        'while [ $i -lt $n ]; do',
+        'i=$((i+1))',
+    ]
+    for index, action in enumerate(steps):
+        lines.append(f'out=$({{ {build_action_command(action)}; }} 2>&1) || '
+                     f'{{ echo "$m $i {index} $?"; echo "$out"; f=$((f+1)); [ "$s" = 1 ] && break; }}')
+        if action.get('delay'):
+            lines.append(f"w {max(0, int(action['delay'])) / 1000:.3f}")
+    lines += ['done', 'echo "$m done $i $f"', '']
+    return '\n'.join(lines)
+
+
+def script_hash(script: str) -> str:
+    return hashlib.sha256(script.encode('utf-8')).hexdigest()[:16]
+
+
+def device_script_path(digest: str) -> str:
+    return f"{DEVICE_MACRO_DIR}/{digest}.sh"
+
+
+def run_command(digest: str, marker: str, repeat: int = 1, stop_on_error: bool = True,
+                keep_timing: bool = True) -> str:
+    """在设备上运行宏脚本的命令，脚本不存在时只输出 "<标记> missing" """
+    path = device_script_path(digest)
+    return (f"if [ -f {path} ]; then sh {path} {marker} {max(1, int(repeat))} "
+            f"{1 if stop_on_error else 0} {1 if keep_timing else 0}; else echo {marker} missing; fi")
+
+
+def parse_run_output(output: str, marker: str, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """解析宏脚本的输出
+
+    Returns:
+        {'missing': 脚本不存在, 'finished': 是否输出了结束行, 'iterations': 执行次数,
+         'failures': [{'iteration', 'index', 'action', 'exit_code', 'details'}]}
+    """
+    parsed = {'missing': False, 'finished': False, 'iterations': 0, 'failures': []}  # type: Dict[str, Any]
+    failure = None  # type: Optional[Dict[str, Any]]
+    details = []  # type: List[str]
+    for line in output.splitlines():
+        if not line.startswith(marker):
+            details.append(line)
+            continue
+        if failure is not None:
+            failure['details'] = '\n'.join(details).strip()
+        details = []
+        failure = None
+        fields = line[len(marker):].split()
+        if fields[:1] == ['missing']:
+            parsed['missing'] = True
+        elif fields[:1] == ['done'] and len(fields) >= 2:
+            parsed['finished'] = True
+            parsed['iterations'] = int(fields[1])
+        elif len(fields) >= 3 and all(field.lstrip('-').isdigit() for field in fields[:3]):
+            iteration, index, exit_code = (int(field) for field in fields[:3])
+            failure = {
+                'iteration': iteration,
+                'index': index,
+                'action': steps[index].get('action') if 0 <= index < len(steps) else None,
+                'exit_code': exit_code,
+                'details': ''
+            }
+            parsed['failures'].append(failure)
+    if failure is not None:
+        failure['details'] = '\n'.join(details).strip()
+    return parsed
+
+
+class MacroStore:
+    """主机上的宏目录：<名称>.json 保存操作列表，<哈希>.sh 保存编译后的脚本"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or default_macro_dir()
+
+    def _macro_path(self, name: str) -> str:
+        return os.path.join(self.directory, check_name(name) + '.json')
+
+    def script_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + '.sh')
+
+    def save(self, name: str, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """编译并保存宏，返回宏的内容
+
+        Raises:
+            KeyError, TypeError, ValueError: 名称或操作无效
+        """
+        path = self._macro_path(name)
+        script = compile_macro(steps)
+        digest = script_hash(script)
+        macro = {'name': name, 'created': time.time(), 'hash': digest, 'steps': steps}
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.script_path(digest)):
+            _write_text(self.script_path(digest), script)
+        _write_text(path, json.dumps(macro, ensure_ascii=False, indent=2))
+        return macro
+
+    def load(self, name: str) -> Dict[str, Any]:
+        """读取宏，脚本文件丢失时重新编译
+
+        Raises:
+            KeyError: 宏不存在
+        """
+        path = self._macro_path(name)
+        if not os.path.exists(path):
+            raise KeyError(name)
+        with open(path, 'r', encoding='utf-8') as f:
+            macro = json.load(f)
+        if not os.path.exists(self.script_path(macro['hash'])):
+            script = compile_macro(macro['steps'])
+            macro['hash'] = script_hash(script)
+            _write_text(self.script_path(macro['hash']), script)
+        return macro
+
+    def list(self) -> List[Dict[str, Any]]:
+        """所有宏的名称、步骤数、总等待时间和哈希"""
+        macros = []  # type: List[Dict[str, Any]]
+        if not os.path.isdir(self.directory):
+            return macros
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                    macro = json.load(f)
+            except (OSError, ValueError):
+                continue
+            macros.append({
+                'name': macro.get('name'),
+                'steps': len(macro.get('steps', [])),
+                'delay_ms': sum(int(step.get('delay') or 0) for step in macro.get('steps', [])),
+                'hash': macro.get('hash'),
+                'created': macro.get('created')
+            })
+        return macros
+
+    def delete(self, name: str) -> bool:
+        """删除宏，其他宏不再使用的脚本文件一并删除"""
+        path = self._macro_path(name)
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            digest = json.load(f).get('hash')
+        os.remove(path)
+        if digest and all(item['hash'] != digest for item in self.list()):
+            try:
+                os.remove(self.script_path(digest))
+            except OSError:
+                pass
+        return True
+
+
+def _write_text(path: str, text: str) -> None:
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
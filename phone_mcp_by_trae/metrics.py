@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 调用指标
+
+按 (类别, 名称, 设备) 统计调用次数、错误次数、输出字节数和耗时分布。耗时使用固定边界的直方图，
+每个序列占用的内存是常数，可以长时间运行；百分位数在桶内线性插值得到。
+
+类别目前有两种：tool(MCP工具调用)和adb(ADB命令，名称为子命令加第一个词，例如 "shell input")。
+指标可以导出为JSON快照(供命令行 `stats` 读取)或Prometheus文本格式。
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# 直方图的桶上界(毫秒)，最后一个桶收集超过最大上界的值
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+KIND_TOOL = 'tool'
+KIND_ADB = 'adb'
+
+# 没有指定设备时使用的标签
+DEFAULT_DEVICE = 'default'
+
+# Prometheus指标名前缀，类别 -> (前缀, 名称标签)
+_PROMETHEUS_NAMES = {
+    KIND_TOOL: ('phone_mcp_tool', 'tool'),
+    KIND_ADB: ('phone_mcp_adb_command', 'command'),
+}
+
+
+class LatencyHistogram:
+    """固定桶的耗时直方图"""
+
+    __slots__ = ('buckets', 'total_ms', 'min_ms', 'max_ms')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.total_ms = 0.0
+        self.min_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float) -> None:
+        """记录一次耗时"""
+        index = 0
+        while index < len(BUCKET_BOUNDS_MS) and elapsed_ms > BUCKET_BOUNDS_MS[index]:
+            index += 1
+        self.min_ms = min(self.min_ms, elapsed_ms) if self.count else elapsed_ms
+        self.buckets[index] += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    @property
+    def count(self) -> int:
+        return sum(self.buckets)
+
+    def percentile(self, quantile: float) -> float:
+        """估算百分位数(毫秒)，在目标桶的上下界之间线性插值，上下界不超出实际观察到的最小、最大值"""
+        count = self.count
+        if not count:
+            return 0.0
+        target = quantile * count
+        cumulative = 0
+        for index, bucket in enumerate(self.buckets):
+            if bucket and cumulative + bucket >= target:
+                lower = BUCKET_BOUNDS_MS[index - 1] if index > 0 else 0.0
+                upper = BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+                lower = max(lower, self.min_ms)
+                upper = min(upper, self.max_ms)
+                return lower + (upper - lower) * (target - cumulative) / bucket
+            cumulative += bucket
+        return self.max_ms
+
+
+class MetricSeries:
+    """单个 (类别, 名称, 设备) 的统计"""
+
+    __slots__ = ('calls', 'errors', 'bytes', 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+    def summary(self) -> Dict[str, Any]:
+        """调用次数、错误数、字节数和耗时百分位"""
+        latency = self.latency
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'total_ms': round(latency.total_ms, 1),
+            'mean_ms': round(latency.total_ms / self.calls, 2) if self.calls else 0.0,
+            'p50_ms': round(latency.percentile(0.50), 2),
+            'p95_ms': round(latency.percentile(0.95), 2),
+            'p99_ms': round(latency.percentile(0.99), 2),
+            'max_ms': round(latency.max_ms, 2)
+        }
+
+
+class MetricsRegistry:
+    """线程安全的指标集合"""
+
+    def __init__(self):
+        self._series = {}  # type: Dict[Tuple[str, str, str], MetricSeries]
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, kind: str, name: str, device: Optional[str], elapsed_ms: float,
+               error: bool = False, size: int = 0) -> None:
+        """记录一次调用
+
+        Args:
+            kind: 类别，tool 或 adb
+            name: 工具名或命令名
+            device: 设备ID，None表示默认设备
+            elapsed_ms: 耗时(毫秒)
+            error: 是否失败
+            size: 输出字节数
+        """
+        key = (kind, name, device or DEFAULT_DEVICE)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = MetricSeries()
+            series.calls += 1
+            series.errors += int(error)
+            series.bytes += size
+            series.latency.observe(elapsed_ms)
+
+    def reset(self) -> None:
+        """清空所有统计"""
+        with self._lock:
+            self._series.clear()
+            self.started = time.time()
+
+    def summary(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """返回每个序列的统计，按总耗时从高到低排列
+
+        Args:
+            kind: 只返回该类别，None表示全部
+        """
+        with self._lock:
+            rows = [
+                dict({'kind': key[0], 'name': key[1], 'device': key[2]}, **series.summary())
+                for key, series in self._series.items()
+                if kind is None or key[0] == kind
+            ]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    # ---- 快照 ----
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出包含直方图原始计数的快照，可以用from_dict还原"""
+        with self._lock:
+            return {
+                'started': self.started,
+                'updated': time.time(),
+                'bucket_bounds_ms': list(BUCKET_BOUNDS_MS),
+                'series': [
+                    {
+                        'kind': key[0], 'name': key[1], 'device': key[2],
+                        'calls': series.calls, 'errors': series.errors, 'bytes': series.bytes,
+                        'buckets': list(series.latency.buckets),
+                        'total_ms': series.latency.total_ms,
+                        'min_ms': series.latency.min_ms, 'max_ms': series.latency.max_ms
+                    } for key, series in self._series.items()
+                ]
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MetricsRegistry':
+        """从to_dict导出的快照还原
+
+        Raises:
+            ValueError: 快照的桶边界与当前版本不一致
+        """
+        if tuple(data.get('bucket_bounds_ms', ())) != BUCKET_BOUNDS_MS:
+            raise ValueError("指标快照的直方图边界与当前版本不一致")
+        registry = cls()
+        registry.started = data.get('started', registry.started)
+        for item in data.get('series', []):
+            series = MetricSeries()
+            series.calls = item['calls']
+            series.errors = item['errors']
+            series.bytes = item['bytes']
+            series.latency.buckets = list(item['buckets'])
+            series.latency.total_ms = item['total_ms']
+            series.latency.min_ms = item.get('min_ms', 0.0)
+            series.latency.max_ms = item['max_ms']
+            registry._series[(item['kind'], item['name'], item['device'])] = series
+        return registry
+
+    def write_json(self, path: str) -> None:
+        """把快照写入文件"""
+        _write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False))
+
+    @classmethod
+    def load_json(cls, path: str) -> 'MetricsRegistry':
+        """从write_json写入的文件读取快照"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    # ---- Prometheus ----
+
+    def to_prometheus(self) -> str:
+        """导出Prometheus文本格式，耗时以秒为单位"""
+        with self._lock:
+            items = sorted(self._series.items())
+        lines = []  # type: List[str]
+        for kind, (prefix, name_label) in _PROMETHEUS_NAMES.items():
+            selected = [(key, series) for key, series in items if key[0] == kind]
+            if not selected:
+                continue
+            for metric, help_text, value in (
+                ('calls_total', '调用次数', lambda series: series.calls),
+                ('errors_total', '失败次数', lambda series: series.errors),
+                ('output_bytes_total', '输出字节数', lambda series: series.bytes),
+            ):
+                lines.append(f'# HELP {prefix}_{metric} {help_text}')
+                lines.append(f'# TYPE {prefix}_{metric} counter')
+                for key, series in selected:
+                    labels = _labels(**{name_label: key[1], 'device': key[2]})
+                    lines.append(f'{prefix}_{metric}{{{labels}}} {value(series)}')
+            lines.append(f'# HELP {prefix}_latency_seconds 耗时')
+            lines.append(f'# TYPE {prefix}_latency_seconds histogram')
+            for key, series in selected:
+                labels = _labels(**{name_label: key[1], 'device': key[2]})
+                cumulative = 0
+                for bound, bucket in zip(BUCKET_BOUNDS_MS, series.latency.buckets):
+                    cumulative += bucket
+                    lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="+Inf"}} {series.latency.count}')
+                lines.append(f'{prefix}_latency_seconds_sum{{{labels}}} {series.latency.total_ms / 1000:.6f}')
+                lines.append(f'{prefix}_latency_seconds_count{{{labels}}} {series.latency.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        """把Prometheus文本写入文件(例如供node_exporter的textfile收集器读取)"""
+        _write_atomic(path, self.to_prometheus())
+
+
+class MetricsFileWriter:
+    """后台线程，定期把指标写入JSON快照和/或Prometheus文本文件"""
+
+    def __init__(self, registry: MetricsRegistry, json_path: Optional[str] = None,
+                 prometheus_path: Optional[str] = None, interval: float = 10.0):
+        self.registry = registry
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def start(self) -> 'MetricsFileWriter':
+        """启动后台写入线程"""
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """立即写入文件，写入失败时忽略(下次再试)"""
+        try:
+            if self.json_path:
+                self.registry.write_json(self.json_path)
+            if self.prometheus_path:
+                self.registry.write_prometheus(self.prometheus_path)
+        except OSError:
+            pass
+
+    def stop(self) -> None:
+        """停止线程并做最后一次写入"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def command_label(command: List[str]) -> str:
+    """ADB命令的统计名称：子命令加第一个词，例如 shell input、exec-out screencap"""
+    if not command:
+        return ''
+    if len(command) == 1:
+        return command[0]
+    words = command[1].split()
+    return f"{command[0]} {words[0][:32]}" if words else command[0]
+
+
+def result_size(value: Any) -> int:
+    """估算工具返回值的大小：递归累加其中字符串和二进制数据的长度，避免序列化整个结果"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(result_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(result_size(item) for item in value)
+    return 0
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: Any) -> str:
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+
+def _write_atomic(path: str, text: str) -> None:
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 已安装应用索引
+
+为每个设备建立一次 `pm list packages` 与启动Activity的索引，支持按包名、别名模糊查找，
+并缓存启动组件，使打开应用可以直接使用 `am start -n`，不必走较慢的monkey。
+
+Android的shell命令无法直接读取应用标签(需要解析APK资源)，因此标签来自内置的常用应用别名、
+环境变量 PHONE_MCP_APP_ALIASES 指向的JSON别名文件，以及包名本身的各个片段。
+"""
+
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from phone_mcp_by_trae.adb_shell import quote_shell_arg
+
+# 索引的最长有效期(秒)，超过后下次查找时增量刷新
+INDEX_TTL = 300
+
+# 启动器Intent的flags: FLAG_ACTIVITY_NEW_TASK | FLAG_ACTIVITY_RESET_TASK_IF_NEEDED
+LAUNCHER_FLAGS = '0x10200000'
+
+# 常用应用的名称别名
+COMMON_APP_ALIASES = {
+    '微信': 'com.tencent.mm',
+    'wechat': 'com.tencent.mm',
+    'qq': 'com.tencent.mobileqq',
+    '支付宝': 'com.eg.android.AlipayGphone',
+    'alipay': 'com.eg.android.AlipayGphone',
+    '淘宝': 'com.taobao.taobao',
+    '抖音': 'com.ss.android.ugc.aweme',
+    '微博': 'com.sina.weibo',
+    '美团': 'com.sankuai.meituan',
+    '哔哩哔哩': 'tv.danmaku.bili',
+    'bilibili': 'tv.danmaku.bili',
+    '设置': 'com.android.settings',
+    'settings': 'com.android.settings',
+    'chrome': 'com.android.chrome',
+    '浏览器': 'com.android.browser',
+    '相机': 'com.android.camera',
+    'camera': 'com.android.camera',
+    '电话': 'com.android.dialer',
+    'phone': 'com.android.dialer',
+    '短信': 'com.android.mms',
+    'messages': 'com.google.android.apps.messaging',
+    '联系人': 'com.android.contacts',
+    'contacts': 'com.android.contacts',
+    '日历': 'com.android.calendar',
+    'calendar': 'com.android.calendar',
+    'youtube': 'com.google.android.youtube',
+    'gmail': 'com.google.android.gm',
+    'maps': 'com.google.android.apps.maps',
+    'play store': 'com.android.vending',
+}
+
+_COMPONENT_PATTERN = re.compile(r'^\s*([A-Za-z0-9_.]+)/([A-Za-z0-9_.$]+)\s*$')
+
+# 包名中没有区分意义的片段
+_GENERIC_SEGMENTS = {'com', 'android', 'google', 'apps', 'app', 'org', 'net', 'cn', 'mobile'}
+
+
+def load_aliases() -> Dict[str, str]:
+    """合并内置别名与用户别名文件，键为小写名称"""
+    aliases = {name.lower(): package for name, package in COMMON_APP_ALIASES.items()}
+    path = os.environ.get('PHONE_MCP_APP_ALIASES')
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                aliases.update({name.lower(): package for name, package in json.load(f).items()})
+        except (OSError, ValueError, AttributeError):
+            pass
+    return aliases
+
+
+def parse_package_list(output: str) -> Set[str]:
+    """解析 `pm list packages` 的输出"""
+    return {
+        line.strip()[len('package:'):]
+        for line in output.splitlines()
+        if line.strip().startswith('package:')
+    }
+
+
+def parse_components(output: str) -> Dict[str, str]:
+    """从 query-activities/resolve-activity 的 --brief 输出中提取 包名 -> 启动组件"""
+    components = {}
+    for line in output.splitlines():
+        match = _COMPONENT_PATTERN.match(line)
+        if match:
+            components.setdefault(match.group(1), f"{match.group(1)}/{match.group(2)}")
+    return components
+
+
+def package_labels(package: str) -> List[str]:
+    """从包名推导可供查找的名称片段，例如 com.android.settings -> settings"""
+    segments = [segment for segment in package.lower().split('.') if segment]
+    return [segment for segment in segments if segment not in _GENERIC_SEGMENTS]
+
+
+class PackageIndex:
+    """单个设备的已安装应用索引"""
+
+    def __init__(self, executor, ttl: float = INDEX_TTL):
+        """初始化索引
+
+        Args:
+            executor: ADBExecutor实例，使用其当前设备
+            ttl: 索引最长有效期(秒)
+        """
+        self.executor = executor
+        self.ttl = ttl
+        self.packages = set()  # type: Set[str]
+        self.components = {}  # type: Dict[str, str]
+        self.aliases = load_aliases()
+        self.updated = 0.0
+        self._lock = threading.Lock()
+
+    def _list_packages(self) -> Set[str]:
+        output = self.executor.execute_command(['shell', 'pm', 'list', 'packages'])
+        return parse_package_list(output)
+
+    def build(self) -> None:
+        """完整建立索引：列出全部包名并一次查询所有启动Activity"""
+        packages = self._list_packages()
+        output = self.executor.execute_command([
+            'shell', 'cmd', 'package', 'query-activities', '--brief',
+            '-a', 'android.intent.action.MAIN', '-c', 'android.intent.category.LAUNCHER'
+        ])
+        with self._lock:
+            self.packages = packages
+            self.components = {
+                package: component for package, component in parse_components(output).items()
+                if package in packages
+            }
+            self.updated = time.time()
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """增量刷新：只为新安装的包查询启动组件，并移除已卸载的包
+
+        Returns:
+            {'added': [...], 'removed': [...]}
+        """
+        if not self.updated:
+            self.build()
+            return {'added': sorted(self.packages), 'removed': []}
+
+        packages = self._list_packages()
+        if not packages:
+            # 命令失败时保留原索引
+            return {'added': [], 'removed': []}
+        with self._lock:
+            added = packages - self.packages
+            removed = self.packages - packages
+        components = self._resolve_components(sorted(added)) if added else {}
+        with self._lock:
+            self.packages = packages
+            for package in removed:
+                self.components.pop(package, None)
+            self.components.update(components)
+            self.updated = time.time()
+        return {'added': sorted(added), 'removed': sorted(removed)}
+
+    def _resolve_components(self, packages: Iterable[str]) -> Dict[str, str]:
+        """在一次shell调用中查询多个包的启动组件"""
+        script = '; '.join(
+            f"cmd package resolve-activity --brief -c android.intent.category.LAUNCHER {package}"
+            for package in packages
+        )
+        return parse_components(self.executor.execute_command(['shell', script]))
+
+    def ensure_fresh(self) -> None:
+        """索引不存在或已过期时刷新"""
+        if not self.updated or time.time() - self.updated > self.ttl:
+            self.refresh()
+
+    def lookup(self, name: str, limit: int = 5) -> List[str]:
+        """按包名、别名或名称片段查找应用
+
+        依次尝试：完整包名、别名完全匹配、包名片段完全匹配、前缀匹配、包含匹配、近似匹配。
+        可启动的应用排在前面。
+
+        Returns:
+            候选包名列表，最匹配的在前
+        """
+        query = name.strip().lower()
+        if not query:
+            return []
+        with self._lock:
+            packages = set(self.packages)
+            launchable = set(self.components)
+
+        def ranked(candidates: Iterable[str]) -> List[str]:
+            return sorted(set(candidates), key=lambda package: (package not in launchable, len(package), package))
+
+        if name.strip() in packages:
+            return [name.strip()]
+        alias = self.aliases.get(query)
+        if alias in packages:
+            return [alias]
+
+        labels = {}  # type: Dict[str, List[str]]
+        for package in packages:
+            for label in package_labels(package):
+                labels.setdefault(label, []).append(package)
+
+        for matcher in (
+            lambda label: label == query,
+            lambda label: label.startswith(query),
+        ):
+            matches = [package for label, owners in labels.items() if matcher(label) for package in owners]
+            if matches:
+                return ranked(matches)[:limit]
+
+        matches = [package for package in packages if package.lower().startswith(query)]
+        matches += [package for package in packages if query in package.lower()]
+        matches += [
+            package for alias_name, package in self.aliases.items()
+            if package in packages and (alias_name.startswith(query) or query in alias_name)
+        ]
+        if matches:
+            return ranked(matches)[:limit]
+
+        close = difflib.get_close_matches(query, list(labels) + list(self.aliases), n=limit, cutoff=0.75)
+        matches = []
+        for candidate in close:
+            matches.extend(labels.get(candidate, []))
+            if self.aliases.get(candidate) in packages:
+                matches.append(self.aliases[candidate])
+        return ranked(matches)[:limit]
+
+    def component(self, package: str) -> Optional[str]:
+        """返回应用的启动组件"""
+        with self._lock:
+            return self.components.get(package)
+
+    def refresh_component(self, package: str) -> Optional[str]:
+        """重新查询单个应用的启动组件(应用更新后组件可能变化)"""
+        component = self._resolve_components([package]).get(package)
+        with self._lock:
+            if component:
+                self.components[package] = component
+            else:
+                self.components.pop(package, None)
+        return component
+
+    def launch_command(self, package: str) -> List[str]:
+        """返回启动应用的adb命令，有启动组件时使用am start -n，否则使用monkey"""
+        component = self.component(package)
+        if component:
+            # 内部类或别名Activity的名称中可能有$，设备端shell会展开它
+            return ['shell', 'am', 'start', '-n', quote_shell_arg(component),
+                    '-a', 'android.intent.action.MAIN',
+                    '-c', 'android.intent.category.LAUNCHER', '-f', LAUNCHER_FLAGS]
+        return ['shell', 'monkey', '-p', package, '-c', 'android.intent.category.LAUNCHER', '1']
+
+    def resolve(self, name: str) -> List[str]:
+        """查找应用，找不到时增量刷新索引后再试一次"""
+        self.ensure_fresh()
+        matches = self.lookup(name)
+        if not matches:
+            self.refresh()
+            matches = self.lookup(name)
+        return matches
@@ -6,11 +6,25 @@ Trae Phone MCP CLI - 命令行界面，用于直接与Android设备交互
 """
 
 import argparse
+import json
+import os
 import sys
 from typing import List, Optional, Dict, Any
 
-# 导入主模块
-from phone_mcp_by_trae.phone_mcp import ADBExecutor
+# 只导入启动较快的模块；MCP服务器模块(及asyncio)仅在fleet命令中、目录同步(及concurrent.futures)仅在push/pull命令中按需导入
+from phone_mcp_by_trae.adb_executor import ADBCommandError, ADBExecutor, command_failed
+from phone_mcp_by_trae.metrics import KIND_ADB, KIND_TOOL, MetricsRegistry
+from phone_mcp_by_trae.input_batch import (
+    compile_actions, continue_batch, new_marker, parse_batch_output, resolve_keycode
+)
+from phone_mcp_by_trae.package_index import PackageIndex
+from phone_mcp_by_trae.screenshot import capture_png
+from phone_mcp_by_trae.text_input import (
+    ADB_KEYBOARD_IME, IME_LIST_COMMAND, METHOD_IME, METHOD_INPUT, TextEntryPlan, needs_ime, parse_installed_imes
+)
+from phone_mcp_by_trae.wait_conditions import (
+    CONDITIONS, DEFAULT_INTERVAL, DEFAULT_TIMEOUT, compile_wait, parse_wait_output
+)
 
 adb = ADBExecutor()
 
@@ -59,19 +73,64 @@ def parse_args() -> argparse.Namespace:
     # 文本输入
     text_parser = subparsers.add_parser("text", help="输入文本")
     text_parser.add_argument("text", help="要输入的文本")
+    text_parser.add_argument("--method", choices=["auto", METHOD_INPUT, METHOD_IME], default="auto",
+                             help="input使用input text(仅ASCII)，ime使用ADBKeyboard输入法，auto自动选择")
     
     # 按键
     key_parser = subparsers.add_parser("key", help="按下按键")
     key_parser.add_argument("keycode", help="按键代码或名称")
     
+    # 批量输入
+    batch_parser = subparsers.add_parser("batch", help="在一次调用中批量执行输入操作")
+    batch_parser.add_argument("actions", nargs="?", help="JSON格式的操作列表")
+    batch_parser.add_argument("--file", help="从JSON文件读取操作列表")
+    batch_parser.add_argument("--stop-on-error", action="store_true", help="某个操作失败后跳过剩余操作")
+    
     # 截图
     screenshot_parser = subparsers.add_parser("screenshot", help="截取屏幕截图")
     screenshot_parser.add_argument("--path", default="screenshot.png", help="保存路径")
     
+    # 多设备并行执行
+    fleet_parser = subparsers.add_parser("fleet", help="在多个设备上并行执行同一个工具")
+    fleet_parser.add_argument("tool", help="工具名称，例如 open_url、press_key、take_screenshot")
+    fleet_target = fleet_parser.add_mutually_exclusive_group(required=True)
+    fleet_target.add_argument("--devices", help="逗号分隔的设备ID列表")
+    fleet_target.add_argument("--all", action="store_true", help="使用所有在线设备")
+    fleet_parser.add_argument("--args", default="{}", help="JSON格式的工具参数，字符串中的{device}会替换为设备ID")
+    fleet_parser.add_argument("--workers", type=int, help="最多同时执行的设备数，默认为环境变量PHONE_MCP_FLEET_WORKERS或8")
+    
+    # 耗时统计
+    stats_parser = subparsers.add_parser("stats", help="显示MCP服务器写入的耗时统计")
+    stats_parser.add_argument("--file", default=os.environ.get("PHONE_MCP_METRICS_FILE"),
+                              help="统计快照文件，默认为环境变量PHONE_MCP_METRICS_FILE")
+    stats_parser.add_argument("--kind", choices=[KIND_TOOL, KIND_ADB], help="只显示工具或ADB命令的统计")
+    stats_parser.add_argument("--prometheus", metavar="PATH", help="同时以Prometheus文本格式写入该文件")
+    
     # 打开URL
     url_parser = subparsers.add_parser("url", help="打开URL")
     url_parser.add_argument("url", help="要打开的URL")
     
+    # 在设备上等待条件成立
+    wait_parser = subparsers.add_parser("wait", help="在设备上等待条件成立(前台应用、焦点窗口、通话状态、界面文本)")
+    wait_parser.add_argument("condition", choices=CONDITIONS, help="等待条件")
+    wait_parser.add_argument("value", nargs="?", default="", help="条件的参数，例如包名或文本")
+    wait_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="超时时间(秒)")
+    wait_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="查询间隔(秒)")
+    wait_parser.add_argument("--absent", action="store_true", help="等待条件不再成立")
+    
+    # 目录同步
+    push_parser = subparsers.add_parser("push", help="把本地文件或目录树推送到设备，跳过未变化的文件")
+    push_parser.add_argument("local_path", help="本地文件或目录")
+    push_parser.add_argument("remote_path", help="设备端目标目录")
+    pull_parser = subparsers.add_parser("pull", help="把设备上的文件或目录树拉取到本地，跳过未变化的文件")
+    pull_parser.add_argument("remote_path", help="设备端文件或目录")
+    pull_parser.add_argument("local_path", help="本地目标目录")
+    for sync_parser in (push_parser, pull_parser):
+        sync_parser.add_argument("--compare", choices=("mtime", "checksum"), default="mtime",
+                                 help="判断文件是否一致的方式：大小和修改时间，或md5")
+        sync_parser.add_argument("--workers", type=int, help="同时传输的文件数，默认4")
+        sync_parser.add_argument("--dry-run", action="store_true", help="只列出需要传输的文件")
+    
     return parser.parse_args()
 
 def handle_check_command() -> None:
@@ -102,14 +161,14 @@ def handle_call_command(phone_number: str) -> None:
         "-d", f"tel:{phone_number}"
     ])
     print(f"拨打电话: {phone_number}")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
 def handle_hangup_command() -> None:
     """处理挂断电话命令"""
     result = adb.execute_command(["shell", "input", "keyevent", "6"])
     print("结束通话")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
 def handle_send_sms_command(phone_number: str, message: str) -> None:
@@ -121,31 +180,35 @@ def handle_send_sms_command(phone_number: str, message: str) -> None:
     ])
     print(f"准备发送短信到: {phone_number}")
     print("已打开短信应用并填充内容，请手动点击发送按钮")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
 def handle_app_command(app_name: str) -> None:
     """处理打开应用命令"""
-    result = adb.execute_command([
-        "shell", "monkey", "-p", app_name, "-c", "android.intent.category.LAUNCHER", "1"
-    ])
-    print(f"打开应用: {app_name}")
-    if "Error" in result:
+    index = PackageIndex(adb)
+    matches = index.resolve(app_name)
+    package = matches[0] if matches else app_name
+    
+    result = adb.execute_command(index.launch_command(package))
+    print(f"打开应用: {app_name}" + (f" ({package})" if package != app_name else ""))
+    if command_failed(result) or "No activities found" in result:
         print(f"错误: {result}")
+        if matches[1:]:
+            print(f"候选应用: {', '.join(matches[1:])}")
         print("提示: 请尝试使用完整的包名")
 
 def handle_close_app_command(package_name: str) -> None:
     """处理关闭应用命令"""
     result = adb.execute_command(["shell", "am", "force-stop", package_name])
     print(f"关闭应用: {package_name}")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
 def handle_tap_command(x: int, y: int) -> None:
     """处理点击屏幕命令"""
     result = adb.execute_command(["shell", "input", "tap", str(x), str(y)])
     print(f"点击坐标: ({x}, {y})")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
 def handle_swipe_command(x1: int, y1: int, x2: int, y2: int, duration: int) -> None:
@@ -155,61 +218,150 @@ def handle_swipe_command(x1: int, y1: int, x2: int, y2: int, duration: int) -> N
         str(x1), str(y1), str(x2), str(y2), str(duration)
     ])
     print(f"滑动: ({x1}, {y1}) -> ({x2}, {y2}), 持续: {duration}ms")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
-def handle_text_command(text: str) -> None:
+def handle_text_command(text: str, method: str) -> None:
     """处理输入文本命令"""
-    # 对特殊字符进行转义
-    escaped_text = text.replace(" ", "%s").replace("\"", "\\\"")
+    if method == "auto":
+        method = METHOD_INPUT
+        if needs_ime(text):
+            output = adb.execute_command(["shell", IME_LIST_COMMAND])
+            if ADB_KEYBOARD_IME in parse_installed_imes(output):
+                method = METHOD_IME
+    
+    try:
+        plan = TextEntryPlan(text, method)
+    except ValueError as e:
+        print(f"错误: {e}，输入法: {ADB_KEYBOARD_IME}")
+        sys.exit(1)
+    
+    retried = False
+    while not plan.done:
+        if not plan.update(adb.execute_command(["shell", plan.next_script()])):
+            if retried:
+                break
+            retried = True
+    if not plan.done and plan.restore_command():
+        adb.execute_command(["shell", plan.restore_command()])
     
-    result = adb.execute_command(["shell", "input", "text", escaped_text])
     print(f"输入文本: {text}")
-    if "Error" in result:
-        print(f"错误: {result}")
+    if not plan.done:
+        print(f"错误: 已完成 {plan.completed}/{len(plan.steps)} 块: {plan.details}")
 
 def handle_key_command(keycode: str) -> None:
     """处理按键命令"""
-    # 常见按键代码映射
-    keycode_map = {
-        "home": "3",
-        "back": "4",
-        "menu": "82",
-        "power": "26",
-        "volume_up": "24",
-        "volume_down": "25",
-        "enter": "66",
-        "delete": "67",
-        "recent": "187"
-    }
-    
     # 如果是映射中的按键名，转换为代码
-    actual_keycode = keycode_map.get(keycode.lower(), keycode)
+    actual_keycode = resolve_keycode(keycode)
     
     result = adb.execute_command(["shell", "input", "keyevent", actual_keycode])
     print(f"按下按键: {keycode} (代码: {actual_keycode})")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
+def handle_batch_command(actions_json: Optional[str], file_path: Optional[str], stop_on_error: bool) -> None:
+    """处理批量输入命令"""
+    try:
+        if file_path:
+            with open(file_path, "r", encoding="utf-8") as f:
+                actions = json.load(f)
+        else:
+            actions = json.loads(actions_json or "[]")
+        scripts, marker = compile_actions(actions, stop_on_error)
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        print(f"错误: 操作列表无效: {e}")
+        sys.exit(1)
+    
+    outputs = []  # type: List[str]
+    for script in scripts:
+        output = adb.execute_command(["shell", script])
+        outputs.append(output)
+        if not continue_batch(output, marker, stop_on_error):
+            break
+    result = "\n".join(outputs)
+    results = parse_batch_output(result, marker, actions)
+    if actions and all(item.get("skipped") for item in results):
+        print(f"错误: {result}")
+        return
+    
+    for item in results:
+        if item.get("skipped"):
+            status = "跳过"
+        elif item["success"]:
+            status = "成功"
+        else:
+            status = f"失败 (退出码: {item['exit_code']})"
+        print(f"  [{item['index']}] {item['action']}: {status}")
+        if item["details"] and not item["success"]:
+            print(f"      {item['details']}")
+
 def handle_screenshot_command(path: str) -> None:
     """处理截图命令"""
-    # 在设备上截图
-    device_path = "/sdcard/screenshot.png"
-    capture_result = adb.execute_command(["shell", "screencap", "-p", device_path])
-    
-    if "Error" in capture_result:
-        print(f"截图失败: {capture_result}")
+    try:
+        png_data = capture_png(adb)
+    except (ADBCommandError, ValueError) as e:
+        print(f"截图失败: {e}")
         return
     
-    # 将截图拉取到本地
-    pull_result = adb.execute_command(["pull", device_path, path])
+    with open(path, "wb") as f:
+        f.write(png_data)
+    print(f"截图已保存到: {path}")
+
+def handle_fleet_command(tool_name: str, devices: Optional[str], use_all: bool,
+                         arguments_json: str, workers: Optional[int]) -> None:
+    """处理多设备并行执行命令"""
+    import asyncio
+    from phone_mcp_by_trae import phone_mcp
+    from phone_mcp_by_trae.fleet import DEFAULT_MAX_WORKERS
     
-    # 删除设备上的临时文件
-    adb.execute_command(["shell", "rm", device_path])
+    try:
+        arguments = json.loads(arguments_json)
+    except ValueError as e:
+        print(f"错误: 工具参数不是有效的JSON: {e}")
+        sys.exit(1)
     
-    print(f"截图已保存到: {path}")
-    if "Error" in pull_result:
-        print(f"错误: {pull_result}")
+    device_ids = [] if use_all else [item.strip() for item in devices.split(",") if item.strip()]
+    result = asyncio.run(phone_mcp.run_on_devices(tool_name, device_ids, arguments,
+                                                  workers or DEFAULT_MAX_WORKERS))
+    print(result["message"])
+    if "results" not in result:
+        sys.exit(1)
+    
+    for entry in result["results"]:
+        status = "成功" if entry["success"] else "失败"
+        print(f"  {entry['device']}: {status} ({entry['elapsed_ms']}ms)")
+        if "error" in entry:
+            print(f"      {entry['error']}")
+        elif not entry["success"]:
+            print(f"      {entry['result'].get('details', entry['result'].get('message', ''))}")
+    if result["failed"]:
+        sys.exit(1)
+
+def handle_stats_command(file_path: Optional[str], kind: Optional[str], prometheus_path: Optional[str]) -> None:
+    """处理耗时统计命令"""
+    if not file_path:
+        print("错误: 请通过 --file 或环境变量PHONE_MCP_METRICS_FILE指定统计快照文件")
+        sys.exit(1)
+    try:
+        registry = MetricsRegistry.load_json(file_path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"错误: 无法读取统计快照: {e}")
+        sys.exit(1)
+    
+    for section, title in ((KIND_TOOL, "工具"), (KIND_ADB, "ADB命令")):
+        if kind and kind != section:
+            continue
+        rows = registry.summary(section)
+        print(f"{title} ({len(rows)}):")
+        if rows:
+            print(f"  {'名称':<28} {'设备':<16} {'调用':>6} {'失败':>6} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9}")
+        for row in rows:
+            print(f"  {row['name']:<30} {row['device']:<18} {row['calls']:>8} {row['errors']:>8} "
+                  f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    
+    if prometheus_path:
+        registry.write_prometheus(prometheus_path)
+        print(f"Prometheus指标已写入: {prometheus_path}")
 
 def handle_url_command(url: str) -> None:
     """处理打开URL命令"""
@@ -217,9 +369,55 @@ def handle_url_command(url: str) -> None:
         "shell", "am", "start", "-a", "android.intent.action.VIEW", "-d", url
     ])
     print(f"打开URL: {url}")
-    if "Error" in result:
+    if command_failed(result):
         print(f"错误: {result}")
 
+def handle_wait_command(condition: str, value: str, timeout: float, interval: float, absent: bool) -> None:
+    """处理等待命令，超时或失败时以1退出"""
+    marker = new_marker()
+    try:
+        script = compile_wait(condition, value, marker, timeout, interval, absent)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    
+    result = adb.execute_command(["shell", script])
+    parsed = parse_wait_output(result, marker)
+    if not parsed['finished']:
+        print(f"错误: {result}")
+        sys.exit(1)
+    print(f"{'条件已满足' if parsed['satisfied'] else '等待超时'}: {condition} {value}".rstrip()
+          + f" (查询 {parsed['polls']} 次)")
+    if parsed['value']:
+        print(parsed['value'])
+    if not parsed['satisfied']:
+        sys.exit(1)
+
+def handle_sync_command(direction: str, local_path: str, remote_path: str, compare: str,
+                        workers: Optional[int], dry_run: bool) -> None:
+    """处理push/pull命令，有文件传输失败时以1退出"""
+    from phone_mcp_by_trae.file_sync import DEFAULT_WORKERS, pull_tree, push_tree
+    
+    workers = workers or DEFAULT_WORKERS
+    try:
+        if direction == "push":
+            result = push_tree(adb, local_path, remote_path, compare, workers, dry_run)
+        else:
+            result = pull_tree(adb, remote_path, local_path, compare, workers, dry_run)
+    except (FileNotFoundError, RuntimeError, OSError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    
+    for path in result["transferred"]:
+        print(f"  {path}")
+    action = "需要传输" if dry_run else "已传输"
+    print(f"{action} {len(result['transferred'])} 个文件 ({result['bytes']} 字节)，跳过 {result['skipped']} 个，"
+          f"耗时 {result['elapsed_ms'] / 1000:.1f} 秒")
+    for item in result["failed"]:
+        print(f"  失败 {item['path']}: {item['error']}")
+    if result["failed"]:
+        sys.exit(1)
+
 def main() -> None:
     """命令行工具主入口"""
     args = parse_args()
@@ -248,13 +446,23 @@ def main() -> None:
     elif args.command == "swipe":
         handle_swipe_command(args.x1, args.y1, args.x2, args.y2, args.duration)
     elif args.command == "text":
-        handle_text_command(args.text)
+        handle_text_command(args.text, args.method)
     elif args.command == "key":
         handle_key_command(args.keycode)
+    elif args.command == "batch":
+        handle_batch_command(args.actions, args.file, args.stop_on_error)
     elif args.command == "screenshot":
         handle_screenshot_command(args.path)
+    elif args.command == "fleet":
+        handle_fleet_command(args.tool, args.devices, args.all, args.args, args.workers)
+    elif args.command == "stats":
+        handle_stats_command(args.file, args.kind, args.prometheus)
     elif args.command == "url":
         handle_url_command(args.url)
+    elif args.command == "wait":
+        handle_wait_command(args.condition, args.value, args.timeout, args.interval, args.absent)
+    elif args.command in ("push", "pull"):
+        handle_sync_command(args.command, args.local_path, args.remote_path, args.compare, args.workers, args.dry_run)
     else:
         print(f"错误: 未知命令 '{args.command}'")
         sys.exit(1)
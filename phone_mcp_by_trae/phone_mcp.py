@@ -5,10 +5,60 @@
 Trae Phone MCP - 一个通过ADB命令控制Android手机的MCP插件
 """
 
+import asyncio
+import base64
+import concurrent.futures
+import functools
+import inspect
 import json
-import subprocess
+import os
 import sys
-from typing import Dict, List, Optional, Any, Union
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Any, Tuple, Union
+
+# 执行器已移到adb_executor模块，这里保留原有的导入路径
+from phone_mcp_by_trae.adb_executor import (
+    BACKEND_REPLAY, BACKEND_SESSION, BACKEND_SOCKET, BACKEND_SUBPROCESS, BACKENDS, ADBCommandError, ADBExecutor,
+    ProcessStream, adb_path, command_failed, is_input_command
+)
+from phone_mcp_by_trae.async_executor import AsyncADBExecutor, run_in_pool, run_in_thread
+from phone_mcp_by_trae.device_state import STATE_CACHE_TTL, parse_state, state_script
+from phone_mcp_by_trae.device_registry import ONLINE, DeviceRegistry
+from phone_mcp_by_trae.frame_diff import DEFAULT_BLOCK_SIZE, FrameCache, diff_frame
+from phone_mcp_by_trae.file_sync import COMPARE_MTIME, DEFAULT_WORKERS as SYNC_WORKERS, pull_tree, push_tree
+from phone_mcp_by_trae.fleet import (
+    DEFAULT_MAX_WORKERS, parse_online_devices, run_on_devices as run_on_devices_parallel
+)
+from phone_mcp_by_trae.framebuffer import (
+    HAS_NUMPY, OUTPUT_FORMATS, RAW_CAPTURE_COMMAND, crop, decode_frame, encode_png, process_frame, require_numpy
+)
+from phone_mcp_by_trae.image_encoding import (
+    DEFAULT_QUALITY, MIME_TYPES, EncodedImage, encode_image, fit_budget, fits, normalize_format, output_path
+)
+from phone_mcp_by_trae.macros import MacroRecorder, MacroStore, device_script_path, parse_run_output, run_command
+from phone_mcp_by_trae.metrics import KIND_ADB, KIND_TOOL, MetricsFileWriter, MetricsRegistry, result_size
+from phone_mcp_by_trae.input_batch import (
+    compile_actions, continue_batch, new_marker, parse_batch_output, resolve_keycode
+)
+from phone_mcp_by_trae.package_index import PackageIndex
+from phone_mcp_by_trae.text_input import (
+    ADB_KEYBOARD_IME, IME_LIST_COMMAND, METHOD_IME, METHOD_INPUT, TextEntryPlan, needs_ime, parse_installed_imes
+)
+from phone_mcp_by_trae.touch_events import (
+    DISCOVERY_COMMAND, ENGINE_INPUT, ENGINE_SENDEVENT, ENGINES, Track, TouchDevice, compile_gesture, discover,
+    parse_rotation_mismatch, parse_tracks, pinch_tracks, swipe_tracks, tap_tracks
+)
+from phone_mcp_by_trae.wait_conditions import (
+    CONDITIONS, DEFAULT_INTERVAL, DEFAULT_TIMEOUT, compile_wait, parse_wait_output
+)
+from phone_mcp_by_trae.ui_hierarchy import DUMP_COMMAND, UICache, UIIndex, parse_hierarchy
+from phone_mcp_by_trae.screen_settle import (
+    DEFAULT_SETTLE_TIMEOUT, MIN_SETTLE_DELAY, SETTLE_FRAME_WIDTH, STREAM_POLL_INTERVAL, STREAM_QUIET_PERIOD,
+    SettleDetector
+)
+from phone_mcp_by_trae.screen_stream import ScreenStream, parse_screen_size, stream_size
+from phone_mcp_by_trae.screenshot import PNG_CAPTURE_COMMAND, check_png, png_size
 
 # 尝试导入MCP库，如果不存在则提供基本实现
 try:
@@ -20,9 +70,19 @@ except ImportError:
     
     # 基本MCP服务器实现
     class FastMCP:
-        def __init__(self, name):
+        # JSON-RPC错误码
+        PARSE_ERROR = -32700
+        METHOD_NOT_FOUND = -32601
+        SERVER_ERROR = -32000
+        REQUEST_CANCELLED = -32800
+        
+        def __init__(self, name, max_workers: Optional[int] = None):
             self.name = name
             self.tools = {}
+            self.max_workers = max_workers or int(os.environ.get('PHONE_MCP_SERVER_WORKERS', '8'))
+            self._pending = {}  # 请求id -> 执行中的Future
+            self._pending_lock = threading.Lock()
+            self._write_lock = threading.Lock()
             
         def tool(self):
             def decorator(func):
@@ -30,24 +90,97 @@ except ImportError:
                 return func
             return decorator
             
+        def _write(self, response: Dict[str, Any]) -> None:
+            """输出一条响应，所有线程共用同一个加锁的stdout写入点"""
+            line = json.dumps(response)
+            with self._write_lock:
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+                
+        def _error(self, request_id: Any, code: int, message: str) -> None:
+            self._write({
+                'jsonrpc': '2.0',
+                'id': request_id,
+                'error': {
+                    'code': code,
+                    'message': message
+                }
+            })
+            
+        def _finish(self, request_id: Any, future: concurrent.futures.Future) -> None:
+            """工具执行结束后输出响应，响应顺序与请求顺序无关，由id对应"""
+            with self._pending_lock:
+                if self._pending.get(request_id) is future:
+                    del self._pending[request_id]
+            if future.cancelled():
+                self._error(request_id, self.REQUEST_CANCELLED, "请求已取消")
+                return
+            error = future.exception()
+            if error is not None:
+                self._error(request_id, self.SERVER_ERROR, str(error))
+                return
+            try:
+                self._write({
+                    'jsonrpc': '2.0',
+                    'id': request_id,
+                    'result': future.result()
+                })
+            except (TypeError, ValueError) as e:
+                # 结果无法序列化为JSON
+                self._error(request_id, self.SERVER_ERROR, str(e))
+                
+        def _cancel(self, params: Dict[str, Any]) -> None:
+            """处理 $/cancelRequest 通知，取消仍在执行的请求"""
+            with self._pending_lock:
+                future = self._pending.get(params.get('id'))
+            if future is not None:
+                future.cancel()
+                
+        def _submit(self, request_id: Any, func: Callable[..., Any], params: Dict[str, Any],
+                    loop: asyncio.AbstractEventLoop, pool: concurrent.futures.ThreadPoolExecutor) -> None:
+            """提交工具调用：协程工具在事件循环线程中执行，同步工具在线程池中执行"""
+            if asyncio.iscoroutinefunction(func):
+                future = asyncio.run_coroutine_threadsafe(func(**params), loop)
+            else:
+                future = pool.submit(func, **params)
+            with self._pending_lock:
+                self._pending[request_id] = future
+            future.add_done_callback(functools.partial(self._finish, request_id))
+            
+        @staticmethod
+        async def _drain() -> None:
+            """等待事件循环中其余任务结束"""
+            current = asyncio.current_task()
+            tasks = [task for task in asyncio.all_tasks() if task is not current]
+            await asyncio.gather(*tasks, return_exceptions=True)
+            
         def run(self, transport='stdio'):
             if transport != 'stdio':
                 print(f"警告: 仅支持stdio传输，忽略{transport}")
-                
-            # 简单的JSON-RPC处理循环
-            while True:
-                try:
-                    line = sys.stdin.readline().strip()
+            
+            # 协程工具在后台线程的事件循环中并发执行，同步工具使用线程池；
+            # 主线程只负责读取请求，响应在完成时按id输出，不必按请求顺序
+            loop = asyncio.new_event_loop()
+            loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+            loop_thread.start()
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            
+            try:
+                for line in sys.stdin:
+                    line = line.strip()
                     if not line:
-                        break
-                        
-                    request = json.loads(line)
-                    method = request.get('method')
-                    params = request.get('params', {})
-                    request_id = request.get('id')
+                        continue
+                    try:
+                        request = json.loads(line)
+                        method = request.get('method')
+                        params = request.get('params') or {}
+                        request_id = request.get('id')
+                    except (ValueError, AttributeError) as e:
+                        self._error(None, self.PARSE_ERROR, f'解析错误: {str(e)}')
+                        continue
                     
                     if method == 'initialize':
-                        response = {
+                        self._write({
                             'jsonrpc': '2.0',
                             'id': request_id,
                             'result': {
@@ -61,94 +194,233 @@ except ImportError:
                                     ]
                                 }
                             }
-                        }
-                        print(json.dumps(response))
-                        sys.stdout.flush()
+                        })
+                    elif method == '$/cancelRequest':
+                        self._cancel(params)
                     elif method in self.tools:
                         try:
-                            result = self.tools[method](**params)
-                            response = {
-                                'jsonrpc': '2.0',
-                                'id': request_id,
-                                'result': result
-                            }
+                            self._submit(request_id, self.tools[method], params, loop, pool)
                         except Exception as e:
-                            response = {
-                                'jsonrpc': '2.0',
-                                'id': request_id,
-                                'error': {
-                                    'code': -32000,
-                                    'message': str(e)
-                                }
-                            }
-                        print(json.dumps(response))
-                        sys.stdout.flush()
+                            # 例如参数不匹配时创建协程失败
+                            self._error(request_id, self.SERVER_ERROR, str(e))
                     else:
-                        response = {
-                            'jsonrpc': '2.0',
-                            'id': request_id,
-                            'error': {
-                                'code': -32601,
-                                'message': f'方法 {method} 不存在'
-                            }
-                        }
-                        print(json.dumps(response))
-                        sys.stdout.flush()
-                except Exception as e:
-                    response = {
-                        'jsonrpc': '2.0',
-                        'id': None,
-                        'error': {
-                            'code': -32700,
-                            'message': f'解析错误: {str(e)}'
-                        }
-                    }
-                    print(json.dumps(response))
-                    sys.stdout.flush()
-
-# ADB执行器类
-class ADBExecutor:
-    """ADB命令执行器"""
-    
-    def __init__(self):
-        """初始化ADB执行器"""
-        self.device_id = None
-        
-    def execute_command(self, command: List[str]) -> str:
-        """执行ADB命令并返回输出"""
-        try:
-            if self.device_id:
-                # 如果设置了设备ID，添加-s参数
-                full_command = ['adb', '-s', self.device_id] + command
-            else:
-                full_command = ['adb'] + command
-                
-            result = subprocess.run(
-                full_command,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            error_message = f"ADB命令执行失败: {e.stderr.strip()}"
-            print(error_message, file=sys.stderr)
-            return error_message
-        except Exception as e:
-            error_message = f"执行ADB命令时出错: {str(e)}"
-            print(error_message, file=sys.stderr)
-            return error_message
+                        self._error(request_id, self.METHOD_NOT_FOUND, f'方法 {method} 不存在')
+            finally:
+                # 输入结束后等待仍在执行的请求完成并输出响应
+                with self._pending_lock:
+                    pending = list(self._pending.values())
+                concurrent.futures.wait(pending)
+                pool.shutdown()
+                # 已取消的任务可能还在结束adb进程，等它们完成后再停止事件循环
+                asyncio.run_coroutine_threadsafe(self._drain(), loop).result()
+                loop.call_soon_threadsafe(loop.stop)
+                loop_thread.join()
+                loop.close()
 
 # 创建ADB执行器实例
 adb_executor = ADBExecutor()
+async_executor = AsyncADBExecutor(adb_executor)
+
+# 工具调用和ADB命令的耗时统计
+metrics = MetricsRegistry()
+adb_executor.metrics = metrics
+
+# 每个设备最近一帧截图的缓存，供screenshot_diff使用
+frame_cache = FrameCache()
+
+# 每个设备的界面层级索引缓存，设备上执行输入操作后失效
+ui_cache = UICache()
+adb_executor.add_input_listener(ui_cache.invalidate)
+
+# 每个设备的前台状态缓存，同样在输入操作后失效，最长保留STATE_CACHE_TTL秒
+state_cache = UICache(ttl=STATE_CACHE_TTL)
+adb_executor.add_input_listener(state_cache.invalidate)
+
+# 宏的录制状态和主机上的宏目录
+macro_recorder = MacroRecorder()
+macro_store = MacroStore()
+
+# 由adb track-devices驱动的设备注册表，服务器启动或第一次检查连接时开始跟踪
+device_registry = DeviceRegistry(adb_executor, enabled=adb_executor.backend != BACKEND_REPLAY)
+adb_executor.device_guard = device_registry.check
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]) -> None:
+    """设备断开或离线后丢弃其界面、前台状态和截图缓存"""
+    if old_state == ONLINE and new_state != ONLINE:
+        ui_cache.invalidate(serial)
+        state_cache.invalidate(serial)
+        frame_cache.invalidate(serial)
+
+device_registry.add_listener(_on_device_change)
+
+async def _get_ui_index(refresh: bool = False) -> UIIndex:
+    """获取当前设备的界面索引，优先使用缓存"""
+    device_key = adb_executor.device_id
+    if not refresh:
+        index = ui_cache.get(device_key)
+        if index is not None:
+            return index
+    generation = ui_cache.generation(device_key)
+    output = await async_executor.execute_binary(DUMP_COMMAND)
+    index = await run_in_thread(parse_hierarchy, output.decode('utf-8', 'replace'))
+    ui_cache.put(device_key, index, generation)
+    return index
+
+# 每个设备的已安装应用索引
+package_indexes = {}  # type: Dict[Optional[str], PackageIndex]
+package_indexes_lock = threading.Lock()
+
+def _package_index() -> PackageIndex:
+    """获取当前设备的应用索引，不存在时创建"""
+    device_key = adb_executor.device_id
+    with package_indexes_lock:
+        index = package_indexes.get(device_key)
+        if index is None:
+            index = PackageIndex(adb_executor)
+            package_indexes[device_key] = index
+        return index
+
+# 正在运行的屏幕流，设备ID -> ScreenStream
+screen_streams = {}  # type: Dict[Optional[str], ScreenStream]
+screen_streams_lock = threading.Lock()
+
+def _active_stream() -> Optional[ScreenStream]:
+    """返回当前设备正在运行且已有画面的屏幕流"""
+    stream = screen_streams.get(adb_executor.device_id)
+    if stream is not None and stream.is_running() and stream.buffer.sequence > 0:
+        return stream
+    return None
+
+# 截图编码专用的线程池，编码较慢时不占用执行adb命令的默认线程池
+encode_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PHONE_MCP_ENCODE_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    thread_name_prefix='phone-mcp-encode'
+)
+# take_screenshot内联base64的默认长度上限，0表示不限制
+DEFAULT_BASE64_BUDGET = int(os.environ.get('PHONE_MCP_BASE64_BUDGET', '0'))
+
+async def _capture_frame():
+    """获取当前设备的最新画面，屏幕流运行时直接读取缓冲区"""
+    stream = _active_stream()
+    if stream is not None:
+        return stream.latest_frame()
+    require_numpy()
+    return decode_frame(await async_executor.execute_binary(RAW_CAPTURE_COMMAND))
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, 'wb') as f:
+        f.write(data)
+
+async def _wait_until_stable(timeout: float) -> Dict[str, Any]:
+    """等到画面稳定或超时，返回稳定信息和最终画面
+    
+    操作后先等待MIN_SETTLE_DELAY秒再开始判断，避免在界面开始变化之前把操作前的画面当作稳定。
+    没有屏幕流时连续截图，连续几帧的感知哈希相同即为稳定；屏幕流只在画面变化时产生新帧，
+    因此只比较序号更新的帧，超过STREAM_QUIET_PERIOD秒没有新帧同样视为稳定。
+    """
+    detector = SettleDetector()
+    started = time.perf_counter()
+    stable = False
+    try:
+        await asyncio.sleep(min(MIN_SETTLE_DELAY, timeout))
+        last_sequence = None  # type: Optional[int]
+        last_change = time.perf_counter()
+        while True:
+            stream = _active_stream()
+            if stream is None:
+                stable = await run_in_thread(detector.update, await _capture_frame())
+            else:
+                sequence, _, frame = stream.buffer.latest()
+                if sequence != last_sequence:
+                    last_sequence, last_change = sequence, time.perf_counter()
+                    stable = await run_in_thread(detector.update, frame)
+                else:
+                    stable = time.perf_counter() - last_change >= STREAM_QUIET_PERIOD
+            if stable or time.perf_counter() - started >= timeout:
+                break
+            if stream is not None:
+                # 屏幕流的最新帧不会在两次读取之间自动变化，间隔一段时间再读
+                await asyncio.sleep(STREAM_POLL_INTERVAL)
+        settle = {
+            'stable': stable,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'frames': detector.frames,
+            'distance': detector.last_distance
+        }
+        frame = process_frame(detector.last_frame, None, SETTLE_FRAME_WIDTH)
+        image = await run_in_pool(encode_pool, encode_png, frame)
+    except (ADBCommandError, RuntimeError, ValueError) as e:
+        return {'settle': {'stable': False, 'error': str(e)}}
+    return {
+        'settle': settle,
+        'mime_type': 'image/png',
+        'image_base64': base64.b64encode(image).decode('ascii')
+    }
+
+async def _settle_after(response: Dict[str, Any], wait_until_stable: bool, settle_timeout: float) -> Dict[str, Any]:
+    """操作成功且要求等待时，等画面稳定后把稳定信息和最终画面加入结果"""
+    if wait_until_stable and response.get('success'):
+        response.update(await _wait_until_stable(settle_timeout))
+    return response
 
 # 创建MCP应用实例
 app = FastMCP("trae_phone_mcp")
 
-@app.tool()
-def check_connection() -> Dict[str, Any]:
-    """检查ADB连接状态并返回已连接的设备"""
-    devices_output = adb_executor.execute_command(['devices'])
+# 已注册的工具，名称 -> 函数
+TOOLS = {}  # type: Dict[str, Callable[..., Any]]
+
+def tool():
+    """注册MCP工具，同时记录到TOOLS中供多设备并行执行等功能按名称调用
+    
+    工具都是协程函数，FastMCP可以同时处理多个调用。直接执行adb命令的工具使用async_executor，
+    调用同步组件(应用索引、图像处理等)的部分通过run_in_thread在线程池中执行，不阻塞事件循环。
+    每次调用的耗时、结果大小以及是否失败(抛出异常或返回success为False)按工具和设备记录到metrics；
+    录制命令时工具名和参数也写入录制日志，供回放时重新发起同样的调用；录制宏时成功的输入类调用加入宏。
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            device_id = adb_executor.device_id
+            arguments = None
+            if adb_executor.recorder is not None or macro_recorder.active:
+                arguments = dict(signature.bind_partial(*args, **kwargs).arguments)
+            if adb_executor.recorder is not None:
+                adb_executor.recorder.record_tool(device_id, func.__name__, arguments)
+            started = time.perf_counter()
+            result = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            finally:
+                finished = time.perf_counter()
+                failed = not isinstance(result, dict) or result.get('success') is False
+                metrics.record(KIND_TOOL, func.__name__, device_id,
+                               (finished - started) * 1000, failed, result_size(result))
+                if arguments is not None and macro_recorder.active:
+                    macro_recorder.add(device_id, func.__name__, arguments, result, started, finished)
+        
+        TOOLS[func.__name__] = wrapper
+        return app.tool()(wrapper)
+    return decorator
+
+@tool()
+async def check_connection() -> Dict[str, Any]:
+    """检查ADB连接状态并返回已连接的设备
+    
+    设备注册表处于实时状态时直接返回内存中的设备列表，包含型号、SDK版本和屏幕尺寸；
+    否则执行 `adb devices`。
+    """
+    if device_registry.is_live or await run_in_thread(device_registry.ensure_started):
+        devices = device_registry.devices()
+        return {
+            'devices': devices,
+            'count': len(devices),
+            'message': f"找到 {len(devices)} 个设备"
+        }
+    
+    devices_output = await async_executor.execute_command(['devices'])
     lines = devices_output.split('\n')
     
     # 跳过第一行（标题行）
@@ -169,8 +441,8 @@ def check_connection() -> Dict[str, Any]:
         'message': f"找到 {len(devices)} 个设备"
     }
 
-@app.tool()
-def set_device(device_id: str) -> Dict[str, Any]:
+@tool()
+async def set_device(device_id: str) -> Dict[str, Any]:
     """设置要使用的Android设备
     
     Args:
@@ -185,8 +457,8 @@ def set_device(device_id: str) -> Dict[str, Any]:
         'message': f"已设置设备: {device_id}"
     }
 
-@app.tool()
-def call(phone_number: str) -> Dict[str, Any]:
+@tool()
+async def call(phone_number: str) -> Dict[str, Any]:
     """拨打电话
     
     Args:
@@ -195,35 +467,35 @@ def call(phone_number: str) -> Dict[str, Any]:
     Returns:
         操作结果消息
     """
-    result = adb_executor.execute_command([
+    result = await async_executor.execute_command([
         'shell', 'am', 'start', '-a', 'android.intent.action.CALL',
         '-d', f"tel:{phone_number}"
     ])
     
     return {
-        'success': 'Error' not in result,
+        'success': not command_failed(result),
         'message': f"拨打电话: {phone_number}",
         'details': result
     }
 
-@app.tool()
-def hangup() -> Dict[str, Any]:
+@tool()
+async def hangup() -> Dict[str, Any]:
     """结束当前通话
     
     Returns:
         操作结果消息
     """
     # 使用按键事件模拟挂断电话（KEYCODE_ENDCALL = 6）
-    result = adb_executor.execute_command(['shell', 'input', 'keyevent', '6'])
+    result = await async_executor.execute_command(['shell', 'input', 'keyevent', '6'])
     
     return {
-        'success': 'Error' not in result,
+        'success': not command_failed(result),
         'message': "结束通话",
         'details': result
     }
 
-@app.tool()
-def send_sms(phone_number: str, message: str) -> Dict[str, Any]:
+@tool()
+async def send_sms(phone_number: str, message: str) -> Dict[str, Any]:
     """发送短信
     
     Args:
@@ -234,7 +506,7 @@ def send_sms(phone_number: str, message: str) -> Dict[str, Any]:
         操作结果消息
     """
     # 使用am start命令打开短信应用并填充收件人和内容
-    result = adb_executor.execute_command([
+    result = await async_executor.execute_command([
         'shell', 'am', 'start', '-a', 'android.intent.action.SENDTO',
         '-d', f"smsto:{phone_number}", '--es', 'sms_body', message,
         '--ez', 'exit_on_sent', 'true'
@@ -244,44 +516,84 @@ def send_sms(phone_number: str, message: str) -> Dict[str, Any]:
     # 自动发送需要更高权限或特定应用支持
     
     return {
-        'success': 'Error' not in result,
+        'success': not command_failed(result),
         'message': f"准备发送短信到: {phone_number}",
         'details': result,
         'note': "已打开短信应用并填充内容，请手动点击发送按钮"
     }
 
-@app.tool()
-def open_app(app_name: str) -> Dict[str, Any]:
+@tool()
+async def open_app(app_name: str, wait_until_stable: bool = False,
+                   settle_timeout: float = DEFAULT_SETTLE_TIMEOUT) -> Dict[str, Any]:
     """打开应用
     
+    支持完整包名、常用应用名称(如"微信"、"settings")以及包名片段的模糊匹配。
+    已知启动组件的应用直接通过 `am start -n` 启动。
+    
     Args:
         app_name: 应用名称或包名
+        wait_until_stable: 启动后是否等到画面稳定(启动动画和首屏加载完成)再返回，并返回最终画面，需要NumPy
+        settle_timeout: 等待画面稳定的最长时间(秒)
         
     Returns:
         操作结果消息
     """
-    # 尝试作为包名启动
-    result = adb_executor.execute_command([
-        'shell', 'monkey', '-p', app_name, '-c', 'android.intent.category.LAUNCHER', '1'
-    ])
+    index = _package_index()
+    matches = await run_in_thread(index.resolve, app_name)
+    package = matches[0] if matches else app_name
     
-    # 如果失败，可能需要先获取包名列表并匹配
-    if 'Error' in result:
+    result = await async_executor.execute_command(index.launch_command(package))
+    if command_failed(result) and index.component(package):
+        # 启动组件可能已随应用更新而变化，重新查询后再试一次
+        await run_in_thread(index.refresh_component, package)
+        result = await async_executor.execute_command(index.launch_command(package))
+    
+    if command_failed(result) or 'No activities found' in result:
         return {
             'success': False,
             'message': f"无法打开应用: {app_name}",
             'details': result,
-            'suggestion': "请尝试使用完整的包名"
+            'candidates': matches[1:],
+            'suggestion': "请尝试使用完整的包名，或通过list_apps查找应用"
         }
     
-    return {
+    return await _settle_after({
         'success': True,
-        'message': f"已打开应用: {app_name}",
+        'message': f"已打开应用: {app_name}" + (f" ({package})" if package != app_name else ""),
+        'package': package,
+        'component': index.component(package),
         'details': result
+    }, wait_until_stable, settle_timeout)
+
+@tool()
+async def list_apps(query: str = "", limit: int = 50) -> Dict[str, Any]:
+    """列出或查找已安装的应用
+    
+    Args:
+        query: 应用名称、包名或其片段，为空时列出所有可启动的应用
+        limit: 最多返回的数量
+        
+    Returns:
+        应用列表，每项包含包名和启动组件
+    """
+    index = _package_index()
+    if query:
+        packages = await run_in_thread(index.resolve, query)
+    else:
+        await run_in_thread(index.ensure_fresh)
+        packages = sorted(index.components)
+    
+    return {
+        'success': bool(packages),
+        'message': f"找到 {len(packages)} 个应用",
+        'apps': [
+            {'package': package, 'component': index.component(package)}
+            for package in packages[:limit]
+        ]
     }
 
-@app.tool()
-def close_app(package_name: str) -> Dict[str, Any]:
+@tool()
+async def close_app(package_name: str) -> Dict[str, Any]:
     """关闭应用
     
     Args:
@@ -290,35 +602,94 @@ def close_app(package_name: str) -> Dict[str, Any]:
     Returns:
         操作结果消息
     """
-    result = adb_executor.execute_command(['shell', 'am', 'force-stop', package_name])
+    result = await async_executor.execute_command(['shell', 'am', 'force-stop', package_name])
     
     return {
-        'success': 'Error' not in result,
+        'success': not command_failed(result),
         'message': f"已关闭应用: {package_name}",
         'details': result
     }
 
-@app.tool()
-def tap(x: int, y: int) -> Dict[str, Any]:
+# 单指操作的注入方式
+touch_engine = os.environ.get('PHONE_MCP_TOUCH_ENGINE', ENGINE_INPUT)
+if touch_engine not in ENGINES:
+    touch_engine = ENGINE_INPUT
+
+# 每个设备的触摸屏信息，设备ID -> TouchDevice，不能使用sendevent的设备为None
+touch_devices = {}  # type: Dict[Optional[str], Optional[TouchDevice]]
+# 每个设备上次注入时的屏幕方向，脚本在设备上核对，不一致时按实际方向重新编译
+touch_rotations = {}  # type: Dict[Optional[str], int]
+
+async def _touch_device() -> Optional[TouchDevice]:
+    """当前设备的触摸屏，第一次使用时通过getevent查找并按设备缓存"""
+    device_key = adb_executor.device_id
+    if device_key not in touch_devices:
+        output = await async_executor.execute_command(['shell', DISCOVERY_COMMAND])
+        if command_failed(output):
+            return None
+        touch_devices[device_key] = discover(output)
+    return touch_devices[device_key]
+
+async def _inject_gesture(tracks: List[Track]) -> Optional[Dict[str, Any]]:
+    """通过sendevent在一次shell调用中执行手势
+    
+    坐标按上次记录的屏幕方向换算；方向已经改变时脚本不注入，按实际方向重新编译后再执行一次。
+    
+    Returns:
+        成功时返回触摸屏信息；设备不支持或没有写入权限时返回None，该设备之后不再尝试；
+        两次执行之间屏幕方向又发生变化时也返回None
+        
+    Raises:
+        ValueError: 手指数超过触摸屏支持的数量
+    """
+    device = await _touch_device()
+    if device is None:
+        return None
+    device_key = adb_executor.device_id
+    rotation = touch_rotations.get(device_key, 0)
+    for _ in range(2):
+        result = await async_executor.execute_command(['shell', compile_gesture(device, tracks, rotation=rotation)])
+        if command_failed(result):
+            touch_devices[device_key] = None
+            return None
+        actual = parse_rotation_mismatch(result)
+        if actual is None:
+            return dict(device.to_dict(), rotation=rotation)
+        rotation = touch_rotations[device_key] = actual
+    return None
+
+@tool()
+async def tap(x: int, y: int, wait_until_stable: bool = False,
+              settle_timeout: float = DEFAULT_SETTLE_TIMEOUT) -> Dict[str, Any]:
     """点击屏幕
     
     Args:
         x: X坐标
         y: Y坐标
+        wait_until_stable: 点击后是否等到画面稳定(连续几帧不再变化)再返回，并返回最终画面，需要NumPy
+        settle_timeout: 等待画面稳定的最长时间(秒)
         
     Returns:
         操作结果消息
     """
-    result = adb_executor.execute_command(['shell', 'input', 'tap', str(x), str(y)])
+    if touch_engine == ENGINE_SENDEVENT and await _inject_gesture(tap_tracks(x, y)) is not None:
+        return await _settle_after({
+            'success': True,
+            'message': f"点击坐标: ({x}, {y})",
+            'engine': ENGINE_SENDEVENT
+        }, wait_until_stable, settle_timeout)
     
-    return {
-        'success': 'Error' not in result,
+    result = await async_executor.execute_command(['shell', 'input', 'tap', str(x), str(y)])
+    
+    return await _settle_after({
+        'success': not command_failed(result),
         'message': f"点击坐标: ({x}, {y})",
         'details': result
-    }
+    }, wait_until_stable, settle_timeout)
 
-@app.tool()
-def swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> Dict[str, Any]:
+@tool()
+async def swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300, wait_until_stable: bool = False,
+                settle_timeout: float = DEFAULT_SETTLE_TIMEOUT) -> Dict[str, Any]:
     """滑动屏幕
     
     Args:
@@ -327,111 +698,1001 @@ def swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> Dict[str,
         x2: 结束X坐标
         y2: 结束Y坐标
         duration: 滑动持续时间(毫秒)
+        wait_until_stable: 滑动后是否等到画面稳定(例如惯性滚动结束)再返回，并返回最终画面，需要NumPy
+        settle_timeout: 等待画面稳定的最长时间(秒)
         
     Returns:
         操作结果消息
     """
-    result = adb_executor.execute_command([
+    message = f"滑动: ({x1}, {y1}) -> ({x2}, {y2}), 持续: {duration}ms"
+    if (touch_engine == ENGINE_SENDEVENT
+            and await _inject_gesture(swipe_tracks(x1, y1, x2, y2, duration)) is not None):
+        return await _settle_after({
+            'success': True,
+            'message': message,
+            'engine': ENGINE_SENDEVENT
+        }, wait_until_stable, settle_timeout)
+    
+    result = await async_executor.execute_command([
         'shell', 'input', 'swipe',
         str(x1), str(y1), str(x2), str(y2), str(duration)
     ])
     
+    return await _settle_after({
+        'success': not command_failed(result),
+        'message': message,
+        'details': result
+    }, wait_until_stable, settle_timeout)
+
+@tool()
+async def long_press(x: int, y: int, duration: int = 800) -> Dict[str, Any]:
+    """长按屏幕
+    
+    Args:
+        x: X坐标
+        y: Y坐标
+        duration: 按住的时间(毫秒)
+        
+    Returns:
+        操作结果消息
+    """
+    message = f"长按坐标: ({x}, {y}), 持续: {duration}ms"
+    if touch_engine == ENGINE_SENDEVENT and await _inject_gesture(tap_tracks(x, y, duration)) is not None:
+        return {
+            'success': True,
+            'message': message,
+            'engine': ENGINE_SENDEVENT
+        }
+    
+    # 起点和终点相同的滑动即为长按
+    result = await async_executor.execute_command([
+        'shell', 'input', 'swipe', str(x), str(y), str(x), str(y), str(duration)
+    ])
+    
     return {
-        'success': 'Error' not in result,
-        'message': f"滑动: ({x1}, {y1}) -> ({x2}, {y2}), 持续: {duration}ms",
+        'success': not command_failed(result),
+        'message': message,
         'details': result
     }
 
-@app.tool()
-def input_text(text: str) -> Dict[str, Any]:
-    """输入文本
+@tool()
+async def pinch(x: int, y: int, start_distance: int, end_distance: int, duration: int = 400,
+                angle: float = 0) -> Dict[str, Any]:
+    """双指缩放，需要设备支持sendevent
+    
+    Args:
+        x: 两指中点的X坐标
+        y: 两指中点的Y坐标
+        start_distance: 开始时两指的距离(像素)
+        end_distance: 结束时两指的距离，大于start_distance为放大，小于为缩小
+        duration: 持续时间(毫秒)
+        angle: 两指连线与水平方向的角度(度)
+        
+    Returns:
+        操作结果消息
+    """
+    return await _multi_finger(
+        pinch_tracks(x, y, start_distance, end_distance, duration, angle),
+        f"双指缩放: 中心 ({x}, {y}), 距离 {start_distance} -> {end_distance}, 持续: {duration}ms"
+    )
+
+@tool()
+async def multi_touch(fingers: List[List[Dict[str, float]]]) -> Dict[str, Any]:
+    """执行任意单指或多指手势，需要设备支持sendevent
     
     Args:
-        text: 要输入的文本
+        fingers: 每个手指的轨迹，轨迹是按时间排列的关键点 {"x": .., "y": .., "t": 毫秒}，
+            手指在第一个关键点按下、最后一个关键点抬起，关键点之间匀速移动。例如双指同时向下滑动：
+            [[{"x": 400, "y": 800, "t": 0}, {"x": 400, "y": 1400, "t": 300}],
+             [{"x": 700, "y": 800, "t": 0}, {"x": 700, "y": 1400, "t": 300}]]
         
     Returns:
         操作结果消息
     """
-    # 对特殊字符进行转义
-    escaped_text = text.replace(' ', '%s').replace('"', '\\"')
+    try:
+        tracks = parse_tracks(fingers)
+    except (KeyError, TypeError, ValueError) as e:
+        return {
+            'success': False,
+            'message': "手势参数无效",
+            'details': str(e)
+        }
+    return await _multi_finger(tracks, f"{len(tracks)} 指手势, 持续: {max(track[-1][0] for track in tracks):.0f}ms")
+
+async def _multi_finger(tracks: List[Track], message: str) -> Dict[str, Any]:
+    """通过sendevent执行多指手势，input命令无法模拟多指，不可用时返回失败"""
+    try:
+        device = await _inject_gesture(tracks)
+    except ValueError as e:
+        return {
+            'success': False,
+            'message': "手势参数无效",
+            'details': str(e)
+        }
+    if device is None:
+        return {
+            'success': False,
+            'message': "设备不支持sendevent注入触摸事件",
+            'details': "没有找到多点触控设备，或者没有写入 /dev/input 的权限"
+        }
+    return {
+        'success': True,
+        'message': message,
+        'engine': ENGINE_SENDEVENT,
+        'device': device
+    }
+
+@tool()
+async def input_text(text: str, method: str = "auto", chunk_size: int = 0) -> Dict[str, Any]:
+    """输入文本
+    
+    长文本被拆成多块，多块打包在一个shell脚本中通过一次adb调用执行，脚本超过长度限制时才拆成多次调用；
+    某一块失败时从该块开始重试一次，已输入的部分不会重复。
+    
+    Args:
+        text: 要输入的文本，支持换行、制表符和shell特殊字符
+        method: auto、input 或 ime。input使用 `input text`，只支持ASCII；
+            ime通过ADBKeyboard输入法的广播输入任意Unicode文本(需要在设备上安装ADBKeyboard)；
+            auto在文本包含非ASCII字符且已安装ADBKeyboard时使用ime，否则使用input
+        chunk_size: 每条命令的最大字符数，0表示使用默认值
+        
+    Returns:
+        操作结果消息，包括使用的方式、完成的块数和adb调用次数
+    """
+    if method == "auto":
+        method = METHOD_INPUT
+        if needs_ime(text):
+            if await _has_adb_keyboard():
+                method = METHOD_IME
+    
+    try:
+        plan = TextEntryPlan(text, method, chunk_size or None)
+    except ValueError as e:
+        return {
+            'success': False,
+            'message': "无法输入文本",
+            'details': f"{str(e)}，输入法: {ADB_KEYBOARD_IME}"
+        }
     
-    result = adb_executor.execute_command(['shell', 'input', 'text', escaped_text])
+    retried = False
+    while not plan.done:
+        result = await async_executor.execute_command(['shell', plan.next_script()])
+        if not plan.update(result):
+            if retried:
+                break
+            retried = True
+    if not plan.done and plan.restore_command():
+        await async_executor.execute_command(['shell', plan.restore_command()])
     
     return {
-        'success': 'Error' not in result,
-        'message': f"输入文本: {text}",
-        'details': result
+        'success': plan.done,
+        'message': f"输入文本: {text if len(text) <= 100 else text[:100] + '...'}",
+        'method': plan.method,
+        'chunks': f"{plan.completed}/{len(plan.steps)}",
+        'round_trips': plan.scripts,
+        'details': plan.details
     }
 
-@app.tool()
-def press_key(keycode: str) -> Dict[str, Any]:
+# 设备是否安装了ADBKeyboard输入法，设备ID -> 是否安装
+adb_keyboard_installed = {}  # type: Dict[Optional[str], bool]
+
+async def _has_adb_keyboard() -> bool:
+    """当前设备是否安装了ADBKeyboard，结果按设备缓存"""
+    device_key = adb_executor.device_id
+    if device_key not in adb_keyboard_installed:
+        output = await async_executor.execute_command(['shell', IME_LIST_COMMAND])
+        if command_failed(output):
+            return False
+        adb_keyboard_installed[device_key] = ADB_KEYBOARD_IME in parse_installed_imes(output)
+    return adb_keyboard_installed[device_key]
+
+@tool()
+async def press_key(keycode: str, wait_until_stable: bool = False,
+                    settle_timeout: float = DEFAULT_SETTLE_TIMEOUT) -> Dict[str, Any]:
     """按下按键
     
     Args:
         keycode: 按键代码
+        wait_until_stable: 按键后是否等到画面稳定再返回，并返回最终画面，需要NumPy
+        settle_timeout: 等待画面稳定的最长时间(秒)
         
     Returns:
         操作结果消息
     """
-    # 常见按键代码映射
-    keycode_map = {
-        'home': '3',
-        'back': '4',
-        'menu': '82',
-        'power': '26',
-        'volume_up': '24',
-        'volume_down': '25',
-        'enter': '66',
-        'delete': '67',
-        'recent': '187'
-    }
-    
     # 如果是映射中的按键名，转换为代码
-    actual_keycode = keycode_map.get(keycode.lower(), keycode)
+    actual_keycode = resolve_keycode(keycode)
     
-    result = adb_executor.execute_command(['shell', 'input', 'keyevent', actual_keycode])
+    result = await async_executor.execute_command(['shell', 'input', 'keyevent', actual_keycode])
     
-    return {
-        'success': 'Error' not in result,
+    return await _settle_after({
+        'success': not command_failed(result),
         'message': f"按下按键: {keycode} (代码: {actual_keycode})",
         'details': result
+    }, wait_until_stable, settle_timeout)
+
+@tool()
+async def batch_input(actions: List[Dict[str, Any]], stop_on_error: bool = False) -> Dict[str, Any]:
+    """批量执行输入操作，所有操作通常在一次adb shell调用中完成，脚本超过长度限制时按顺序拆成多次调用
+    
+    Args:
+        actions: 操作列表，每项包含action字段及对应参数，可选delay字段(毫秒)表示该操作后的等待时间：
+            {"action": "tap", "x": 100, "y": 200}
+            {"action": "swipe", "x1": 0, "y1": 0, "x2": 0, "y2": 500, "duration": 300}
+            {"action": "long_press", "x": 100, "y": 200, "duration": 800}
+            {"action": "key", "keycode": "back"}
+            {"action": "text", "text": "hello"}  非ASCII文本临时切换到ADBKeyboard输入
+            {"action": "launch", "package": "com.android.settings", "component": "com.android.settings/.Settings"}
+            {"action": "url", "url": "https://example.com"}
+            {"action": "sleep", "duration": 500}
+        stop_on_error: 某个操作失败后是否跳过剩余操作
+        
+    Returns:
+        操作结果消息，results中包含每个操作的结果
+    """
+    try:
+        scripts, marker = compile_actions(actions, stop_on_error)
+    except (KeyError, TypeError, ValueError) as e:
+        return {
+            'success': False,
+            'message': "操作列表无效",
+            'details': str(e)
+        }
+    
+    outputs = []  # type: List[str]
+    for script in scripts:
+        output = await async_executor.execute_command(['shell', script])
+        outputs.append(output)
+        if not continue_batch(output, marker, stop_on_error):
+            break
+    result = '\n'.join(outputs)
+    results = parse_batch_output(result, marker, actions)
+    
+    if actions and all(item.get('skipped') for item in results):
+        # 没有任何标记行，说明整个脚本没有执行
+        return {
+            'success': False,
+            'message': "批量操作执行失败",
+            'details': result,
+            'results': results
+        }
+    
+    return {
+        'success': all(item['success'] for item in results),
+        'message': f"已执行 {sum(1 for item in results if not item.get('skipped'))}/{len(actions)} 个操作",
+        'results': results
+    }
+
+@tool()
+async def start_macro(name: str) -> Dict[str, Any]:
+    """开始录制宏
+    
+    之后在当前设备上成功执行的tap、swipe、long_press、press_key、input_text、open_app、open_url
+    和batch_input调用依次录入宏，调用之间的间隔作为步骤之间的等待时间保留，直到调用stop_macro。
+    
+    Args:
+        name: 宏名称，只能包含字母、数字、下划线、点和短横线
+        
+    Returns:
+        操作结果消息
+    """
+    try:
+        macro_recorder.start(name, adb_executor.device_id)
+    except ValueError as e:
+        return {
+            'success': False,
+            'message': "宏名称无效",
+            'details': str(e)
+        }
+    
+    return {
+        'success': True,
+        'message': f"开始录制宏: {name}",
+        'device': adb_executor.device_id
+    }
+
+@tool()
+async def stop_macro(discard: bool = False) -> Dict[str, Any]:
+    """结束录制宏并保存到主机的宏目录
+    
+    Args:
+        discard: 为True时丢弃录制的内容
+        
+    Returns:
+        操作结果消息，包含步骤数和脚本哈希
+    """
+    name, steps = macro_recorder.stop()
+    if name is None:
+        return {
+            'success': False,
+            'message': "没有正在录制的宏"
+        }
+    if discard or not steps:
+        return {
+            'success': discard,
+            'message': f"已丢弃宏: {name}" if discard else f"宏 {name} 没有录制到任何步骤，未保存"
+        }
+    
+    macro = await run_in_thread(macro_store.save, name, steps)
+    return {
+        'success': True,
+        'message': f"已保存宏: {name}，共 {len(steps)} 步",
+        'hash': macro['hash'],
+        'steps': steps
+    }
+
+@tool()
+async def run_macro(name: str, repeat: int = 1, stop_on_error: bool = True, keep_timing: bool = True) -> Dict[str, Any]:
+    """在设备上运行宏
+    
+    宏编译成的脚本按内容哈希存放在设备上，只在第一次运行或宏修改后推送；
+    重复执行在设备上循环完成，整个运行只需一次adb调用。
+    
+    Args:
+        name: 宏名称
+        repeat: 重复执行的次数
+        stop_on_error: 某一步失败后是否停止
+        keep_timing: 是否保留录制时步骤之间的等待，为False时尽快执行
+        
+    Returns:
+        操作结果消息，failures中包含失败的步骤(最多20个)
+    """
+    try:
+        macro = await run_in_thread(macro_store.load, name)
+    except KeyError:
+        return {
+            'success': False,
+            'message': f"宏不存在: {name}",
+            'suggestion': "请通过list_macros查看已保存的宏"
+        }
+    except ValueError as e:
+        return {
+            'success': False,
+            'message': "宏名称无效",
+            'details': str(e)
+        }
+    
+    marker = new_marker()
+    command = ['shell', run_command(macro['hash'], marker, repeat, stop_on_error, keep_timing)]
+    started = time.perf_counter()
+    output = await async_executor.execute_command(command)
+    parsed = parse_run_output(output, marker, macro['steps'])
+    pushed = False
+    if parsed['missing']:
+        push_result = await async_executor.execute_command([
+            'push', macro_store.script_path(macro['hash']), device_script_path(macro['hash'])
+        ])
+        if command_failed(push_result):
+            return {
+                'success': False,
+                'message': f"无法把宏脚本推送到设备: {name}",
+                'details': push_result
+            }
+        pushed = True
+        output = await async_executor.execute_command(command)
+        parsed = parse_run_output(output, marker, macro['steps'])
+    # 脚本中的输入命令不经过输入类命令检测，运行后统一使界面缓存失效
+    adb_executor.mark_input()
+    
+    if not parsed['finished']:
+        return {
+            'success': False,
+            'message': f"宏运行失败: {name}",
+            'details': output,
+            'failures': parsed['failures'][:20]
+        }
+    
+    return {
+        'success': not parsed['failures'],
+        'message': f"宏 {name} 已执行 {parsed['iterations']} 次，失败步骤 {len(parsed['failures'])} 个",
+        'iterations': parsed['iterations'],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'pushed': pushed,
+        'hash': macro['hash'],
+        'failures': parsed['failures'][:20]
+    }
+
+@tool()
+async def list_macros() -> Dict[str, Any]:
+    """列出主机上保存的宏
+    
+    Returns:
+        每个宏的名称、步骤数、总等待时间(毫秒)和脚本哈希
+    """
+    macros = await run_in_thread(macro_store.list)
+    return {
+        'success': True,
+        'message': f"共 {len(macros)} 个宏",
+        'macros': macros,
+        'recording': macro_recorder.name
+    }
+
+@tool()
+async def delete_macro(name: str) -> Dict[str, Any]:
+    """删除主机上保存的宏
+    
+    Args:
+        name: 宏名称
+        
+    Returns:
+        操作结果消息
+    """
+    try:
+        deleted = await run_in_thread(macro_store.delete, name)
+    except ValueError as e:
+        return {
+            'success': False,
+            'message': "宏名称无效",
+            'details': str(e)
+        }
+    
+    return {
+        'success': deleted,
+        'message': f"已删除宏: {name}" if deleted else f"宏不存在: {name}"
+    }
+
+@tool()
+async def wait_for(condition: str, value: str = "", timeout: float = DEFAULT_TIMEOUT,
+                   interval: float = DEFAULT_INTERVAL, absent: bool = False) -> Dict[str, Any]:
+    """等待设备上的条件成立，整个等待在设备上的一个shell循环中完成，只需一次adb调用
+    
+    Args:
+        condition: 等待条件:
+            activity    前台Activity包含value，例如 ".MainActivity"
+            package     前台应用的包名等于value，例如 "com.android.settings"
+            focus       获得焦点的窗口包含value；value为空时等待焦点窗口发生变化
+            call_state  通话状态为value: idle、ringing 或 offhook
+            text        界面中出现value(文本、content-desc或resource-id)
+        value: 条件的参数
+        timeout: 超时时间(秒)，按设备时钟的整秒计算，实际等待不短于该时间，但可能超出将近2秒
+        interval: 两次查询之间的间隔(秒)
+        absent: 为True时等待条件不再成立，例如等待某段文本消失
+        
+    Returns:
+        操作结果消息，包含是否满足、等待时间、查询次数和最后一次查询到的状态
+    """
+    marker = new_marker()
+    try:
+        script = compile_wait(condition, value, marker, timeout, interval, absent)
+    except ValueError as e:
+        return {
+            'success': False,
+            'message': "等待条件无效",
+            'details': str(e),
+            'conditions': list(CONDITIONS)
+        }
+    
+    started = time.perf_counter()
+    output = await async_executor.execute_command(['shell', script])
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    parsed = parse_wait_output(output, marker)
+    description = f"{condition}{' 不再满足' if absent else ''} {value}".strip()
+    
+    if not parsed['finished']:
+        return {
+            'success': False,
+            'message': f"等待失败: {description}",
+            'details': output
+        }
+    
+    return {
+        'success': parsed['satisfied'],
+        'message': (f"条件已满足: {description}" if parsed['satisfied']
+                    else f"等待超时: {description}"),
+        'elapsed_ms': elapsed_ms,
+        'polls': parsed['polls'],
+        'state': parsed['value']
     }
 
-@app.tool()
-def take_screenshot(local_path: str = "screenshot.png") -> Dict[str, Any]:
+@tool()
+async def get_current_state(refresh: bool = False) -> Dict[str, Any]:
+    """获取设备的前台状态：前台应用和Activity、屏幕是否点亮、是否锁屏、屏幕方向和当前输入法
+    
+    只查询dumpsys中最小的几个部分并在设备上过滤，一次adb调用完成；结果按设备缓存，
+    直到设备上执行输入操作或缓存超过10秒。
+    
+    Args:
+        refresh: 是否忽略缓存重新查询
+        
+    Returns:
+        前台状态，cached表示结果来自缓存
+    """
+    device_key = adb_executor.device_id
+    entry = None if refresh else state_cache.get_entry(device_key)
+    if entry is not None:
+        cached_at, state = entry
+        return dict(state, success=True, message="前台状态(缓存)", cached=True,
+                    age_ms=round((time.monotonic() - cached_at) * 1000, 1))
+    
+    generation = state_cache.generation(device_key)
+    output = await async_executor.execute_command(['shell', state_script()])
+    if command_failed(output):
+        return {
+            'success': False,
+            'message': "获取前台状态失败",
+            'details': output
+        }
+    state = parse_state(output.splitlines())
+    state_cache.put(device_key, state, generation)
+    
+    return dict(state, success=True, message="前台状态", cached=False)
+
+@tool()
+async def take_screenshot(local_path: str = "screenshot.png", return_base64: bool = False,
+                    raw: bool = False, max_width: int = 0, max_height: int = 0,
+                    region: Optional[List[int]] = None, grayscale: bool = False,
+                    image_format: str = "png", quality: int = DEFAULT_QUALITY,
+                    max_base64_size: Optional[int] = None) -> Dict[str, Any]:
     """截取屏幕截图
     
+    默认通过 `exec-out screencap -p` 直接读入设备编码的PNG，不经过设备存储。
+    raw模式读取未编码的帧缓冲，在主机上完成裁剪、缩放和编码，需要安装NumPy；指定max_width、max_height、
+    region或grayscale时自动使用raw模式。
+    JPEG和WebP格式总是在主机上编码，另外需要安装Pillow。编码在专用线程池中进行，不阻塞服务器。
+    
+    返回base64时可以限制其长度：超出限制时依次降低质量、PNG改用JPEG、缩小尺寸，直到满足限制，
+    实际使用的参数在inline中返回，保存的文件不受影响。
+    
     Args:
-        local_path: 本地保存路径
+        local_path: 本地保存路径，为空字符串时不保存文件；扩展名按输出格式调整，例如JPEG保存为 .jpg
+        return_base64: 是否在返回结果中包含base64编码的图片
+        raw: 是否跳过设备端PNG编码，读取原始帧缓冲
+        max_width: 输出最大宽度，0表示不限制
+        max_height: 输出最大高度，0表示不限制
+        region: 裁剪区域 [left, top, right, bottom]
+        grayscale: 是否转换为灰度图
+        image_format: 输出格式，png、jpeg、webp 或 raw(未压缩像素数据)
+        quality: JPEG和WebP的质量(1-100)
+        max_base64_size: 内联base64的最大长度(字符)，0表示不限制，默认使用环境变量PHONE_MCP_BASE64_BUDGET
         
     Returns:
         操作结果消息
     """
-    # 在设备上截图
-    device_path = "/sdcard/screenshot.png"
-    capture_result = adb_executor.execute_command(['shell', 'screencap', '-p', device_path])
+    image_format = normalize_format(image_format)
+    if image_format not in OUTPUT_FORMATS:
+        return {
+            'success': False,
+            'message': f"不支持的输出格式: {image_format}",
+            'details': f"可选格式: {', '.join(OUTPUT_FORMATS)}"
+        }
+    if not 1 <= quality <= 100:
+        return {
+            'success': False,
+            'message': f"无效的质量: {quality}",
+            'details': "质量的范围为1-100"
+        }
+    if local_path:
+        local_path = output_path(local_path, image_format)
+    budget = DEFAULT_BASE64_BUDGET if max_base64_size is None else max(0, max_base64_size)
+    budget = budget if return_base64 else 0
+    
+    # 任何主机端处理选项都需要原始帧缓冲，屏幕流运行时直接使用缓冲区中的最新帧；
+    # 限制base64长度需要在主机上重新编码，没有NumPy时只能返回设备编码的PNG
+    use_raw = (raw or bool(max_width or max_height or region or grayscale)
+               or image_format != 'png' or _active_stream() is not None or bool(budget and HAS_NUMPY))
     
-    if 'Error' in capture_result:
+    def render(frame) -> Tuple[EncodedImage, EncodedImage]:
+        frame = process_frame(frame, region, max_width, max_height, grayscale)
+        encoded = encode_image(frame, image_format, quality)
+        return encoded, (fit_budget(frame, image_format, quality, budget, encoded) if budget else encoded)
+    
+    try:
+        if use_raw:
+            encoded, inline = await run_in_pool(encode_pool, render, await _capture_frame())
+        else:
+            image_data = check_png(await async_executor.execute_binary(PNG_CAPTURE_COMMAND))
+            encoded = inline = EncodedImage(image_data, 'png', None, *png_size(image_data))
+    except (ADBCommandError, RuntimeError, ValueError) as e:
         return {
             'success': False,
             'message': "截图失败",
-            'details': capture_result
+            'details': str(e)
+        }
+    
+    response = {
+        'success': True,
+        'message': f"截图已保存到: {local_path}" if local_path else "截图成功",
+        'format': image_format,
+        'width': encoded.width,
+        'height': encoded.height,
+        'size': len(encoded.data)
+    }
+    if image_format == 'raw':
+        response['channels'] = 1 if grayscale else 3
+    
+    if local_path:
+        try:
+            await run_in_thread(_write_file, local_path, encoded.data)
+        except OSError as e:
+            return {
+                'success': False,
+                'message': "截图保存失败",
+                'details': str(e)
+            }
+    
+    if return_base64:
+        response['mime_type'] = MIME_TYPES[inline.image_format]
+        response['image_base64'] = base64.b64encode(inline.data).decode('ascii')
+        if inline is not encoded:
+            response['inline'] = {
+                'format': inline.image_format,
+                'quality': inline.quality,
+                'width': inline.width,
+                'height': inline.height,
+                'size': len(inline.data)
+            }
+        if not fits(inline, budget):
+            response['budget_exceeded'] = True
+    
+    return response
+
+@tool()
+async def screenshot_diff(max_width: int = 0, max_height: int = 0, grayscale: bool = False,
+                    block_size: int = DEFAULT_BLOCK_SIZE, full_frame_ratio: float = 0.5,
+                    reset: bool = False) -> Dict[str, Any]:
+    """截图并只返回与上一帧相比发生变化的区域
+    
+    每个设备缓存最近一帧，新截图按块哈希与其比较。需要安装NumPy。
+    
+    Args:
+        max_width: 截图缩放后的最大宽度，0表示不限制
+        max_height: 截图缩放后的最大高度，0表示不限制
+        grayscale: 是否转换为灰度图后再比较
+        block_size: 比较时使用的块大小(像素)
+        full_frame_ratio: 变化块比例超过该值时直接返回整幅图像
+        reset: 是否丢弃缓存帧并返回整幅图像
+        
+    Returns:
+        status为unchanged、changed或full；changed时regions包含变化区域的坐标和PNG图片
+    """
+    if block_size < 1:
+        return {
+            'success': False,
+            'message': f"无效的块大小: {block_size}",
+            'details': "块大小至少为1像素"
+        }
+    device_key = adb_executor.device_id
+    if reset:
+        frame_cache.invalidate(device_key)
+    
+    def compare(frame) -> Dict[str, Any]:
+        frame = process_frame(frame, None, max_width, max_height, grayscale)
+        diff = diff_frame(frame_cache, device_key, frame, block_size)
+        
+        height, width = frame.shape[:2]
+        response = {
+            'success': True,
+            'status': diff['status'],
+            'width': width,
+            'height': height,
+            'changed_ratio': round(diff['changed_ratio'], 4)
+        }
+    
+        if diff['status'] == 'unchanged':
+            response['message'] = "屏幕没有变化"
+        elif diff['status'] == 'full' or diff['changed_ratio'] > full_frame_ratio:
+            response['status'] = 'full'
+            response['message'] = "返回整幅截图"
+            response['mime_type'] = 'image/png'
+            response['image_base64'] = base64.b64encode(encode_png(frame)).decode('ascii')
+        else:
+            response['message'] = f"{len(diff['regions'])} 个区域发生变化"
+            response['regions'] = [
+                {
+                    'box': list(box),
+                    'mime_type': 'image/png',
+                    'image_base64': base64.b64encode(encode_png(crop(frame, box))).decode('ascii')
+                } for box in diff['regions']
+            ]
+        
+        return response
+    
+    try:
+        return await run_in_pool(encode_pool, compare, await _capture_frame())
+    except (ADBCommandError, RuntimeError, ValueError) as e:
+        return {
+            'success': False,
+            'message': "截图失败",
+            'details': str(e)
+        }
+
+@tool()
+async def dump_ui(refresh: bool = False, all_nodes: bool = False) -> Dict[str, Any]:
+    """获取当前界面的元素层级
+    
+    结果按设备缓存，执行点击、滑动、按键等输入操作后自动失效。
+    
+    Args:
+        refresh: 是否忽略缓存重新获取
+        all_nodes: 是否返回全部节点，默认只返回有文本、描述、ID或可交互的节点
+        
+    Returns:
+        界面元素列表，每个元素包含index、text、resource_id、content_desc、class和bounds
+    """
+    try:
+        index = await _get_ui_index(refresh)
+    except (ADBCommandError, ValueError) as e:
+        return {
+            'success': False,
+            'message': "获取界面层级失败",
+            'details': str(e)
+        }
+    
+    nodes = index.nodes if all_nodes else index.interesting_nodes()
+    return {
+        'success': True,
+        'message': f"界面共 {len(index.nodes)} 个节点，返回 {len(nodes)} 个",
+        'elements': [node.to_dict() for node in nodes]
+    }
+
+@tool()
+async def find_elements(query: str, by: str = "any", exact: bool = False, limit: int = 20) -> Dict[str, Any]:
+    """按文本、resource-id、content-desc或类名查找界面元素
+    
+    Args:
+        query: 查询内容，不区分大小写
+        by: 查询字段，any、text、resource_id、content_desc 或 class_name
+        exact: 是否要求完全匹配，默认按包含匹配
+        limit: 最多返回的元素数量
+        
+    Returns:
+        匹配的界面元素列表
+    """
+    try:
+        nodes = (await _get_ui_index()).find(query, by, exact)
+    except (ADBCommandError, ValueError) as e:
+        return {
+            'success': False,
+            'message': "查找界面元素失败",
+            'details': str(e)
+        }
+    
+    return {
+        'success': bool(nodes),
+        'message': f"找到 {len(nodes)} 个匹配的元素",
+        'elements': [node.to_dict() for node in nodes[:limit]]
+    }
+
+@tool()
+async def tap_element(query: str, by: str = "any", exact: bool = False, nth: int = 0) -> Dict[str, Any]:
+    """查找界面元素并点击其中心
+    
+    Args:
+        query: 查询内容，不区分大小写
+        by: 查询字段，any、text、resource_id、content_desc 或 class_name
+        exact: 是否要求完全匹配，默认按包含匹配
+        nth: 有多个匹配时点击第几个(从0开始)
+        
+    Returns:
+        操作结果消息
+    """
+    try:
+        nodes = (await _get_ui_index()).find(query, by, exact)
+        if len(nodes) <= nth:
+            # 缓存的界面可能已经过期(例如页面加载完成)，重新获取一次
+            nodes = (await _get_ui_index(refresh=True)).find(query, by, exact)
+    except (ADBCommandError, ValueError) as e:
+        return {
+            'success': False,
+            'message': "查找界面元素失败",
+            'details': str(e)
         }
     
-    # 将截图拉取到本地
-    pull_result = adb_executor.execute_command(['pull', device_path, local_path])
+    if len(nodes) <= nth:
+        return {
+            'success': False,
+            'message': f"没有找到匹配的元素: {query}",
+        }
+    
+    node = nodes[nth]
+    x, y = node.center
+    result = await async_executor.execute_command(['shell', 'input', 'tap', str(x), str(y)])
+    
+    return {
+        'success': not command_failed(result),
+        'message': f"点击元素: {query} ({x}, {y})",
+        'element': node.to_dict(),
+        'details': result
+    }
+
+@tool()
+async def start_screen_stream(max_width: int = 720, bit_rate: int = 4000000, buffer_size: int = 8) -> Dict[str, Any]:
+    """启动连续屏幕流
+    
+    在后台持续录制H.264屏幕流并解码，最近的帧保存在环形缓冲区中。
+    流运行期间take_screenshot和screenshot_diff直接读取缓冲区。需要NumPy和ffmpeg。
+    
+    Args:
+        max_width: 录制的最大宽度
+        bit_rate: H.264码率
+        buffer_size: 环形缓冲区保存的帧数
+        
+    Returns:
+        操作结果消息
+    """
+    device_key = adb_executor.device_id
+    
+    def running_stream() -> Optional[Dict[str, Any]]:
+        stream = screen_streams.get(device_key)
+        if stream is not None and stream.is_running():
+            return {
+                'success': True,
+                'message': "屏幕流已在运行",
+                'stats': stream.stats()
+            }
+        return None
+    
+    with screen_streams_lock:
+        response = running_stream()
+    if response is not None:
+        return response
+    
+    size = parse_screen_size(await async_executor.execute_command(['shell', 'wm', 'size']))
+    if size is None:
+        return {
+            'success': False,
+            'message': "无法获取屏幕尺寸",
+        }
+    width, height = stream_size(size[0], size[1], max_width)
     
-    # 删除设备上的临时文件
-    adb_executor.execute_command(['shell', 'rm', device_path])
+    with screen_streams_lock:
+        # 等待屏幕尺寸期间可能已有其他调用启动了流
+        response = running_stream()
+        if response is not None:
+            return response
+        
+        try:
+            stream = ScreenStream(adb_executor, device_key, width, height,
+                                  bit_rate=bit_rate, capacity=buffer_size).start()
+        except (RuntimeError, OSError) as e:
+            return {
+                'success': False,
+                'message': "启动屏幕流失败",
+                'details': str(e)
+            }
+        screen_streams[device_key] = stream
     
     return {
-        'success': 'Error' not in pull_result,
-        'message': f"截图已保存到: {local_path}",
-        'details': pull_result
+        'success': True,
+        'message': f"屏幕流已启动: {width}x{height}",
+        'stats': stream.stats()
     }
 
-@app.tool()
-def open_url(url: str) -> Dict[str, Any]:
+@tool()
+async def stop_screen_stream() -> Dict[str, Any]:
+    """停止当前设备的连续屏幕流
+    
+    Returns:
+        操作结果消息
+    """
+    with screen_streams_lock:
+        stream = screen_streams.pop(adb_executor.device_id, None)
+    if stream is None:
+        return {
+            'success': False,
+            'message': "屏幕流没有运行"
+        }
+    
+    await run_in_thread(stream.stop)
+    return {
+        'success': True,
+        'message': "屏幕流已停止",
+        'stats': stream.stats()
+    }
+
+@tool()
+async def push_files(local_path: str, remote_path: str, compare: str = COMPARE_MTIME,
+                     workers: int = SYNC_WORKERS, dry_run: bool = False) -> Dict[str, Any]:
+    """把本地文件或目录树推送到设备
+    
+    两端大小和修改时间(compare="checksum"时为md5)都相同的文件跳过，其余文件并行传输，
+    数据直接从磁盘流式发送。传输中断后再次调用即可继续，已完成的文件会被跳过。
+    配合run_on_devices可以把同一目录同步到多台设备。
+    
+    Args:
+        local_path: 本地文件或目录
+        remote_path: 设备端目标目录，例如 /sdcard/Download/fixtures
+        compare: 判断文件是否一致的方式，mtime(大小和修改时间) 或 checksum(设备端md5sum)
+        workers: 同时传输的文件数
+        dry_run: 只比较，不传输
+        
+    Returns:
+        传输、跳过和失败的文件，以及传输的字节数
+    """
+    return await _sync_tree(push_tree, local_path, remote_path, compare, workers, dry_run)
+
+@tool()
+async def pull_files(remote_path: str, local_path: str, compare: str = COMPARE_MTIME,
+                     workers: int = SYNC_WORKERS, dry_run: bool = False) -> Dict[str, Any]:
+    """把设备上的文件或目录树拉取到本地
+    
+    比较和并行传输方式与push_files相同。文件先写入 "<文件>.phone_mcp_part"，完成后改名，
+    并把修改时间设为设备端的时间，中断后再次调用即可继续。通过run_on_devices拉取多台设备时，
+    local_path中的{device}会替换为设备ID。
+    
+    Args:
+        remote_path: 设备端文件或目录
+        local_path: 本地目标目录
+        compare: 判断文件是否一致的方式，mtime(大小和修改时间) 或 checksum(设备端md5sum)
+        workers: 同时传输的文件数
+        dry_run: 只比较，不传输
+        
+    Returns:
+        传输、跳过和失败的文件，以及传输的字节数
+    """
+    return await _sync_tree(pull_tree, remote_path, local_path, compare, workers, dry_run)
+
+async def _sync_tree(sync: Callable[..., Dict[str, Any]], source: str, target: str,
+                     compare: str, workers: int, dry_run: bool) -> Dict[str, Any]:
+    """在线程池中执行目录同步，把结果整理为工具的返回格式"""
+    try:
+        result = await run_in_thread(sync, adb_executor, source, target, compare, workers, dry_run)
+    except (ValueError, FileNotFoundError, RuntimeError, OSError) as e:
+        return {
+            'success': False,
+            'message': "文件同步失败",
+            'details': str(e)
+        }
+    
+    action = "需要传输" if dry_run else "已传输"
+    result.update(
+        success=not result['failed'],
+        message=f"{action} {len(result['transferred'])} 个文件，跳过 {result['skipped']} 个，"
+                f"失败 {len(result['failed'])} 个"
+    )
+    return result
+
+# 不能在多设备上并行调用的工具
+FLEET_EXCLUDED_TOOLS = ('set_device', 'check_connection', 'run_on_devices', 'get_metrics',
+                        'start_macro', 'stop_macro', 'list_macros', 'delete_macro')
+
+@tool()
+async def run_on_devices(tool_name: str, devices: Optional[List[str]] = None,
+                         arguments: Optional[Dict[str, Any]] = None,
+                         max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """在多个设备上并行执行同一个工具
+    
+    每个设备在独立的上下文中执行，不会改变set_device设置的当前设备。
+    
+    Args:
+        tool_name: 工具名称，例如 open_url、press_key、take_screenshot
+        devices: 设备ID列表，为空时使用所有在线设备
+        arguments: 工具参数，字符串中的 {device} 会被替换为设备ID，
+            例如 {"local_path": "screenshot_{device}.png"}
+        max_workers: 最多同时执行的设备数
+        
+    Returns:
+        每个设备的执行结果和耗时，以及失败的设备列表
+    """
+    func = TOOLS.get(tool_name)
+    if func is None or tool_name in FLEET_EXCLUDED_TOOLS:
+        return {
+            'success': False,
+            'message': f"无法在多设备上执行工具: {tool_name}"
+        }
+    
+    if not devices:
+        if device_registry.is_live:
+            devices = device_registry.online_serials()
+        else:
+            devices = parse_online_devices(await async_executor.execute_command(['devices']))
+        if not devices:
+            return {
+                'success': False,
+                'message': "没有在线的设备"
+            }
+    
+    return await run_on_devices_parallel(adb_executor, func, devices, arguments, max_workers)
+
+def _stop_screen_streams() -> None:
+    """停止所有屏幕流"""
+    with screen_streams_lock:
+        streams = list(screen_streams.values())
+        screen_streams.clear()
+    for stream in streams:
+        stream.stop()
+
+@tool()
+async def open_url(url: str) -> Dict[str, Any]:
     """打开URL
     
     Args:
@@ -440,19 +1701,80 @@ def open_url(url: str) -> Dict[str, Any]:
     Returns:
         操作结果消息
     """
-    result = adb_executor.execute_command([
+    result = await async_executor.execute_command([
         'shell', 'am', 'start', '-a', 'android.intent.action.VIEW', '-d', url
     ])
     
     return {
-        'success': 'Error' not in result,
+        'success': not command_failed(result),
         'message': f"已打开URL: {url}",
         'details': result
     }
 
+@tool()
+async def get_metrics(kind: str = "", reset: bool = False, prometheus_file: str = "") -> Dict[str, Any]:
+    """返回工具调用和ADB命令的耗时统计
+    
+    每个工具和每类ADB命令(子命令加第一个词，例如 "shell input")按设备分别统计调用次数、
+    失败次数、输出字节数以及p50/p95/p99耗时，按总耗时从高到低排列。
+    
+    Args:
+        kind: 只返回一类统计，tool 或 adb，为空时全部返回
+        reset: 返回后清空统计
+        prometheus_file: 同时以Prometheus文本格式写入该文件
+        
+    Returns:
+        tools和adb_commands两组统计
+    """
+    if kind and kind not in (KIND_TOOL, KIND_ADB):
+        return {
+            'success': False,
+            'message': f"未知的统计类别: {kind}，可选 {KIND_TOOL} 或 {KIND_ADB}"
+        }
+    
+    result = {
+        'success': True,
+        'message': "已返回耗时统计",
+        'since': metrics.started
+    }  # type: Dict[str, Any]
+    if kind in ('', KIND_TOOL):
+        result['tools'] = metrics.summary(KIND_TOOL)
+    if kind in ('', KIND_ADB):
+        result['adb_commands'] = metrics.summary(KIND_ADB)
+    
+    if prometheus_file:
+        try:
+            await run_in_thread(metrics.write_prometheus, prometheus_file)
+            result['prometheus_file'] = prometheus_file
+        except OSError as e:
+            result['success'] = False
+            result['message'] = f"写入Prometheus文件失败: {str(e)}"
+    
+    if reset:
+        metrics.reset()
+    return result
+
+def _start_metrics_writer() -> Optional[MetricsFileWriter]:
+    """设置了 PHONE_MCP_METRICS_FILE 或 PHONE_MCP_PROMETHEUS_FILE 时定期把统计写入文件"""
+    json_path = os.environ.get('PHONE_MCP_METRICS_FILE')
+    prometheus_path = os.environ.get('PHONE_MCP_PROMETHEUS_FILE')
+    if not json_path and not prometheus_path:
+        return None
+    interval = float(os.environ.get('PHONE_MCP_METRICS_INTERVAL', '10'))
+    return MetricsFileWriter(metrics, json_path, prometheus_path, interval).start()
+
 def main():
     """MCP服务器主入口"""
-    app.run(transport='stdio')
+    device_registry.start()
+    metrics_writer = _start_metrics_writer()
+    try:
+        app.run(transport='stdio')
+    finally:
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        device_registry.stop()
+        _stop_screen_streams()
+        adb_executor.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
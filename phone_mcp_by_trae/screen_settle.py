@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 画面稳定检测
+
+输入操作之后连续截取画面，每帧计算一个感知哈希(差值哈希)：先转灰度，按面积平均缩小到
+(HASH_SIZE+1)×HASH_SIZE，再比较每行相邻像素的明暗，得到 HASH_SIZE² 位。
+动画、页面切换会改变大量位，而光标闪烁、时钟跳秒之类的小变化只影响少数位，
+因此连续若干帧的哈希距离都不超过阈值时认为画面已经稳定，不必在每次操作后固定等待最坏情况的时间。
+"""
+
+from typing import Optional
+
+from phone_mcp_by_trae.framebuffer import require_numpy, to_grayscale
+
+HASH_SIZE = 16
+# 相邻两帧哈希不同的位数不超过该值时视为相同
+DEFAULT_THRESHOLD = 3
+# 连续相同的帧数达到该值时视为稳定
+DEFAULT_STABLE_FRAMES = 2
+# 等待稳定的最长时间(秒)
+DEFAULT_SETTLE_TIMEOUT = 5.0
+# 屏幕流运行时两次读取之间的间隔(秒)，流只在画面变化时产生新帧
+STREAM_POLL_INTERVAL = 0.1
+# 屏幕流超过该时间(秒)没有新帧时视为画面没有变化，需要长于screenrecord和解码器的延迟
+STREAM_QUIET_PERIOD = 0.5
+# 操作后开始判断之前的等待时间(秒)，避免在界面开始变化之前把操作前的画面当作稳定
+MIN_SETTLE_DELAY = 0.3
+# 返回的最终画面的最大宽度
+SETTLE_FRAME_WIDTH = 540
+
+
+def perceptual_hash(frame, hash_size: int = HASH_SIZE):
+    """计算差值哈希
+
+    Returns:
+        (hash_size, hash_size) 的布尔数组
+    """
+    np = require_numpy()
+    # 先隔行隔列取样到每个哈希格约8×8个像素，避免对整幅画面做灰度转换
+    step = max(1, min(frame.shape[0], frame.shape[1]) // (hash_size * 8))
+    gray = to_grayscale(frame[::step, ::step]).astype(np.float32)
+    height, width = gray.shape
+    columns, rows = hash_size + 1, hash_size
+    factor_y, factor_x = max(1, height // rows), max(1, width // columns)
+    if height >= rows and width >= columns:
+        # 丢掉不能整除的边缘后按块求平均
+        gray = gray[:rows * factor_y, :columns * factor_x]
+        small = gray.reshape(rows, factor_y, columns, factor_x).mean(axis=(1, 3))
+    else:
+        small = gray[(np.arange(rows) * height // rows)[:, None], (np.arange(columns) * width // columns)[None, :]]
+    return small[:, 1:] > small[:, :-1]
+
+
+def hash_distance(first, second) -> int:
+    """两个哈希不同的位数"""
+    if first.shape != second.shape:
+        return first.size
+    return int((first != second).sum())
+
+
+class SettleDetector:
+    """逐帧判断画面是否已经稳定"""
+
+    def __init__(self, stable_frames: int = DEFAULT_STABLE_FRAMES, threshold: int = DEFAULT_THRESHOLD):
+        self.stable_frames = max(2, stable_frames)
+        self.threshold = threshold
+        self.frames = 0
+        self.run = 0
+        self.last_frame = None
+        self.last_distance = None  # type: Optional[int]
+        self._last_hash = None
+
+    def update(self, frame) -> bool:
+        """加入一帧，返回画面是否已经稳定(连续stable_frames帧相同)"""
+        frame_hash = perceptual_hash(frame)
+        self.frames += 1
+        if self._last_hash is None:
+            self.run = 1
+        else:
+            self.last_distance = hash_distance(self._last_hash, frame_hash)
+            self.run = self.run + 1 if self.last_distance <= self.threshold else 1
+        self._last_hash = frame_hash
+        self.last_frame = frame
+        return self.run >= self.stable_frames
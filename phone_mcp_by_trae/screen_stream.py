@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 连续屏幕流
+
+通过 `adb exec-out screenrecord --output-format=h264 -` 持续获取H.264码流，
+在后台线程中解码，并把最近N帧保存在有界环形缓冲区中。
+截图工具在流运行期间直接读取缓冲区，不再每次启动一次截图命令。
+
+数据流与背压:
+    adb输出 --(读取线程, 阻塞写入)--> 解码器stdin
+    解码器stdout --(输出线程)--> 环形缓冲区(满时覆盖最旧帧)
+
+H.264数据不能随意丢弃，因此解码跟不上时读取线程会阻塞在写入上，
+管道写满后screenrecord自身被阻塞，形成逐级背压；已解码的帧则由环形缓冲区
+丢弃最旧的未读帧，读取方始终拿到最新画面。
+"""
+
+import collections
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from phone_mcp_by_trae.framebuffer import require_numpy
+
+# screenrecord单次录制的最长时间(秒)，到达后自动重启
+SCREENRECORD_TIME_LIMIT = 180
+# 连续启动失败超过该次数后停止重试
+MAX_RESTART_FAILURES = 3
+
+
+class FrameRingBuffer:
+    """保存最近N帧的线程安全环形缓冲区"""
+
+    def __init__(self, capacity: int = 8):
+        self.capacity = capacity
+        self._frames = collections.deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._last_read = 0
+        self.dropped = 0
+
+    def push(self, frame) -> int:
+        """加入一帧，缓冲区满时覆盖最旧的帧，返回帧序号"""
+        with self._condition:
+            if len(self._frames) == self.capacity and self._frames[0][0] > self._last_read:
+                # 最旧的帧还没有被读取就被覆盖
+                self.dropped += 1
+            self._sequence += 1
+            self._frames.append((self._sequence, time.time(), frame))
+            self._condition.notify_all()
+            return self._sequence
+
+    def latest(self) -> Optional[Tuple[int, float, Any]]:
+        """返回最新一帧 (序号, 时间戳, 帧)，缓冲区为空时返回None"""
+        with self._condition:
+            if not self._frames:
+                return None
+            entry = self._frames[-1]
+            self._last_read = max(self._last_read, entry[0])
+            return entry
+
+    def wait_for_frame(self, after: int = 0, timeout: Optional[float] = None) -> Optional[Tuple[int, float, Any]]:
+        """等待序号大于after的新帧，超时返回None"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > after, timeout):
+                return None
+            entry = self._frames[-1]
+            self._last_read = max(self._last_read, entry[0])
+            return entry
+
+    @property
+    def sequence(self) -> int:
+        """已加入的帧总数"""
+        return self._sequence
+
+
+class FFmpegDecoder:
+    """使用ffmpeg命令行进行H.264软件解码，输出RGB24帧
+
+    仅依赖PATH中的ffmpeg，可在普通Linux主机上运行。
+    """
+
+    def __init__(self, width: int, height: int, ffmpeg: Optional[str] = None):
+        self.width = width
+        self.height = height
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        if not self.ffmpeg:
+            raise RuntimeError("屏幕流需要ffmpeg进行解码，请先安装ffmpeg并添加到PATH")
+        self._process = subprocess.Popen(
+            [self.ffmpeg, '-loglevel', 'error',
+             '-fflags', 'nobuffer', '-flags', 'low_delay',
+             '-probesize', '32', '-analyzeduration', '0',
+             '-f', 'h264', '-i', 'pipe:0',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def feed(self, data: bytes) -> None:
+        """写入H.264数据，解码器繁忙时阻塞"""
+        self._process.stdin.write(data)
+        self._process.stdin.flush()
+
+    def read_frame(self):
+        """读取一帧解码后的RGB数组，解码器结束时返回None"""
+        np = require_numpy()
+        size = self.width * self.height * 3
+        data = self._process.stdout.read(size)
+        if data is None or len(data) < size:
+            return None
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def close(self) -> None:
+        """结束解码器进程"""
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process.stdout.close()
+
+
+class ScreenStream:
+    """单个设备的连续屏幕流"""
+
+    def __init__(self, executor, device_id: Optional[str], width: int, height: int,
+                 bit_rate: int = 4000000, capacity: int = 8,
+                 decoder_factory: Optional[Callable[[int, int], Any]] = None):
+        """初始化屏幕流
+
+        Args:
+            executor: ADBExecutor实例
+            device_id: 设备ID
+            width: 录制宽度
+            height: 录制高度
+            bit_rate: H.264码率
+            capacity: 环形缓冲区保存的帧数
+            decoder_factory: 根据宽高创建解码器的函数，默认使用FFmpegDecoder
+        """
+        require_numpy()
+        self.executor = executor
+        self.device_id = device_id
+        self.width = width
+        self.height = height
+        self.bit_rate = bit_rate
+        self.buffer = FrameRingBuffer(capacity)
+        self.decoder_factory = decoder_factory or FFmpegDecoder
+        self.restarts = 0
+        self.error = None  # type: Optional[str]
+        self._stop = threading.Event()
+        self._decoder = None
+        self._source = None
+        self._threads = []  # type: list
+
+    def start(self) -> 'ScreenStream':
+        """启动录制、解码和输出线程"""
+        self._decoder = self.decoder_factory(self.width, self.height)
+        for target in (self._read_loop, self._decode_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _command(self):
+        return ['exec-out', 'screenrecord', '--output-format=h264',
+                '--size', f'{self.width}x{self.height}',
+                '--bit-rate', str(self.bit_rate),
+                '--time-limit', str(SCREENRECORD_TIME_LIMIT), '-']
+
+    def _read_loop(self) -> None:
+        """读取screenrecord输出并送入解码器，录制结束后自动重启"""
+        failures = 0
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self._source = self.executor.open_stream(self._command(), self.device_id)
+                while not self._stop.is_set():
+                    chunk = self._source.read(65536)
+                    if not chunk:
+                        break
+                    self._decoder.feed(chunk)
+            except Exception as e:
+                # 各后端的错误类型不同(OSError、ADBProtocolError、ADBCommandError等)，都按一次失败处理
+                if self._stop.is_set():
+                    return
+                self.error = str(e)
+            finally:
+                if self._source is not None:
+                    self._source.close()
+                    self._source = None
+            if self._stop.is_set():
+                return
+            # 运行时间很短就退出，视为启动失败
+            failures = failures + 1 if time.time() - started < 1 else 0
+            if failures >= MAX_RESTART_FAILURES:
+                self._fail(self.error or "screenrecord启动失败")
+                return
+            self.restarts += 1
+
+    def _decode_loop(self) -> None:
+        """从解码器读取帧并写入环形缓冲区"""
+        try:
+            while not self._stop.is_set():
+                frame = self._decoder.read_frame()
+                if frame is None:
+                    self._fail("解码器已退出")
+                    return
+                self.buffer.push(frame)
+        except Exception as e:
+            self._fail(f"解码失败: {e}")
+
+    def _fail(self, error: str) -> None:
+        """后台线程意外结束时记录原因并标记流已停止，同时关闭录制和解码器，让另一个线程也退出
+
+        流停止后_active_stream不再使用缓冲区中的旧帧。
+        """
+        if self._stop.is_set():
+            return
+        self.error = error
+        self._stop.set()
+        source = self._source
+        if source is not None:
+            source.close()
+        if self._decoder is not None:
+            self._decoder.close()
+
+    def is_running(self) -> bool:
+        """流是否仍在运行"""
+        return not self._stop.is_set()
+
+    def latest_frame(self):
+        """返回最新一帧RGB数组，还没有帧时返回None
+
+        screenrecord只在画面变化时输出新帧，因此最新帧的时间戳可能较早，
+        但只要流仍在运行，它就代表当前屏幕内容。
+        """
+        entry = self.buffer.latest()
+        return entry[2] if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """返回流的运行状态"""
+        latest = self.buffer.latest()
+        return {
+            'device_id': self.device_id,
+            'running': self.is_running(),
+            'width': self.width,
+            'height': self.height,
+            'frames': self.buffer.sequence,
+            'dropped': self.buffer.dropped,
+            'restarts': self.restarts,
+            'last_frame_age': round(time.time() - latest[1], 3) if latest else None,
+            'error': self.error
+        }
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止录制并等待后台线程退出"""
+        self._stop.set()
+        source = self._source
+        if source is not None:
+            source.close()
+        if self._decoder is not None:
+            self._decoder.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def parse_screen_size(output: str) -> Optional[Tuple[int, int]]:
+    """解析 `wm size` 的输出，优先使用Override size"""
+    size = None
+    for line in output.splitlines():
+        if ':' not in line:
+            continue
+        label, value = line.split(':', 1)
+        try:
+            width, height = (int(part) for part in value.strip().split('x'))
+        except ValueError:
+            continue
+        if 'Override' in label or size is None:
+            size = (width, height)
+    return size
+
+
+def stream_size(width: int, height: int, max_width: int = 0) -> Tuple[int, int]:
+    """计算录制尺寸：按max_width等比缩小，并对齐到16的倍数以兼容硬件编码器"""
+    if max_width and width > max_width:
+        height = height * max_width // width
+        width = max_width
+    return max(16, width // 16 * 16), max(16, height // 16 * 16)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 屏幕截图
+
+通过 `adb exec-out screencap` 把截图直接读入内存，不在设备存储上生成临时文件，
+因此多个调用方可以同时截图。
+"""
+
+import struct
+from typing import Tuple
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# 在设备端编码PNG并直接写到stdout的截图命令
+PNG_CAPTURE_COMMAND = ['exec-out', 'screencap', '-p']
+
+
+def capture_png(executor) -> bytes:
+    """在设备上截图并返回PNG数据
+
+    Args:
+        executor: ADBExecutor实例
+
+    Returns:
+        PNG图片数据
+
+    Raises:
+        ADBCommandError: adb命令执行失败
+        ValueError: 设备返回的数据不是PNG图片
+    """
+    return check_png(executor.execute_binary(PNG_CAPTURE_COMMAND))
+
+
+def check_png(data: bytes) -> bytes:
+    """检查截图命令的输出是否为PNG图片，是则原样返回
+
+    Raises:
+        ValueError: 数据不是PNG图片
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError(f"截图数据无效: {data[:64]!r}")
+    return data
+
+
+def png_size(data: bytes) -> Tuple[int, int]:
+    """从PNG的IHDR块读取图片宽高"""
+    if len(data) < 24 or not data.startswith(PNG_SIGNATURE):
+        return 0, 0
+    return struct.unpack('>II', data[16:24])
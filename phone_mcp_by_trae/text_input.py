@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 文本输入
+
+把要输入的文本拆成若干步骤，再打包成尽量少的shell脚本，每个脚本通过一次 `adb shell` 调用执行：
+
+    input     可打印ASCII按块使用 `input text`(单引号转义，空格写作%s)，换行和制表符使用按键事件
+    ime       通过ADBKeyboard输入法的 ADB_INPUT_B64 广播输入任意Unicode文本，
+              第一个脚本切换到ADBKeyboard并输出原输入法，包含最后一步的脚本恢复原输入法
+
+每一步成功后输出带序号的标记行，脚本本身总是以0退出以便取回输出；某个脚本中途失败时，
+下一次调用从失败的步骤继续，不必重新输入已经完成的部分。
+"""
+
+import base64
+from typing import List, Optional
+
+from phone_mcp_by_trae.adb_shell import new_marker, quote_shell_arg
+
+# ADBKeyboard输入法 (https://github.com/senzhk/ADBKeyBoard)
+ADB_KEYBOARD_IME = 'com.android.adbkeyboard/.AdbIME'
+ADB_INPUT_B64_ACTION = 'ADB_INPUT_B64'
+
+METHOD_INPUT = 'input'
+METHOD_IME = 'ime'
+METHODS = (METHOD_INPUT, METHOD_IME)
+
+# 每条 `input text` 命令的最大字符数，每条命令都要在设备上启动一次input程序，块越大调用越少
+INPUT_TEXT_CHUNK = 500
+# 每条广播的最大字符数(base64编码后约为UTF-8字节数的4/3)
+IME_TEXT_CHUNK = 500
+# 单个shell脚本的最大字节数，老版本adb对shell命令长度限制为4KB左右
+MAX_SCRIPT_BYTES = 4000
+# 切换输入法后等待输入法连接到输入框的时间(秒)
+IME_SWITCH_DELAY = 0.3
+
+# 不能通过 `input text` 输入、需要按键事件的字符
+_KEY_CHARACTERS = {'\n': '66', '\t': '61'}
+
+# 查询已安装的输入法
+IME_LIST_COMMAND = 'ime list -a -s'
+
+
+def needs_ime(text: str) -> bool:
+    """文本中是否有 `input text` 无法输入的字符(非ASCII或控制字符)"""
+    return any(not (' ' <= char <= '~') and char not in _KEY_CHARACTERS for char in text)
+
+
+def _split_ascii(text: str, chunk_size: int) -> List[str]:
+    """把ASCII文本切块；`input text` 会把 %s 转换为空格，因此在 % 之后断开，使两者落在不同命令中"""
+    pieces = []  # type: List[str]
+    start = 0
+    for index in range(len(text) - 1):
+        if text[index] == '%' and text[index + 1] == 's':
+            pieces.append(text[start:index + 1])
+            start = index + 1
+    pieces.append(text[start:])
+    chunks = []  # type: List[str]
+    for piece in pieces:
+        chunks.extend(piece[offset:offset + chunk_size] for offset in range(0, len(piece), chunk_size))
+    return [chunk for chunk in chunks if chunk]
+
+
+def input_steps(text: str, chunk_size: int = INPUT_TEXT_CHUNK) -> List[str]:
+    """使用 `input text` 和按键事件输入文本的命令列表
+
+    Raises:
+        ValueError: 文本包含只能通过输入法输入的字符
+    """
+    if needs_ime(text):
+        raise ValueError("文本包含非ASCII字符，需要安装并使用ADBKeyboard输入法")
+    steps = []  # type: List[str]
+    run = []  # type: List[str]
+    for char in text + '\0':
+        if char in _KEY_CHARACTERS or char == '\0':
+            if run:
+                # 空格写作%s，整体用单引号包裹
+                steps.extend(f"input text {quote_shell_arg(chunk.replace(' ', '%s'))}"
+                             for chunk in _split_ascii(''.join(run), chunk_size))
+                run = []
+            if char != '\0':
+                steps.append(f"input keyevent {_KEY_CHARACTERS[char]}")
+        else:
+            run.append(char)
+    return steps
+
+
+def ime_steps(text: str, chunk_size: int = IME_TEXT_CHUNK) -> List[str]:
+    """通过ADBKeyboard广播输入文本的命令列表"""
+    return [
+        f"am broadcast -a {ADB_INPUT_B64_ACTION} --es msg "
+        + base64.b64encode(text[offset:offset + chunk_size].encode('utf-8')).decode('ascii')
+        for offset in range(0, len(text), chunk_size)
+    ]
+
+
+def text_command(text: str) -> str:
+    """在一条shell命令中输入文本，用于批量输入和宏
+
+    ASCII文本使用input_steps；其余文本临时切换到ADBKeyboard，通过ime_steps的广播输入后恢复原输入法。
+    命令的退出码为输入步骤的结果。
+    """
+    if not needs_ime(text):
+        return ' && '.join(input_steps(text)) or 'true'
+    ime = quote_shell_arg(ADB_KEYBOARD_IME)
+    return (f"p=$(settings get secure default_input_method); ime enable {ime} >/dev/null 2>&1; "
+            f"ime set {ime} >/dev/null 2>&1; sleep {IME_SWITCH_DELAY}; "
+            f"{' && '.join(ime_steps(text))}; r=$?; "
+            f"if [ -n \"$p\" ] && [ \"$p\" != null ]; then ime set \"$p\" >/dev/null 2>&1; fi; [ $r = 0 ]")
+
+
+def parse_installed_imes(output: str) -> List[str]:
+    """解析 `ime list -a -s` 的输出"""
+    return [line.strip() for line in output.splitlines() if '/' in line]
+
+
+class TextEntryPlan:
+    """一次文本输入的步骤和进度
+
+    用法::
+
+        plan = TextEntryPlan(text)
+        while not plan.done:
+            if not plan.update(run_shell(plan.next_script())):
+                break  # 没有任何进展
+    """
+
+    def __init__(self, text: str, method: str = METHOD_INPUT, chunk_size: Optional[int] = None,
+                 max_script_bytes: int = MAX_SCRIPT_BYTES, switch_ime: bool = True):
+        """拆分文本
+
+        Args:
+            text: 要输入的文本
+            method: input 或 ime
+            chunk_size: 每条命令的最大字符数，默认按method选择
+            max_script_bytes: 单个脚本的最大字节数，超过时拆成多个脚本
+            switch_ime: ime方式是否在脚本中切换到ADBKeyboard并在结束后恢复原输入法
+
+        Raises:
+            ValueError: 方式未知，或input方式遇到无法输入的字符
+        """
+        if method not in METHODS:
+            raise ValueError(f"未知的文本输入方式: {method}")
+        self.method = method
+        if method == METHOD_IME:
+            self.steps = ime_steps(text, chunk_size or IME_TEXT_CHUNK)
+        else:
+            self.steps = input_steps(text, chunk_size or INPUT_TEXT_CHUNK)
+        self.max_script_bytes = max_script_bytes
+        self.switch_ime = switch_ime and method == METHOD_IME
+        self.marker = new_marker()
+        # 切换前的输入法，由第一个脚本输出
+        self.previous_ime = None  # type: Optional[str]
+        self.completed = 0
+        self.scripts = 0
+        # 最近一个脚本中除标记行以外的输出，即失败步骤的错误信息
+        self.details = ''
+
+    @property
+    def done(self) -> bool:
+        return self.completed >= len(self.steps)
+
+    def next_script(self) -> str:
+        """从第一个未完成的步骤开始，打包不超过max_script_bytes的脚本(至少包含一步)"""
+        prefix = ''
+        if self.switch_ime and self.previous_ime is None:
+            ime = quote_shell_arg(ADB_KEYBOARD_IME)
+            prefix = (f"prev=$(settings get secure default_input_method); echo {self.marker} ime $prev; "
+                      f"ime enable {ime} >/dev/null 2>&1; ime set {ime} >/dev/null 2>&1 && "
+                      f"sleep {IME_SWITCH_DELAY} && ")
+        restore = self.restore_command()
+        # 预留恢复输入法的长度，最后一步无论落在哪个脚本中都能带上它
+        size = len(prefix) + len(restore or '') + 40
+        parts = []  # type: List[str]
+        for index in range(self.completed, len(self.steps)):
+            part = f"{self.steps[index]} 2>&1 && echo {self.marker} {index}"
+            if parts and size + len(part) + 4 > self.max_script_bytes:
+                break
+            parts.append(part)
+            size += len(part) + 4
+        script = prefix + ' && '.join(parts)
+        if self.switch_ime and self.completed + len(parts) == len(self.steps):
+            # 包含最后一步的脚本恢复原输入法；第一个脚本中原输入法保存在shell变量prev里
+            script += f"; {restore}" if restore else "; " + self._restore_shell('"$prev"')
+        self.scripts += 1
+        return script + '; true'
+
+    def _restore_shell(self, previous: str) -> str:
+        ime = quote_shell_arg(ADB_KEYBOARD_IME)
+        return (f"if [ -n {previous} ] && [ {previous} != null ] && [ {previous} != {ime} ]; "
+                f"then ime set {previous} >/dev/null 2>&1; fi")
+
+    def restore_command(self) -> Optional[str]:
+        """恢复原输入法的命令，没有切换过输入法时返回None；放弃输入时应执行该命令"""
+        if not self.switch_ime or self.previous_ime is None:
+            return None
+        return self._restore_shell(quote_shell_arg(self.previous_ime))
+
+    def update(self, output: str) -> int:
+        """根据脚本输出中的标记更新进度，输出中其余的内容是失败步骤的错误信息
+
+        Returns:
+            本次新完成的步骤数
+        """
+        completed = self.completed
+        details = []  # type: List[str]
+        for line in output.splitlines():
+            index = line.find(self.marker)
+            if index < 0:
+                details.append(line)
+                continue
+            fields = line[index + len(self.marker):].split()
+            if fields and fields[0] == 'ime':
+                self.previous_ime = fields[1] if len(fields) > 1 else ''
+            elif fields and fields[0].isdigit():
+                completed = max(completed, int(fields[0]) + 1)
+        progressed = completed - self.completed
+        self.completed = completed
+        self.details = '\n'.join(details).strip()
+        return progressed
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 原始触摸事件
+
+`input tap` / `input swipe` 每次都要在设备上启动一个Java进程，耗时数百毫秒。这里改为直接向触摸屏的
+/dev/input/eventN 写入Linux多点触控事件：第一次使用时通过 `getevent -pl` 找到触摸屏及其坐标范围并缓存，
+之后把手势编译成一个 `sendevent` 脚本，通过一次shell调用(session后端下为常驻shell)执行。
+
+手势由若干手指的轨迹组成，每条轨迹是按时间排列的关键点 (毫秒, x, y)，手指在第一个关键点按下、
+最后一个关键点抬起，中间线性插值。因此点击、长按、滑动、双指缩放和任意多指手势都用同一种方式表示。
+
+坐标与 `input tap` 相同，使用屏幕当前方向下的坐标；触摸屏使用自然方向(竖屏，与 `wm size` 的尺寸一致)的坐标，
+编译时按屏幕方向换算。脚本在设备上先检查屏幕方向，与编译时假定的方向不同则不注入，只输出实际方向，
+由调用方按实际方向重新编译。
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from phone_mcp_by_trae.device_state import ROTATION_PROBE, parse_rotation
+from phone_mcp_by_trae.text_input import MAX_SCRIPT_BYTES
+
+# linux/input-event-codes.h
+EV_SYN = 0
+EV_KEY = 1
+EV_ABS = 3
+SYN_REPORT = 0
+SYN_MT_REPORT = 2
+BTN_TOOL_FINGER = 0x145
+BTN_TOUCH = 0x14a
+ABS_MT_SLOT = 0x2f
+ABS_MT_TOUCH_MAJOR = 0x30
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+ABS_MT_PRESSURE = 0x3a
+
+# 一次读取触摸屏信息和屏幕尺寸，两部分之间以该行分隔
+DISCOVERY_SEPARATOR = '__PHONE_MCP_WM_SIZE__'
+DISCOVERY_COMMAND = f"getevent -pl 2>/dev/null; echo {DISCOVERY_SEPARATOR}; wm size"
+
+# 单指操作(tap、swipe、long_press)的注入方式，由环境变量 PHONE_MCP_TOUCH_ENGINE 选择
+ENGINE_INPUT = 'input'          # input命令
+ENGINE_SENDEVENT = 'sendevent'  # 写入原始触摸事件，设备不支持时回退到input命令
+ENGINES = (ENGINE_INPUT, ENGINE_SENDEVENT)
+
+# 屏幕方向与编译时不同时输出的标记
+ROTATION_MARKER = '__PHONE_MCP_ROTATION__'
+
+# 轨迹采样间隔(毫秒)，每帧的各个事件之后插入一次sleep
+DEFAULT_FRAME_MS = 16
+# 点击时手指按下的时间(毫秒)
+TAP_DURATION_MS = 40
+
+_DEVICE_PATTERN = re.compile(r'^add device \d+: (\S+)')
+_AXIS_PATTERN = re.compile(r'(ABS_MT_\w+)\s*:\s*value -?\d+, min (-?\d+), max (-?\d+)')
+
+# 一条轨迹: [(毫秒, x, y), ...]
+Track = List[Tuple[float, float, float]]
+
+
+class TouchDevice:
+    """触摸屏的事件设备和坐标范围"""
+
+    def __init__(self, path: str, name: str = ''):
+        self.path = path
+        self.name = name
+        self.axes = {}  # type: Dict[str, Tuple[int, int]]
+        self.keys = set()  # type: set
+        self.direct = False
+        self.screen_size = None  # type: Optional[Tuple[int, int]]
+
+    @property
+    def is_touchscreen(self) -> bool:
+        return 'ABS_MT_POSITION_X' in self.axes and 'ABS_MT_POSITION_Y' in self.axes
+
+    @property
+    def slots(self) -> int:
+        """type B协议下支持的手指数，0表示type A协议"""
+        if 'ABS_MT_SLOT' not in self.axes:
+            return 0
+        return self.axes['ABS_MT_SLOT'][1] + 1
+
+    def scale(self, x: float, y: float, rotation: int = 0) -> Tuple[int, int]:
+        """把屏幕当前方向下的坐标换算为触摸屏的原始坐标
+
+        Args:
+            x: X坐标
+            y: Y坐标
+            rotation: 屏幕方向，0-3分别为自然方向和逆时针旋转90、180、270度
+        """
+        width, height = self.screen_size or (0, 0)
+        x_min, x_max = self.axes['ABS_MT_POSITION_X']
+        y_min, y_max = self.axes['ABS_MT_POSITION_Y']
+        if width <= 0 or height <= 0:
+            return int(x), int(y)
+        # 与InputReader把触摸屏坐标转换为屏幕坐标的方式相反
+        if rotation == 1:
+            x, y = width - 1 - y, x
+        elif rotation == 2:
+            x, y = width - 1 - x, height - 1 - y
+        elif rotation == 3:
+            x, y = y, height - 1 - x
+        raw_x = x_min + x * (x_max - x_min + 1) / width
+        raw_y = y_min + y * (y_max - y_min + 1) / height
+        return min(max(int(raw_x), x_min), x_max), min(max(int(raw_y), y_min), y_max)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'path': self.path,
+            'name': self.name,
+            'x_range': list(self.axes['ABS_MT_POSITION_X']),
+            'y_range': list(self.axes['ABS_MT_POSITION_Y']),
+            'slots': self.slots,
+            'screen_size': list(self.screen_size) if self.screen_size else None
+        }
+
+
+def parse_getevent(output: str) -> List[TouchDevice]:
+    """解析 `getevent -pl` 的输出，返回所有支持多点触控坐标的设备，直接触摸的屏幕排在前面"""
+    devices = []  # type: List[TouchDevice]
+    current = None  # type: Optional[TouchDevice]
+    section = ''
+    for line in output.splitlines():
+        match = _DEVICE_PATTERN.match(line)
+        if match:
+            current = TouchDevice(match.group(1))
+            devices.append(current)
+            section = ''
+            continue
+        if current is None:
+            continue
+        stripped = line.strip()
+        if stripped.startswith('name:'):
+            current.name = stripped[len('name:'):].strip().strip('"')
+            continue
+        if stripped.startswith(('KEY (', 'ABS (', 'REL (', 'SW (', 'LED (', 'MSC (')):
+            section = stripped.split(' ', 1)[0]
+            stripped = stripped.split(':', 1)[1] if ':' in stripped else ''
+        elif stripped.startswith('input props:'):
+            section = 'PROPS'
+            continue
+        if section == 'KEY':
+            current.keys.update(stripped.split())
+        elif section == 'ABS':
+            axis = _AXIS_PATTERN.search(line)
+            if axis:
+                current.axes[axis.group(1)] = (int(axis.group(2)), int(axis.group(3)))
+        elif section == 'PROPS' and 'INPUT_PROP_DIRECT' in stripped:
+            current.direct = True
+    touchscreens = [device for device in devices if device.is_touchscreen]
+    touchscreens.sort(key=lambda device: not device.direct)
+    return touchscreens
+
+
+def discover(output: str) -> Optional[TouchDevice]:
+    """解析DISCOVERY_COMMAND的输出，没有找到触摸屏时返回None"""
+    from phone_mcp_by_trae.screen_stream import parse_screen_size
+
+    events, _, size = output.partition(DISCOVERY_SEPARATOR)
+    touchscreens = parse_getevent(events)
+    if not touchscreens:
+        return None
+    device = touchscreens[0]
+    device.screen_size = parse_screen_size(size)
+    return device
+
+
+# ---- 手势 ----
+
+def tap_tracks(x: float, y: float, duration: float = TAP_DURATION_MS) -> List[Track]:
+    """单指点击，duration较长时即为长按"""
+    return [[(0, x, y), (duration, x, y)]]
+
+
+def swipe_tracks(x1: float, y1: float, x2: float, y2: float, duration: float) -> List[Track]:
+    """单指滑动"""
+    return [[(0, x1, y1), (max(duration, 1), x2, y2)]]
+
+
+def pinch_tracks(x: float, y: float, start_distance: float, end_distance: float,
+                 duration: float, angle: float = 0) -> List[Track]:
+    """以(x, y)为中心的双指缩放，两指间距从start_distance变为end_distance，angle为两指连线的角度(度)"""
+    dx, dy = math.cos(math.radians(angle)) / 2, math.sin(math.radians(angle)) / 2
+    duration = max(duration, 1)
+    return [
+        [(0, x - dx * start_distance, y - dy * start_distance), (duration, x - dx * end_distance, y - dy * end_distance)],
+        [(0, x + dx * start_distance, y + dy * start_distance), (duration, x + dx * end_distance, y + dy * end_distance)],
+    ]
+
+
+def parse_tracks(fingers: Sequence[Sequence[Dict[str, float]]]) -> List[Track]:
+    """把 [[{"x":..,"y":..,"t":..}, ...], ...] 形式的参数转换为轨迹，t为毫秒
+
+    Raises:
+        ValueError: 参数格式错误
+    """
+    tracks = []  # type: List[Track]
+    for finger in fingers:
+        track = sorted((float(point.get('t', 0)), float(point['x']), float(point['y'])) for point in finger)
+        if not track:
+            raise ValueError("手指轨迹不能为空")
+        tracks.append(track)
+    if not tracks:
+        raise ValueError("至少需要一个手指")
+    return tracks
+
+
+def _position(track: Track, time_ms: float) -> Tuple[float, float]:
+    """轨迹在某一时刻的位置(线性插值)"""
+    if time_ms <= track[0][0]:
+        return track[0][1], track[0][2]
+    for (t0, x0, y0), (t1, x1, y1) in zip(track, track[1:]):
+        if time_ms <= t1:
+            ratio = (time_ms - t0) / (t1 - t0) if t1 > t0 else 1.0
+            return x0 + (x1 - x0) * ratio, y0 + (y1 - y0) * ratio
+    return track[-1][1], track[-1][2]
+
+
+def compile_gesture(device: TouchDevice, tracks: List[Track], frame_ms: float = DEFAULT_FRAME_MS,
+                    rotation: int = 0, max_script_bytes: int = MAX_SCRIPT_BYTES) -> str:
+    """把手势编译为sendevent脚本
+
+    按frame_ms采样所有手指，每帧只写入发生变化的坐标，以SYN_REPORT结束并等待到下一帧。
+    为缩短脚本，脚本先定义函数 e() 调用sendevent。脚本先检查屏幕方向，与rotation不同时不注入，
+    只输出 "ROTATION_MARKER <方向查询结果>"，见parse_rotation_mismatch。
+
+    脚本超过max_script_bytes时加倍采样间隔重新编译：被截断的脚本会丢掉抬起事件，使手指一直按在屏幕上。
+
+    Raises:
+        ValueError: 手指数超过触摸屏支持的数量，或者只保留关键点时脚本仍然超过长度限制
+    """
+    if device.slots and len(tracks) > device.slots:
+        raise ValueError(f"触摸屏最多支持 {device.slots} 个手指")
+    frame_ms = max(frame_ms, 1)
+    end_ms = max(track[-1][0] for track in tracks)
+    while True:
+        script = _compile_frames(device, tracks, frame_ms, end_ms, rotation)
+        if len(script.encode('utf-8')) <= max_script_bytes:
+            return script
+        if frame_ms >= end_ms:
+            raise ValueError(f"手势的关键点过多，脚本超过 {max_script_bytes} 字节")
+        frame_ms *= 2
+
+
+def _compile_frames(device: TouchDevice, tracks: List[Track], frame_ms: float, end_ms: float, rotation: int) -> str:
+    """按固定采样间隔编译脚本，见compile_gesture"""
+    times = sorted({track[0][0] for track in tracks} | {track[-1][0] for track in tracks}
+                   | {index * frame_ms for index in range(int(end_ms // frame_ms) + 1)})
+
+    lines = [f"e() {{ sendevent {device.path} $1 $2 $3; }}"]
+    positions = {}  # type: Dict[int, Tuple[int, int]]
+    previous_ms = None  # type: Optional[float]
+
+    for time_ms in times:
+        # 先把这一时刻按下的手指移动到各自的位置(包括在此时抬起的手指的终点)，再抬起结束的手指
+        moved = {}  # type: Dict[int, Tuple[int, int]]
+        for index, track in enumerate(tracks):
+            if track[0][0] <= time_ms <= track[-1][0]:
+                moved[index] = device.scale(*_position(track, time_ms), rotation)
+        lifted = [index for index, track in enumerate(tracks) if track[-1][0] == time_ms and index in moved]
+        frames = [_move_events(device, positions, moved)]
+        if lifted:
+            frames.append(_lift_events(device, positions, lifted))
+        for frame in frames:
+            if not frame:
+                continue
+            if previous_ms is not None and time_ms > previous_ms:
+                lines.append(f"sleep {(time_ms - previous_ms) / 1000:.3f}")
+            lines.extend(frame)
+            lines.append(f"e {EV_SYN} {SYN_REPORT} 0")
+            previous_ms = time_ms
+    # 查询不到方向时按编译时的方向注入
+    return (f"r=$({ROTATION_PROBE}); case \"$r\" in ''|*'Orientation: {rotation}'*|*'orientation={rotation}'*) "
+            + '; '.join(lines) + f';; *) echo "{ROTATION_MARKER} $r";; esac')
+
+
+def parse_rotation_mismatch(output: str) -> Optional[int]:
+    """脚本因屏幕方向不同而没有注入时返回实际方向，否则返回None"""
+    position = output.find(ROTATION_MARKER)
+    if position < 0:
+        return None
+    return parse_rotation(output[position + len(ROTATION_MARKER):])
+
+
+def _button_events(device: TouchDevice, value: int) -> List[str]:
+    events = [f"e {EV_KEY} {BTN_TOUCH} {value}"]
+    if 'BTN_TOOL_FINGER' in device.keys:
+        events.append(f"e {EV_KEY} {BTN_TOOL_FINGER} {value}")
+    return events
+
+
+def _type_a_report(positions: Dict[int, Tuple[int, int]]) -> List[str]:
+    """type A协议每次报告所有按下的手指，各手指之间以SYN_MT_REPORT分隔"""
+    events = []  # type: List[str]
+    for x, y in positions.values():
+        events.extend((f"e {EV_ABS} {ABS_MT_POSITION_X} {x}", f"e {EV_ABS} {ABS_MT_POSITION_Y} {y}",
+                       f"e {EV_SYN} {SYN_MT_REPORT} 0"))
+    return events or [f"e {EV_SYN} {SYN_MT_REPORT} 0"]
+
+
+def _move_events(device: TouchDevice, positions: Dict[int, Tuple[int, int]],
+                 moved: Dict[int, Tuple[int, int]]) -> List[str]:
+    """按下或移动手指的事件(不含SYN_REPORT)，更新positions"""
+    changed = {index: point for index, point in moved.items() if positions.get(index) != point}
+    if not changed:
+        return []
+    first = not positions
+    events = []  # type: List[str]
+    if device.slots:
+        pressure = device.axes.get('ABS_MT_PRESSURE')
+        major = device.axes.get('ABS_MT_TOUCH_MAJOR')
+        for index, (x, y) in changed.items():
+            old = positions.get(index)
+            events.append(f"e {EV_ABS} {ABS_MT_SLOT} {index}")
+            if old is None:
+                events.append(f"e {EV_ABS} {ABS_MT_TRACKING_ID} {index + 1}")
+                if pressure:
+                    events.append(f"e {EV_ABS} {ABS_MT_PRESSURE} {max(1, pressure[1] // 2)}")
+                if major:
+                    events.append(f"e {EV_ABS} {ABS_MT_TOUCH_MAJOR} {max(1, major[1] // 8)}")
+            if old is None or old[0] != x:
+                events.append(f"e {EV_ABS} {ABS_MT_POSITION_X} {x}")
+            if old is None or old[1] != y:
+                events.append(f"e {EV_ABS} {ABS_MT_POSITION_Y} {y}")
+    positions.update(changed)
+    if not device.slots:
+        events = _type_a_report(positions)
+    if first:
+        events.extend(_button_events(device, 1))
+    return events
+
+
+def _lift_events(device: TouchDevice, positions: Dict[int, Tuple[int, int]], lifted: List[int]) -> List[str]:
+    """抬起手指的事件(不含SYN_REPORT)，更新positions"""
+    events = []  # type: List[str]
+    for index in lifted:
+        del positions[index]
+        if device.slots:
+            events.extend((f"e {EV_ABS} {ABS_MT_SLOT} {index}", f"e {EV_ABS} {ABS_MT_TRACKING_ID} -1"))
+    if not device.slots:
+        events = _type_a_report(positions)
+    if not positions:
+        events.extend(_button_events(device, 0))
+    return events
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 界面层级索引
+
+通过 `adb exec-out uiautomator dump /dev/tty` 直接获取界面XML，不经过设备存储，
+解析为使用 `__slots__` 的紧凑节点树，并按文本、resource-id、content-desc和类名建立索引。
+"""
+
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+# 可按字段查询的索引名
+SEARCH_FIELDS = ('text', 'resource_id', 'content_desc', 'class_name')
+
+# 把界面XML直接写到stdout的dump命令
+DUMP_COMMAND = ['exec-out', 'uiautomator', 'dump', '/dev/tty']
+
+
+class UINode:
+    """界面层级中的单个节点"""
+
+    __slots__ = ('index', 'text', 'resource_id', 'content_desc', 'class_name', 'package',
+                 'bounds', 'clickable', 'enabled', 'checked', 'focused', 'scrollable',
+                 'selected', 'depth', 'parent')
+
+    def __init__(self, index: int, attrib: Dict[str, str], depth: int, parent: Optional[int]):
+        self.index = index
+        self.text = attrib.get('text', '')
+        self.resource_id = attrib.get('resource-id', '')
+        self.content_desc = attrib.get('content-desc', '')
+        self.class_name = attrib.get('class', '')
+        self.package = attrib.get('package', '')
+        self.bounds = parse_bounds(attrib.get('bounds', ''))
+        self.clickable = attrib.get('clickable') == 'true'
+        self.enabled = attrib.get('enabled') == 'true'
+        self.checked = attrib.get('checked') == 'true'
+        self.focused = attrib.get('focused') == 'true'
+        self.scrollable = attrib.get('scrollable') == 'true'
+        self.selected = attrib.get('selected') == 'true'
+        self.depth = depth
+        self.parent = parent
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        """节点区域的中心坐标"""
+        left, top, right, bottom = self.bounds
+        return (left + right) // 2, (top + bottom) // 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为精简的字典，省略空字段和默认值"""
+        data = {'index': self.index}  # type: Dict[str, Any]
+        for name in ('text', 'resource_id', 'content_desc'):
+            value = getattr(self, name)
+            if value:
+                data[name] = value
+        data['class'] = self.class_name.rsplit('.', 1)[-1]
+        data['bounds'] = list(self.bounds)
+        for name in ('clickable', 'checked', 'focused', 'scrollable', 'selected'):
+            if getattr(self, name):
+                data[name] = True
+        if not self.enabled:
+            data['enabled'] = False
+        return data
+
+
+def parse_bounds(value: str) -> Tuple[int, int, int, int]:
+    """解析 "[left,top][right,bottom]" 格式的区域"""
+    match = _BOUNDS_PATTERN.match(value)
+    if not match:
+        return 0, 0, 0, 0
+    return tuple(int(group) for group in match.groups())
+
+
+class UIIndex:
+    """解析后的界面层级及其查询索引"""
+
+    def __init__(self, nodes: List[UINode]):
+        self.nodes = nodes
+        # 字段 -> 小写值 -> 节点序号列表
+        self._indexes = {field: {} for field in SEARCH_FIELDS}  # type: Dict[str, Dict[str, List[int]]]
+        for node in nodes:
+            for field in SEARCH_FIELDS:
+                value = getattr(node, field)
+                if value:
+                    self._indexes[field].setdefault(value.lower(), []).append(node.index)
+            if node.resource_id and ':id/' in node.resource_id:
+                # 同时支持不带包名前缀的短ID
+                short_id = node.resource_id.split(':id/', 1)[1].lower()
+                self._indexes['resource_id'].setdefault(short_id, []).append(node.index)
+
+    def find(self, query: str, by: str = 'any', exact: bool = False) -> List[UINode]:
+        """查询节点
+
+        Args:
+            query: 查询内容，不区分大小写
+            by: 查询字段，any 或 text、resource_id、content_desc、class_name 之一
+            exact: 是否要求完全匹配，否则按包含匹配(完全匹配的结果排在前面)
+
+        Returns:
+            匹配的节点列表，按文档顺序排列
+        """
+        fields = SEARCH_FIELDS if by == 'any' else (by,)
+        for field in fields:
+            if field not in self._indexes:
+                raise ValueError(f"未知的查询字段: {by}")
+        key = query.lower()
+        exact_matches = set()  # type: set
+        partial_matches = set()  # type: set
+        for field in fields:
+            index = self._indexes[field]
+            exact_matches.update(index.get(key, ()))
+            if not exact:
+                for value, node_indexes in index.items():
+                    if key in value:
+                        partial_matches.update(node_indexes)
+        ordered = sorted(exact_matches) + sorted(partial_matches - exact_matches)
+        return [self.nodes[index] for index in ordered]
+
+    def interesting_nodes(self) -> List[UINode]:
+        """返回有文本、描述、ID或可交互的节点，用于精简输出"""
+        return [
+            node for node in self.nodes
+            if node.text or node.content_desc or node.resource_id or node.clickable or node.scrollable
+        ]
+
+
+def parse_hierarchy(xml_text: str) -> UIIndex:
+    """把uiautomator输出的XML解析为UIIndex
+
+    exec-out方式的输出在XML之后还带有一行提示信息，这里只截取XML部分。
+    """
+    start = xml_text.find('<?xml')
+    if start < 0:
+        start = xml_text.find('<hierarchy')
+    end = xml_text.rfind('</hierarchy>')
+    if start < 0 or end < 0:
+        raise ValueError(f"无法解析界面层级: {xml_text[:200]}")
+    root = ET.fromstring(xml_text[start:end + len('</hierarchy>')])
+
+    nodes = []  # type: List[UINode]
+    stack = [(child, 0, None) for child in reversed(list(root))]
+    while stack:
+        element, depth, parent = stack.pop()
+        node = UINode(len(nodes), element.attrib, depth, parent)
+        nodes.append(node)
+        for child in reversed(list(element)):
+            stack.append((child, depth + 1, node.index))
+    return UIIndex(nodes)
+
+
+class UICache:
+    """按设备缓存界面索引，设备上执行输入操作后失效
+
+    前台状态(device_state)也使用这个缓存，另外设置ttl：屏幕超时等变化不经过输入，缓存最长保留ttl秒。
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self._entries = {}  # type: Dict[Any, Tuple[float, Any]]
+        self._generations = {}  # type: Dict[Any, int]
+        self._lock = threading.Lock()
+
+    def generation(self, key: Any) -> int:
+        """返回设备当前的失效计数，开始dump前记录"""
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def get_entry(self, key: Any) -> Optional[Tuple[float, Any]]:
+        """返回 (缓存时间, 缓存内容)，没有缓存或已超过ttl时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+                return None
+            return entry
+
+    def get(self, key: Any) -> Optional[UIIndex]:
+        """取出设备的缓存索引"""
+        entry = self.get_entry(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: Any, index: Any, generation: int) -> None:
+        """保存索引；如果dump期间设备已有输入操作，则不缓存"""
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic(), index)
+
+    def invalidate(self, key: Any) -> None:
+        """使设备的缓存失效"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
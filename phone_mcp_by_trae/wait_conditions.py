@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trae Phone MCP - 设备端等待
+
+把"等待某个条件成立"编译成一个在设备上运行的shell循环：每隔interval秒查询一次状态，条件成立或超时后
+输出一行带标记的结果和最后一次查询到的值。整个等待只需一次adb调用，不必在主机上反复轮询或猜测固定的等待时间。
+
+条件：
+    activity      前台Activity包含value，例如 ".MainActivity" 或 "com.android.settings/.Settings"
+    package       前台应用的包名等于value
+    focus         获得焦点的窗口包含value；value为空时等待焦点窗口发生变化
+    call_state    通话状态为value：idle、ringing 或 offhook
+    text          界面中出现value(文本、content-desc或resource-id中的片段)
+"""
+
+import math
+from typing import Any, Dict, Tuple
+
+from phone_mcp_by_trae.adb_shell import quote_shell_arg
+
+CONDITION_ACTIVITY = 'activity'
+CONDITION_PACKAGE = 'package'
+CONDITION_FOCUS = 'focus'
+CONDITION_CALL_STATE = 'call_state'
+CONDITION_TEXT = 'text'
+CONDITIONS = (CONDITION_ACTIVITY, CONDITION_PACKAGE, CONDITION_FOCUS, CONDITION_CALL_STATE, CONDITION_TEXT)
+
+# 通话状态名称 -> TelephonyManager.CALL_STATE_*
+CALL_STATES = {'idle': '0', 'ringing': '1', 'offhook': '2'}
+
+# 查询状态的命令，输出只保留相关的一行
+RESUMED_ACTIVITY_PROBE = "dumpsys activity activities | grep -m1 -E 'mResumedActivity|topResumedActivity'"
+FOCUS_PROBE = "dumpsys window | grep -m1 mCurrentFocus"
+CALL_STATE_PROBE = "dumpsys telephony.registry | grep -m1 mCallState"
+# 界面层级写到设备上的临时文件，只把是否找到传回；文件名带上结果行的标记，同一设备上的多个等待互不覆盖
+UI_DUMP_FILE = '/data/local/tmp/phone_mcp_wait{marker}.xml'
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_INTERVAL = 0.3
+
+
+def _condition_shell(condition: str, value: str, dump_file: str) -> Tuple[str, str, str]:
+    """返回 (循环前的初始化命令, 把当前值写入$v的查询命令, 判断条件的shell命令)
+
+    Raises:
+        ValueError: 条件未知或缺少value
+    """
+    if condition not in CONDITIONS:
+        raise ValueError(f"未知的等待条件: {condition}，可用条件: {', '.join(CONDITIONS)}")
+    if not value and condition != CONDITION_FOCUS:
+        raise ValueError(f"等待条件 {condition} 需要指定value")
+
+    if condition == CONDITION_ACTIVITY:
+        return '', f"v=$({RESUMED_ACTIVITY_PROBE})", f'case "$v" in *{quote_shell_arg(value)}*) true;; *) false;; esac'
+    if condition == CONDITION_PACKAGE:
+        # ActivityRecord{hash u0 包名/Activity t任务}
+        return '', f"v=$({RESUMED_ACTIVITY_PROBE})", f'case "$v" in *{quote_shell_arg(" " + value + "/")}*) true;; *) false;; esac'
+    if condition == CONDITION_FOCUS:
+        if value:
+            return '', f"v=$({FOCUS_PROBE})", f'case "$v" in *{quote_shell_arg(value)}*) true;; *) false;; esac'
+        return f"f0=$({FOCUS_PROBE})", f"v=$({FOCUS_PROBE})", '[ "$v" != "$f0" ]'
+    if condition == CONDITION_CALL_STATE:
+        state = CALL_STATES.get(value.lower())
+        if state is None:
+            raise ValueError(f"未知的通话状态: {value}，可用状态: {', '.join(CALL_STATES)}")
+        return '', f"v=$({CALL_STATE_PROBE})", f'case "$v" in *mCallState={state}*) true;; *) false;; esac'
+    # 界面层级中的文本经过XML转义
+    escaped = quote_shell_arg(value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                              .replace('"', '&quot;'))
+    return ('', f"v=; uiautomator dump {dump_file} >/dev/null 2>&1 && grep -q -F -e {escaped} {dump_file} && v=found",
+            '[ -n "$v" ]')
+
+
+def compile_wait(condition: str, value: str, marker: str, timeout: float = DEFAULT_TIMEOUT,
+                 interval: float = DEFAULT_INTERVAL, absent: bool = False) -> str:
+    """编译等待脚本
+
+    脚本结束时输出 "<标记> ok|timeout <查询次数>"，下一行是最后一次查询到的值。脚本总是以0退出。
+    超时按设备时钟的整秒计算：开始时刻只精确到秒，截止时间取timeout向上取整再加1秒，
+    实际等待不会短于timeout，但可能超出将近2秒(例如timeout=0.5时最多等待2秒)，另加最后一次查询的时间。
+    text条件的临时dump文件在脚本结束时删除。
+
+    Args:
+        condition: 条件，见CONDITIONS
+        value: 条件的参数
+        marker: 结果行的标记
+        timeout: 超时时间(秒)
+        interval: 两次查询之间的间隔(秒)
+        absent: 为True时等待条件不再成立，例如等待文本消失
+
+    Raises:
+        ValueError: 条件无效
+    """
+    dump_file = UI_DUMP_FILE.format(marker=marker)
+    init, probe, test = _condition_shell(condition, value, dump_file)
+    if absent:
+        test = f"! {{ {test}; }}"
+    # 脚本写成一行，session后端按行把命令发给常驻shell
+    deadline = math.ceil(max(0.0, timeout)) + 1
+    return (f"n=0; end=$(($(date +%s) + {deadline})); "
+            + (f"{init}; " if init else '')
+            + f'while true; do n=$((n+1)); {probe}; '
+            + f'if {test}; then echo "{marker} ok $n"; echo "$v"; break; fi; '
+            + f'if [ $(date +%s) -ge $end ]; then echo "{marker} timeout $n"; echo "$v"; break; fi; '
+            + f"sleep {max(0.0, interval):.3f}; done; "
+            + (f"rm -f {dump_file}; " if condition == CONDITION_TEXT else '')
+            + "true")
+
+
+def parse_wait_output(output: str, marker: str) -> Dict[str, Any]:
+    """解析等待脚本的输出
+
+    Returns:
+        {'finished': 是否输出了结果行, 'satisfied': 条件是否成立, 'polls': 查询次数, 'value': 最后查询到的值}
+    """
+    lines = output.splitlines()
+    for index, line in enumerate(lines):
+        position = line.find(marker)
+        if position < 0:
+            continue
+        fields = line[position + len(marker):].split()
+        return {
+            'finished': True,
+            'satisfied': fields[:1] == ['ok'],
+            'polls': int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 0,
+            'value': '\n'.join(lines[index + 1:]).strip()
+        }
+    return {'finished': False, 'satisfied': False, 'polls': 0, 'value': output.strip()}
@@ -27,6 +27,10 @@ setup(
     install_requires=[
         "mcp",
     ],
+    extras_require={
+        "raw": ["numpy"],
+        "images": ["numpy", "Pillow"],
+    },
     project_urls={
         "Bug Tracker": "https://github.com/hao-cyber/phone-mcp/issues",
         "Documentation": "https://github.com/hao-cyber/phone-mcp",